@@ -0,0 +1,222 @@
+"""Arquivamento de pedidos entregues em coleções por mês (pedidos_arquivo_AAAA_MM).
+
+`pedidos` fica só com a parte quente: o que ainda está em andamento e os
+entregues recentes. Pedidos ENTREGUE com mais de ARQUIVO_IDADE_DIAS são copiados
+para o bucket do mês de `data_criacao` e só então removidos de `pedidos`, em lotes
+de ARQUIVO_LOTE com uma pausa entre eles para não disputar o banco com o tráfego.
+A cópia é um upsert por _id: se o processo cair no meio, a próxima rodada refaz
+o lote sem duplicar nada.
+
+Com ARQUIVAMENTO_AUTOMATICO=1 (padrão) uma tarefa do lifespan roda a cada
+ARQUIVO_INTERVALO_SEGUNDOS; entre workers, só quem pega o lease em `counters` roda.
+Também pela linha de comando (na pasta backend):
+
+    python archive.py status
+    python archive.py executar [idade_em_dias]
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from indexes import INDICES_HISTORICO, _indice
+
+logger = logging.getLogger("cardapio.archive")
+
+ARQUIVAMENTO_AUTOMATICO = os.getenv("ARQUIVAMENTO_AUTOMATICO", "1") == "1"
+ARQUIVO_IDADE_DIAS = int(os.getenv("ARQUIVO_IDADE_DIAS", "30"))
+ARQUIVO_LOTE = int(os.getenv("ARQUIVO_LOTE", "500"))
+ARQUIVO_PAUSA_SEGUNDOS = float(os.getenv("ARQUIVO_PAUSA_SEGUNDOS", "0.2"))
+ARQUIVO_INTERVALO_SEGUNDOS = float(os.getenv("ARQUIVO_INTERVALO_SEGUNDOS", "3600"))
+# Consultas sem `desde` leem só os buckets destes últimos meses (o resto é opt-in)
+ARQUIVO_CONSULTA_MESES = int(os.getenv("ARQUIVO_CONSULTA_MESES", "12"))
+
+PREFIXO_ARQUIVO = "pedidos_arquivo_"
+ID_LEASE = "arquivamento_pedidos"
+
+# Mesmos acessos de `pedidos` que continuam valendo para o histórico
+INDICES_ARQUIVO = [
+    _indice([("codigo_pedido", ASCENDING)], unique=True),
+    _indice([("data_criacao", DESCENDING), ("_id", DESCENDING)]),
+    *INDICES_HISTORICO,
+]
+
+
+def nome_bucket(quando: datetime) -> str:
+    return f"{PREFIXO_ARQUIVO}{quando:%Y_%m}"
+
+
+def buckets_do_periodo(desde: Optional[date], ate: Optional[date], existentes: List[str]) -> List[str]:
+    """Filtra `existentes` para os meses que cruzam [desde, ate] (sem limite: todos)."""
+    inicio = nome_bucket(desde) if desde else ""
+    fim = nome_bucket(ate) if ate else "~"
+    return [nome for nome in existentes if inicio <= nome <= fim]
+
+
+async def buckets_existentes(db) -> List[str]:
+    nomes = await db.list_collection_names(filter={"name": {"$regex": f"^{PREFIXO_ARQUIVO}"}})
+    return sorted(nomes, reverse=True)
+
+
+async def colecoes_do_periodo(db, desde: Optional[date] = None, ate: Optional[date] = None) -> list:
+    return [db[nome] for nome in buckets_do_periodo(desde, ate, await buckets_existentes(db))]
+
+
+async def colecoes_para_consulta(
+    db, desde: Optional[date] = None, ate: Optional[date] = None, completo: bool = False
+) -> list:
+    """Buckets para as listagens da API.
+
+    Sem `desde`, o período vai só até ARQUIVO_CONSULTA_MESES meses atrás: cada mês
+    arquivado é mais uma consulta por página, e a lista cresce todo mês. `completo`
+    lê o arquivo inteiro.
+    """
+    if desde is None and not completo:
+        hoje = date.today()
+        meses = hoje.year * 12 + hoje.month - 1 - ARQUIVO_CONSULTA_MESES
+        desde = date(meses // 12, meses % 12 + 1, 1)
+    return await colecoes_do_periodo(db, desde, ate)
+
+
+async def buscar_arquivado(db, id: ObjectId) -> Optional[dict]:
+    # O _id nasce junto com o pedido: o mês dele quase sempre é o bucket certo
+    existentes = await buckets_existentes(db)
+    provavel = nome_bucket(id.generation_time)
+    for nome in sorted(existentes, key=lambda n: n != provavel):
+        doc = await db[nome].find_one({"_id": id})
+        if doc is not None:
+            return doc
+    return None
+
+
+class Arquivador:
+    def __init__(self):
+        self._com_indices = set()
+        self.ultima_execucao: Optional[dict] = None
+        self.total_arquivados = 0
+
+    async def _garantir_indices(self, db, nome: str) -> None:
+        if nome not in self._com_indices:
+            await db[nome].create_indexes(INDICES_ARQUIVO)
+            self._com_indices.add(nome)
+
+    async def arquivar_lote(self, db, pedidos_collection, limite: datetime, lote: int) -> int:
+        """Copia e remove um lote; devolve quantos pedidos foram lidos (0 = nada a fazer)."""
+        docs = await pedidos_collection.find(
+            {"status": "ENTREGUE", "data_criacao": {"$lt": limite}}
+        ).sort("data_criacao", ASCENDING).limit(lote).to_list(lote)
+        if not docs:
+            return 0
+        por_bucket: Dict[str, List[dict]] = defaultdict(list)
+        for doc in docs:
+            por_bucket[nome_bucket(doc["data_criacao"])].append(doc)
+        for nome, grupo in por_bucket.items():
+            await self._garantir_indices(db, nome)
+            await db[nome].bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in grupo], ordered=False)
+        # Só sai de `pedidos` depois que todos os buckets do lote foram gravados
+        res = await pedidos_collection.delete_many({"_id": {"$in": [d["_id"] for d in docs]}, "status": "ENTREGUE"})
+        self.total_arquivados += res.deleted_count
+        return len(docs)
+
+    async def executar(
+        self,
+        db,
+        pedidos_collection,
+        idade_dias: int = ARQUIVO_IDADE_DIAS,
+        lote: int = ARQUIVO_LOTE,
+        pausa: float = ARQUIVO_PAUSA_SEGUNDOS,
+        max_lotes: Optional[int] = None,
+    ) -> dict:
+        limite = datetime.now() - timedelta(days=idade_dias)
+        inicio = time.monotonic()
+        # Buckets antigos recebem índices declarados depois de terem sido criados
+        for nome in await buckets_existentes(db):
+            await self._garantir_indices(db, nome)
+        total = lotes = 0
+        while max_lotes is None or lotes < max_lotes:
+            lidos = await self.arquivar_lote(db, pedidos_collection, limite, lote)
+            total += lidos
+            lotes += 1 if lidos else 0
+            if lidos < lote:
+                break
+            await asyncio.sleep(pausa)
+        self.ultima_execucao = {
+            "em": datetime.now(),
+            "limite": limite,
+            "arquivados": total,
+            "lotes": lotes,
+            "duracao_segundos": round(time.monotonic() - inicio, 3),
+        }
+        if total:
+            logger.info("%s pedido(s) arquivado(s) em %s lote(s)", total, lotes)
+        return self.ultima_execucao
+
+    async def status(self, db) -> dict:
+        buckets = []
+        for nome in await buckets_existentes(db):
+            buckets.append({"colecao": nome, "pedidos": await db[nome].estimated_document_count()})
+        return {
+            "automatico": ARQUIVAMENTO_AUTOMATICO,
+            "idade_dias": ARQUIVO_IDADE_DIAS,
+            "total_arquivados": self.total_arquivados,
+            "ultima_execucao": self.ultima_execucao,
+            "buckets": buckets,
+        }
+
+
+arquivador = Arquivador()
+
+
+async def adquirir_lease(counters_collection, segundos: float) -> bool:
+    # Um documento em counters com validade: quem o pega roda, os outros workers pulam a vez
+    agora = datetime.now()
+    try:
+        await counters_collection.find_one_and_update(
+            {"_id": ID_LEASE, "$or": [{"ate": {"$lt": agora}}, {"ate": {"$exists": False}}]},
+            {"$set": {"ate": agora + timedelta(seconds=segundos), "pid": os.getpid()}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def arquivar_periodicamente(db, pedidos_collection, counters_collection) -> None:
+    # Tarefa do lifespan
+    while True:
+        try:
+            if await adquirir_lease(counters_collection, ARQUIVO_INTERVALO_SEGUNDOS * 0.9):
+                await arquivador.executar(db, pedidos_collection)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha no arquivamento de pedidos")
+        await asyncio.sleep(ARQUIVO_INTERVALO_SEGUNDOS)
+
+
+async def _cli(argumentos: List[str]) -> int:
+    from db import db, pedidos_collection
+
+    if argumentos[0] == "executar":
+        idade = int(argumentos[1]) if len(argumentos) > 1 else ARQUIVO_IDADE_DIAS
+        resultado = await arquivador.executar(db, pedidos_collection, idade_dias=idade)
+        print(f"{resultado['arquivados']} pedido(s) arquivado(s) em {resultado['lotes']} lote(s)")
+    for bucket in (await arquivador.status(db))["buckets"]:
+        print(f"{bucket['colecao']}: {bucket['pedidos']}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] not in ("status", "executar"):
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(_cli(sys.argv[1:])))
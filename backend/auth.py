@@ -0,0 +1,164 @@
+"""Tokens de acesso assinados (JWT HS256) e as dependências de autorização.
+
+O token carrega o _id e o `role` do usuário, então validar uma requisição é só
+conferir a assinatura HMAC e a validade: nenhuma ida ao MongoDB.
+
+- Acesso: curto (JWT_ACESSO_MINUTOS), vai no header `Authorization: Bearer ...`.
+- Refresh: longo (JWT_REFRESH_DIAS), só serve em POST /auth/refresh, que relê o
+  usuário (pega mudança de role ou exclusão) e troca o par de tokens.
+- Revogação (logout, refresh já usado): conjunto em memória de `jti`, cada entrada
+  vivendo só até o `exp` do próprio token (os vencidos saem por ordem de `exp`).
+  Entradas ainda válidas nunca são descartadas; passar de JWT_REVOGADOS_MAX só
+  gera um aviso no log.
+  É por worker: com vários workers, um token revogado ainda vale nos outros até
+  expirar, por isso o acesso é curto.
+
+Sem JWT_SEGREDO no ambiente, cada processo sorteia o seu: tokens não sobrevivem a
+um restart nem valem entre workers (serve para desenvolvimento).
+"""
+import base64
+import heapq
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+logger = logging.getLogger("cardapio.auth")
+
+JWT_SEGREDO = os.getenv("JWT_SEGREDO", "")
+JWT_ACESSO_MINUTOS = int(os.getenv("JWT_ACESSO_MINUTOS", "15"))
+JWT_REFRESH_DIAS = int(os.getenv("JWT_REFRESH_DIAS", "7"))
+JWT_REVOGADOS_MAX = int(os.getenv("JWT_REVOGADOS_MAX", "100000"))
+
+if not JWT_SEGREDO:
+    logger.warning("JWT_SEGREDO não definido: usando um segredo aleatório deste processo")
+_CHAVE = (JWT_SEGREDO or secrets.token_urlsafe(32)).encode()
+
+ACESSO = "acesso"
+REFRESH = "refresh"
+
+
+def _b64(dados: bytes) -> bytes:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=")
+
+
+def _de_b64(dados: bytes) -> bytes:
+    return base64.urlsafe_b64decode(dados + b"=" * (-len(dados) % 4))
+
+
+# O cabeçalho é sempre o mesmo: codificado uma vez só
+_CABECALHO = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+
+
+def _assinar(mensagem: bytes) -> bytes:
+    return _b64(hmac.new(_CHAVE, mensagem, hashlib.sha256).digest())
+
+
+def emitir(usuario_id: str, role: str, tipo: str = ACESSO) -> str:
+    agora = int(time.time())
+    validade = JWT_ACESSO_MINUTOS * 60 if tipo == ACESSO else JWT_REFRESH_DIAS * 86400
+    claims = {"sub": usuario_id, "role": role, "typ": tipo, "jti": secrets.token_urlsafe(12),
+              "iat": agora, "exp": agora + validade}
+    mensagem = _CABECALHO + b"." + _b64(json.dumps(claims, separators=(",", ":")).encode())
+    return (mensagem + b"." + _assinar(mensagem)).decode()
+
+
+class TokensRevogados:
+    def __init__(self, capacidade: int = JWT_REVOGADOS_MAX):
+        self.capacidade = capacidade
+        self._revogados: Dict[str, int] = {}  # jti -> exp
+        # (exp, jti) em heap: o próximo a vencer fica no topo, seja acesso (min) ou refresh (dias)
+        self._por_validade: List[Tuple[int, str]] = []
+        self._acima_do_limite = False
+
+    def revogar(self, claims: dict) -> None:
+        jti, exp = claims["jti"], claims["exp"]
+        if jti not in self._revogados:
+            self._revogados[jti] = exp
+            heapq.heappush(self._por_validade, (exp, jti))
+        agora = time.time()
+        while self._por_validade and self._por_validade[0][0] <= agora:
+            _, vencido = heapq.heappop(self._por_validade)
+            self._revogados.pop(vencido, None)
+        # Descartar um revogado ainda válido o tornaria utilizável de novo: o limite só avisa
+        acima = len(self._revogados) > self.capacidade
+        if acima and not self._acima_do_limite:
+            logger.warning("%s tokens revogados ainda válidos, acima de JWT_REVOGADOS_MAX=%s",
+                           len(self._revogados), self.capacidade)
+        self._acima_do_limite = acima
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._revogados
+
+    def __len__(self) -> int:
+        return len(self._revogados)
+
+
+revogados = TokensRevogados()
+
+
+def _nao_autorizado(detalhe: str) -> HTTPException:
+    return HTTPException(status_code=401, detail=detalhe, headers={"WWW-Authenticate": "Bearer"})
+
+
+def validar(token: str, tipo: str = ACESSO) -> dict:
+    """Confere assinatura, tipo, validade e revogação; devolve as claims."""
+    try:
+        mensagem, assinatura = token.encode().rsplit(b".", 1)
+        cabecalho, corpo = mensagem.split(b".")
+    except ValueError:
+        raise _nao_autorizado("Token inválido")
+    if cabecalho != _CABECALHO or not hmac.compare_digest(assinatura, _assinar(mensagem)):
+        raise _nao_autorizado("Token inválido")
+    claims = json.loads(_de_b64(corpo))
+    if claims.get("typ") != tipo:
+        raise _nao_autorizado("Token inválido")
+    if claims["exp"] <= time.time():
+        raise _nao_autorizado("Token expirado")
+    if claims["jti"] in revogados:
+        raise _nao_autorizado("Token revogado")
+    return claims
+
+
+def par_de_tokens(usuario_id: str, role: str) -> dict:
+    return {
+        "access_token": emitir(usuario_id, role, ACESSO),
+        "refresh_token": emitir(usuario_id, role, REFRESH),
+        "token_type": "bearer",
+        "expires_in": JWT_ACESSO_MINUTOS * 60,
+    }
+
+
+# --- Dependências ---
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def usuario_opcional(credenciais: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> Optional[dict]:
+    return validar(credenciais.credentials) if credenciais else None
+
+
+async def usuario_atual(claims: Optional[dict] = Depends(usuario_opcional)) -> dict:
+    if claims is None:
+        raise _nao_autorizado("Autenticação necessária")
+    return claims
+
+
+async def exigir_admin(claims: dict = Depends(usuario_atual)) -> dict:
+    if claims["role"] != "ADMIN":
+        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
+    return claims
+
+
+async def admin_do_token(token: Optional[str]) -> dict:
+    # Para quem não manda header Authorization (WebSocket do navegador: ?token=)
+    if not token:
+        raise _nao_autorizado("Autenticação necessária")
+    return await exigir_admin(validar(token))
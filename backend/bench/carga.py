@@ -0,0 +1,397 @@
+"""Benchmark de carga da API: vazão e latência (p50/p95/p99) por rota.
+
+Roda o `app` de main.py no próprio processo (httpx + ASGITransport, sem rede e
+sem uvicorn), com o lifespan completo, contra um destes bancos:
+
+    --banco mongo     MongoDB de MONGO_URI, no banco --db (padrão cardapio_bench;
+                      o bench cria produtos, usuário e pedidos, não use o de produção)
+    --banco memoria   Motor em memória (mongomock-motor), bom para comparar o custo
+                      da própria API entre commits
+
+Dependências só do bench: pip install httpx mongomock-motor
+
+Uso (na pasta backend):
+    python -m bench.carga rodar --cenario almoco --concorrencia 32 --duracao 30 \\
+        --saida bench/resultados/base.json
+    python -m bench.carga comparar bench/resultados/base.json bench/resultados/novo.json --tolerancia 0.10
+
+Cenários (pesos de cada operação em CENARIOS): almoco (mistura do horário de pico),
+cardapio (navegação), pedidos (rajada de POST /pedidos), status (PATCH de status)
+e login (tempestade de /auth/login). O `comparar` sai com código 1 se alguma rota
+piorou além da tolerância, para poder ser usado em CI.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Operação -> peso no sorteio de cada requisição
+CENARIOS: Dict[str, Dict[str, int]] = {
+    "almoco": {
+        "listar_produtos": 30,
+        "listar_componentes": 20,
+        "ver_produto": 10,
+        "criar_pedido": 20,
+        "atualizar_status": 15,
+        "login": 5,
+    },
+    "cardapio": {"listar_produtos": 50, "listar_componentes": 30, "ver_produto": 20},
+    "pedidos": {"criar_pedido": 100},
+    "status": {"atualizar_status": 100},
+    "login": {"login": 100},
+}
+
+EMAIL_BENCH = "bench@coracaodemae.com"
+SENHA_BENCH = "bench-senha"
+PROXIMO_STATUS = {"RECEBIDO": "EM_PREPARO", "EM_PREPARO": "PRONTO", "PRONTO": "ENTREGUE"}
+METRICAS_COMPARADAS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+# --- Preparação do banco e do app ---
+
+def preparar_ambiente(banco: str, nome_db: str):
+    """Importa main.py já apontando para o banco escolhido e devolve o `app`."""
+    # db.py lê MONGO_DB na importação; load_dotenv não sobrescreve o que já está no ambiente
+    os.environ["MONGO_DB"] = nome_db
+    import db
+
+    if banco == "memoria":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--banco memoria precisa do mongomock-motor: pip install mongomock-motor")
+        db.client = AsyncMongoMockClient()
+        db.db = db.client[nome_db]
+        for nome, valor in list(vars(db).items()):
+            if nome.endswith("_collection"):
+                setattr(db, nome, db.db.get_collection(valor.name))
+
+    import main
+    return main.app
+
+
+def _produto(i: int) -> dict:
+    return {
+        "nome": f"Bench Produto {i}",
+        "descricao": "Produto criado pelo benchmark",
+        "preco_centavos": 1500 + i * 10,
+        "imagem_url": "https://exemplo.invalid/produto.png",
+        "categoria": "MARMITAS" if i % 2 else "BEBIDAS",
+        "ativo": True,
+        "tipo": "SIMPLES",
+        "tags_dieteticas": ["VEGANO"] if i % 5 == 0 else [],
+    }
+
+
+def _componente(i: int) -> dict:
+    return {
+        "nome": f"Bench Componente {i}",
+        "tipo": ("BASE", "PROTEINA", "GUARNICAO")[i % 3],
+        "embalagem_separada": False,
+        "preco_adicional_centavos": 0,
+        "ativo": True,
+    }
+
+
+class Estado:
+    """Dados compartilhados pelos clientes: catálogo criado e pedidos em andamento."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.produtos: List[dict] = []
+        # Pedidos ainda não entregues: (id, status atual)
+        self.abertos: List[Tuple[str, str]] = []
+
+    def corpo_pedido(self) -> dict:
+        itens = [
+            {"nome_produto": p["nome"], "quantidade": self.rng.randint(1, 3), "preco_unitario": 0}
+            for p in self.rng.sample(self.produtos, k=min(2, len(self.produtos)))
+        ]
+        delivery = self.rng.random() < 0.5
+        return {
+            "cliente": {"nome": "Cliente Bench", "telefone": f"1199{self.rng.randint(0, 9999999):07d}"},
+            "modalidade": "DELIVERY" if delivery else "RETIRADA",
+            "entrega": {"logradouro": "Rua do Bench", "numero": "1", "bairro": "Centro"} if delivery else None,
+            "forma_pagamento": self.rng.choice(("PIX", "CREDITO", "DEBITO")),
+            "itens": itens,
+        }
+
+
+async def semear(cliente, estado: Estado, produtos: int, componentes: int, pedidos: int) -> None:
+    # O admin do bench vai direto no banco (como o do seed): a API só cria ADMIN com token de ADMIN
+    from db import usuarios_collection
+    from security import gerar_hash_senha
+
+    await usuarios_collection.update_one(
+        {"email": EMAIL_BENCH},
+        {"$setOnInsert": {"nome": "Bench", "email": EMAIL_BENCH, "senha_hash": await gerar_hash_senha(SENHA_BENCH),
+                          "role": "ADMIN", "telefone": "0"}},
+        upsert=True,
+    )
+    r = await cliente.post("/auth/login", json={"email": EMAIL_BENCH, "password": SENHA_BENCH})
+    r.raise_for_status()
+    cliente.headers["Authorization"] = f"Bearer {r.json()['access_token']}"
+
+    # O resto passa pela API, para cache, índice do cardápio e rollups ficarem coerentes
+    for i in range(produtos):
+        r = await cliente.post("/produtos", json=_produto(i))
+        r.raise_for_status()
+        estado.produtos.append(r.json())
+    for i in range(componentes):
+        (await cliente.post("/componentes", json=_componente(i))).raise_for_status()
+    for _ in range(pedidos):
+        r = await cliente.post("/pedidos", json=estado.corpo_pedido())
+        r.raise_for_status()
+        estado.abertos.append((r.json()["_id"], "RECEBIDO"))
+
+
+# --- Operações ---
+
+async def executar(operacao: str, cliente, estado: Estado) -> Tuple[str, int]:
+    """Faz uma requisição da operação e devolve (rota, status HTTP)."""
+    if operacao == "listar_produtos":
+        return "GET /produtos", (await cliente.get("/produtos")).status_code
+    if operacao == "listar_componentes":
+        return "GET /componentes", (await cliente.get("/componentes")).status_code
+    if operacao == "ver_produto":
+        produto = estado.rng.choice(estado.produtos)
+        return "GET /produtos/{id}", (await cliente.get(f"/produtos/{produto['_id']}")).status_code
+    if operacao == "criar_pedido":
+        r = await cliente.post("/pedidos", json=estado.corpo_pedido())
+        if r.status_code == 201:
+            estado.abertos.append((r.json()["_id"], "RECEBIDO"))
+        return "POST /pedidos", r.status_code
+    if operacao == "atualizar_status":
+        # Avança um pedido aberto no fluxo normal da cozinha
+        if not estado.abertos:
+            r = await cliente.post("/pedidos", json=estado.corpo_pedido())
+            estado.abertos.append((r.json()["_id"], "RECEBIDO"))
+        indice = estado.rng.randrange(len(estado.abertos))
+        id_pedido, atual = estado.abertos[indice]
+        novo = PROXIMO_STATUS[atual]
+        if novo in PROXIMO_STATUS:
+            estado.abertos[indice] = (id_pedido, novo)
+        else:
+            # Entregue: sai da lista (troca com o último para não deslocar o resto)
+            estado.abertos[indice] = estado.abertos[-1]
+            estado.abertos.pop()
+        r = await cliente.patch(f"/pedidos/{id_pedido}/status", json={"status": novo})
+        return "PATCH /pedidos/{id}/status", r.status_code
+    if operacao == "login":
+        r = await cliente.post("/auth/login", json={"email": EMAIL_BENCH, "password": SENHA_BENCH})
+        return "POST /auth/login", r.status_code
+    raise ValueError(f"Operação desconhecida: {operacao}")
+
+
+# --- Execução e estatísticas ---
+
+def percentil(valores_ordenados: List[float], p: float) -> float:
+    # Nearest-rank: sempre um valor observado, estável entre rodadas
+    if not valores_ordenados:
+        return 0.0
+    posicao = min(len(valores_ordenados), max(1, math.ceil(p / 100 * len(valores_ordenados)))) - 1
+    return valores_ordenados[posicao]
+
+
+def resumir(latencias: List[float], codigos: Dict[int, int], duracao: float) -> dict:
+    ordenadas = sorted(latencias)
+    erros = sum(n for codigo, n in codigos.items() if codigo >= 500 or codigo == 0)
+    return {
+        "requisicoes": len(ordenadas),
+        "erros": erros,
+        "rps": round(len(ordenadas) / duracao, 1) if duracao else 0.0,
+        "media_ms": round(sum(ordenadas) / len(ordenadas) * 1000, 2) if ordenadas else 0.0,
+        "p50_ms": round(percentil(ordenadas, 50) * 1000, 2),
+        "p95_ms": round(percentil(ordenadas, 95) * 1000, 2),
+        "p99_ms": round(percentil(ordenadas, 99) * 1000, 2),
+        "max_ms": round(ordenadas[-1] * 1000, 2) if ordenadas else 0.0,
+        "codigos": {str(c): n for c, n in sorted(codigos.items())},
+    }
+
+
+async def carga(cliente, estado: Estado, pesos: Dict[str, int], concorrencia: int,
+                duracao: float, aquecimento: float) -> dict:
+    """Laço fechado: `concorrencia` clientes mandam a próxima requisição assim que a anterior volta."""
+    operacoes, valores = zip(*pesos.items())
+    latencias: Dict[str, List[float]] = defaultdict(list)
+    codigos: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    inicio = time.perf_counter()
+    inicio_medicao = inicio + aquecimento
+    fim = inicio_medicao + duracao
+
+    async def cliente_virtual():
+        while (agora := time.perf_counter()) < fim:
+            operacao = estado.rng.choices(operacoes, weights=valores)[0]
+            t0 = time.perf_counter()
+            try:
+                rota, codigo = await executar(operacao, cliente, estado)
+            except Exception:
+                rota, codigo = operacao, 0
+            if agora >= inicio_medicao:
+                latencias[rota].append(time.perf_counter() - t0)
+                codigos[rota][codigo] += 1
+
+    await asyncio.gather(*(cliente_virtual() for _ in range(concorrencia)))
+    medido = time.perf_counter() - inicio_medicao
+    todas = [lat for lista in latencias.values() for lat in lista]
+    total_codigos: Dict[int, int] = defaultdict(int)
+    for por_codigo in codigos.values():
+        for codigo, n in por_codigo.items():
+            total_codigos[codigo] += n
+    return {
+        "rotas": {rota: resumir(latencias[rota], codigos[rota], medido) for rota in sorted(latencias)},
+        "total": resumir(todas, total_codigos, medido),
+    }
+
+
+def _commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def rodar(args) -> dict:
+    import httpx
+
+    app = preparar_ambiente(args.banco, args.db)
+    rng = random.Random(args.semente)
+    estado = Estado(rng)
+    transporte = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60) as cliente:
+            await semear(cliente, estado, args.produtos, args.componentes, args.pedidos_iniciais)
+            resultado = await carga(
+                cliente, estado, CENARIOS[args.cenario], args.concorrencia, args.duracao, args.aquecimento
+            )
+    return {
+        "meta": {
+            "cenario": args.cenario,
+            "pesos": CENARIOS[args.cenario],
+            "banco": args.banco,
+            "concorrencia": args.concorrencia,
+            "duracao_segundos": args.duracao,
+            "aquecimento_segundos": args.aquecimento,
+            "semente": args.semente,
+            "commit": _commit_atual(),
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "maquina": platform.node(),
+            "cpus": os.cpu_count(),
+        },
+        **resultado,
+    }
+
+
+def imprimir(resultado: dict) -> None:
+    print(f"{'rota':<30} {'req':>7} {'erros':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+    linhas = list(resultado["rotas"].items()) + [("TOTAL", resultado["total"])]
+    for rota, r in linhas:
+        print(f"{rota:<30} {r['requisicoes']:>7} {r['erros']:>6} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+# --- Comparação ---
+
+def comparar(base: dict, novo: dict, tolerancia: float) -> List[str]:
+    """Lista as regressões de `novo` em relação a `base` (latência, vazão e erros por rota)."""
+    regressoes = []
+    for rota, b in base["rotas"].items():
+        n = novo["rotas"].get(rota)
+        if n is None:
+            continue
+        for metrica in METRICAS_COMPARADAS:
+            if b[metrica] and n[metrica] > b[metrica] * (1 + tolerancia):
+                regressoes.append(f"{rota}: {metrica} {b[metrica]:.2f} -> {n[metrica]:.2f} "
+                                  f"(+{(n[metrica] / b[metrica] - 1) * 100:.0f}%)")
+        if b["rps"] and n["rps"] < b["rps"] * (1 - tolerancia):
+            regressoes.append(f"{rota}: rps {b['rps']:.1f} -> {n['rps']:.1f} "
+                              f"({(n['rps'] / b['rps'] - 1) * 100:.0f}%)")
+        taxa_base = b["erros"] / b["requisicoes"] if b["requisicoes"] else 0
+        taxa_nova = n["erros"] / n["requisicoes"] if n["requisicoes"] else 0
+        if taxa_nova > taxa_base + 0.01:
+            regressoes.append(f"{rota}: erros {taxa_base:.1%} -> {taxa_nova:.1%}")
+    return regressoes
+
+
+def _avisos_comparacao(base: dict, novo: dict) -> List[str]:
+    avisos = []
+    for campo in ("cenario", "banco", "concorrencia", "duracao_segundos"):
+        if base["meta"].get(campo) != novo["meta"].get(campo):
+            avisos.append(f"{campo} diferente: {base['meta'].get(campo)} x {novo['meta'].get(campo)}")
+    if base["meta"].get("maquina") != novo["meta"].get("maquina"):
+        avisos.append("rodadas em máquinas diferentes: números não são comparáveis")
+    return avisos
+
+
+def _carregar(caminho: str) -> dict:
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    p_rodar = comandos.add_parser("rodar", help="executa um cenário e grava o resultado em JSON")
+    p_rodar.add_argument("--cenario", choices=sorted(CENARIOS), default="almoco")
+    p_rodar.add_argument("--banco", choices=("mongo", "memoria"), default="memoria")
+    p_rodar.add_argument("--db", default="cardapio_bench", help="nome do banco (só --banco mongo grava de fato)")
+    p_rodar.add_argument("--concorrencia", type=int, default=16)
+    p_rodar.add_argument("--duracao", type=float, default=20, help="segundos medidos")
+    p_rodar.add_argument("--aquecimento", type=float, default=3, help="segundos iniciais descartados")
+    p_rodar.add_argument("--semente", type=int, default=42)
+    p_rodar.add_argument("--produtos", type=int, default=40)
+    p_rodar.add_argument("--componentes", type=int, default=15)
+    p_rodar.add_argument("--pedidos-iniciais", type=int, default=50)
+    p_rodar.add_argument("--saida", help="arquivo JSON do resultado (padrão: bench/resultados/<cenario>-<banco>-<data>.json)")
+
+    p_comparar = comandos.add_parser("comparar", help="compara dois resultados e aponta regressões")
+    p_comparar.add_argument("base")
+    p_comparar.add_argument("novo")
+    p_comparar.add_argument("--tolerancia", type=float, default=0.10, help="piora relativa aceita (0.10 = 10%%)")
+
+    args = parser.parse_args()
+
+    if args.comando == "rodar":
+        resultado = asyncio.run(rodar(args))
+        imprimir(resultado)
+        saida = args.saida or os.path.join(
+            "bench", "resultados", f"{args.cenario}-{args.banco}-{datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+        os.makedirs(os.path.dirname(saida) or ".", exist_ok=True)
+        with open(saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"\nResultado gravado em {saida}")
+        return
+
+    base, novo = _carregar(args.base), _carregar(args.novo)
+    for aviso in _avisos_comparacao(base, novo):
+        print(f"Aviso: {aviso}")
+    regressoes = comparar(base, novo, args.tolerancia)
+    for rota, n in novo["rotas"].items():
+        b = base["rotas"].get(rota)
+        if b:
+            print(f"{rota:<30} p95 {b['p95_ms']:>8.2f} -> {n['p95_ms']:>8.2f} ms   "
+                  f"req/s {b['rps']:>8.1f} -> {n['rps']:>8.1f}")
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}:")
+        for r in regressoes:
+            print(f"  - {r}")
+        sys.exit(1)
+    print(f"\nSem regressões acima de {args.tolerancia:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Vazão de inserção de pedidos: um insert por requisição x group commit (coalescer.py).
+
+Simula `--produtores` requisições simultâneas de POST /pedidos, cada uma gravando
+um pedido e esperando a confirmação, até somar `--pedidos`. Caminhos medidos:
+
+    releitura   insert_one + find_one do mesmo documento (o criar_pedido antigo)
+    individual  insert_one por pedido, resposta montada do documento em memória
+    agrupado    AgrupadorInsercoes: insert_many(ordered=False) por janela
+
+Grava na coleção `bench_insercoes` do banco --db (apagada no início e no fim) com
+o write concern de pedidos (MONGO_W_PEDIDOS), ou o de --w.
+
+Uso (na pasta backend):
+    python -m bench.insercoes --banco mongo --produtores 64 --pedidos 20000
+    python -m bench.insercoes --banco mongo --lote-max 128 --espera-ms 2 --w 1
+"""
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+from typing import Awaitable, Callable, List
+
+from bench.serializacao import gerar_pedidos
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+async def medir(nome: str, gravar: Callable[[dict], Awaitable[None]], docs: List[dict], produtores: int) -> None:
+    latencias: List[float] = []
+    proximo = iter(docs)
+
+    async def produtor():
+        for doc in proximo:
+            inicio = time.perf_counter()
+            await gravar(doc)
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(produtor() for _ in range(produtores)))
+    duracao = time.perf_counter() - inicio
+    print(f"{nome:<11} {len(docs) / duracao:10.0f} pedidos/s  "
+          f"p50 {_percentil(latencias, 50) * 1000:7.2f} ms  p99 {_percentil(latencias, 99) * 1000:7.2f} ms")
+
+
+async def rodar(args) -> None:
+    os.environ["MONGO_DB"] = args.db
+    import db
+
+    if args.banco == "memoria":
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("--banco memoria precisa do mongomock-motor: pip install mongomock-motor")
+        db.db = AsyncMongoMockClient()[args.db]
+    else:
+        await db.conectar()
+    from coalescer import AgrupadorInsercoes
+
+    colecao = db.db.get_collection("bench_insercoes", write_concern=db.escrita_pedidos)
+    if args.w:
+        colecao = colecao.with_options(write_concern=db.WriteConcern(w=db._w(args.w), wtimeout=db.MONGO_WTIMEOUT_MS))
+    agrupador = AgrupadorInsercoes(colecao, lote_max=args.lote_max, espera_ms=args.espera_ms)
+
+    async def releitura(doc):
+        res = await colecao.insert_one(doc)
+        await colecao.find_one({"_id": res.inserted_id})
+
+    async def individual(doc):
+        await colecao.insert_one(doc)
+
+    caminhos = {"releitura": releitura, "individual": individual, "agrupado": agrupador.inserir}
+    print(f"{args.pedidos} pedidos, {args.produtores} produtores, lote até {args.lote_max}, "
+          f"espera {args.espera_ms} ms, w={args.w or db.MONGO_W_PEDIDOS}")
+    try:
+        for nome in args.caminhos:
+            await colecao.drop()
+            docs = gerar_pedidos(args.pedidos)
+            for doc in docs:
+                doc.pop("_id")
+            await medir(nome, caminhos[nome], docs, args.produtores)
+        stats = agrupador.stats()
+        if stats["lotes"]:
+            print(f"agrupado: {stats['lotes']} lotes, média {stats['media_por_lote']:.1f}, maior {stats['maior_lote']}")
+    finally:
+        await colecao.drop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banco", choices=("mongo", "memoria"), default="mongo")
+    parser.add_argument("--db", default="cardapio_bench")
+    parser.add_argument("--pedidos", type=int, default=20000)
+    parser.add_argument("--produtores", type=int, default=64)
+    parser.add_argument("--lote-max", type=int, default=64)
+    parser.add_argument("--espera-ms", type=float, default=5)
+    parser.add_argument("--w", default="")
+    parser.add_argument("--caminhos", nargs="+", choices=("releitura", "individual", "agrupado"),
+                        default=["releitura", "individual", "agrupado"])
+    asyncio.run(rodar(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
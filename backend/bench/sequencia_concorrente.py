@@ -0,0 +1,69 @@
+"""Teste de concorrência do alocador de codigo_pedido.
+
+Simula N workers (cada um com o seu AlocadorSequencia, como processos uvicorn
+separados) pedindo números em paralelo contra o mesmo MongoDB e confere que
+nenhum número se repete. A mesma checagem roda offline (mongomock-motor) em
+tests/test_sequences.py; este script serve para medir contra um mongod de verdade.
+
+Uso (na pasta backend):
+    python -m bench.sequencia_concorrente --workers 8 --pedidos 2000 --bloco 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import motor.motor_asyncio
+from dotenv import load_dotenv
+
+from sequences import AlocadorSequencia
+
+
+async def rodar(uri: str, banco: str, workers: int, pedidos: int, bloco: int, concorrencia: int) -> int:
+    client = motor.motor_asyncio.AsyncIOMotorClient(uri)
+    counters = client[banco].get_collection("counters")
+    nome = f"teste_concorrencia_{os.getpid()}_{int(time.time())}"
+
+    alocadores = [AlocadorSequencia(counters, nome, bloco=bloco) for _ in range(workers)]
+    emitidos = []
+
+    async def cliente(alocador, quantidade):
+        for _ in range(quantidade):
+            emitidos.append(await alocador.proximo())
+
+    inicio = time.perf_counter()
+    tarefas = []
+    por_cliente = max(1, pedidos // (workers * concorrencia))
+    for alocador in alocadores:
+        for _ in range(concorrencia):
+            tarefas.append(cliente(alocador, por_cliente))
+    await asyncio.gather(*tarefas)
+    duracao = time.perf_counter() - inicio
+
+    await counters.delete_one({"_id": nome})
+    client.close()
+
+    duplicados = len(emitidos) - len(set(emitidos))
+    reservas = sum(a.reservas for a in alocadores)
+    print(f"Números emitidos: {len(emitidos)} em {duracao:.3f}s ({len(emitidos) / duracao:,.0f}/s)")
+    print(f"Idas ao banco: {reservas} ({len(emitidos) / max(reservas, 1):.1f} números por ida)")
+    print(f"Duplicados: {duplicados}")
+    return 1 if duplicados else 0
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default=os.getenv("MONGO_DB", "cardapio"))
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--concorrencia", type=int, default=16, help="requisições simultâneas por worker")
+    parser.add_argument("--pedidos", type=int, default=10000)
+    parser.add_argument("--bloco", type=int, default=50)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(rodar(args.uri, args.db, args.workers, args.pedidos, args.bloco, args.concorrencia)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Micro-benchmark da serialização de GET /pedidos: response_model x caminho rápido.
+
+Gera pedidos no formato em que o Motor os devolve (ObjectId, datetime, cliente,
+entrega e itens aninhados) e mede, para cada tamanho de página:
+
+    response_model  validação do Pydantic + serialização em modo JSON + json.dumps
+                    (o que o FastAPI faz com uma rota response_model=List[Pedido])
+    rapido          SerializadorRapido + serialization.dumps (orjson se instalado)
+
+Também confere que os dois caminhos produzem o mesmo JSON.
+
+Uso (na pasta backend):
+    python -m bench.serializacao --tamanhos 1000 10000 --repeticoes 5
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+from models import Pedido
+from serialization import SerializadorRapido, dumps, orjson
+
+
+def gerar_pedidos(quantidade: int, semente: int = 7) -> List[dict]:
+    rng = random.Random(semente)
+    inicio = datetime(2026, 1, 1, 11, 0)
+    pedidos = []
+    for i in range(quantidade):
+        delivery = rng.random() < 0.6
+        itens = [
+            {
+                "nome_produto": f"Marmita {rng.randint(1, 40)}",
+                "quantidade": rng.randint(1, 3),
+                "preco_unitario": rng.randint(1500, 4500),
+                "selecoes": [f"Componente {rng.randint(1, 30)}" for _ in range(rng.randint(0, 4))],
+            }
+            for _ in range(rng.randint(1, 4))
+        ]
+        valor = sum(item["quantidade"] * item["preco_unitario"] for item in itens)
+        pedidos.append({
+            "_id": ObjectId(),
+            "codigo_pedido": 10000 + i,
+            "data_criacao": inicio + timedelta(seconds=i * 7, milliseconds=rng.randint(0, 999)),
+            "cliente": {"nome": f"Cliente {i}", "telefone": f"1199{i:07d}", "cpf_nota": None},
+            "modalidade": "DELIVERY" if delivery else "RETIRADA",
+            "entrega": {"logradouro": "Rua das Flores", "numero": str(i), "bairro": "Centro"} if delivery else None,
+            "forma_pagamento": rng.choice(("PIX", "CREDITO", "DEBITO")),
+            "itens": itens,
+            "status": "RECEBIDO",
+            "valor_produtos_centavos": valor,
+            "taxa_entrega_centavos": 1000 if delivery else 0,
+            "valor_total_centavos": valor + (1000 if delivery else 0),
+        })
+    return pedidos
+
+
+adapter = TypeAdapter(List[Pedido])
+rapido = SerializadorRapido(Pedido)
+
+
+def via_response_model(docs: List[dict]) -> bytes:
+    # Mesmo caminho de fastapi.routing.serialize_response + JSONResponse.render
+    validados = adapter.validate_python(docs)
+    conteudo = adapter.dump_python(validados, mode="json", by_alias=True)
+    return json.dumps(conteudo, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def via_caminho_rapido(docs: List[dict]) -> bytes:
+    return dumps(rapido.lista(docs))
+
+
+def medir(funcao: Callable[[List[dict]], bytes], docs: List[dict], repeticoes: int) -> float:
+    funcao(docs)  # aquecimento
+    melhores = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(docs)
+        melhores.append(time.perf_counter() - inicio)
+    return min(melhores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"encoder do caminho rápido: {'orjson ' + orjson.__version__ if orjson else 'json (stdlib)'}")
+    for tamanho in args.tamanhos:
+        docs = gerar_pedidos(tamanho)
+        if json.loads(via_response_model(docs)) != json.loads(via_caminho_rapido(docs)):
+            raise SystemExit(f"Saídas diferentes para {tamanho} pedidos")
+        lento = medir(via_response_model, docs, args.repeticoes)
+        veloz = medir(via_caminho_rapido, docs, args.repeticoes)
+        print(f"{tamanho:>6} pedidos  response_model {lento * 1000:8.1f} ms  "
+              f"rapido {veloz * 1000:8.1f} ms  ({lento / veloz:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
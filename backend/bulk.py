@@ -0,0 +1,29 @@
+# Caminho de escrita em lote do catálogo, compartilhado pela importação da API
+# (catalogo_io.py) e pelo seed em modo --upsert. Só depende do pymongo.
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+from pymongo import UpdateOne
+
+# Chave natural de cada coleção: a mesma linha importada duas vezes atualiza, não duplica
+CHAVES_NATURAIS = {
+    "produtos": ("nome", "categoria"),
+    "componentes": ("nome", "tipo"),
+}
+
+TAMANHO_LOTE = 500
+
+
+def operacao_upsert(colecao: str, doc: dict) -> UpdateOne:
+    chave = {campo: doc[campo] for campo in CHAVES_NATURAIS[colecao]}
+    campos = {k: v for k, v in doc.items() if k != "_id"}
+    return UpdateOne(chave, {"$set": campos}, upsert=True)
+
+
+def em_lotes(itens: Iterable, tamanho: int = TAMANHO_LOTE) -> Iterator[List]:
+    iterador = iter(itens)
+    while True:
+        lote = list(islice(iterador, tamanho))
+        if not lote:
+            return
+        yield lote
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from pagination import listar, ASC, HEADER_PROXIMO_CURSOR
+
+CACHE_TTL_SEGUNDOS = float(os.getenv("CACHE_TTL_SEGUNDOS", "300"))
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", "256"))
+
+HEADER_VERSAO = "X-Catalogo-Versao"
+
+
+class EntradaCache:
+    __slots__ = ("corpo", "etag", "headers", "expira_em")
+
+    def __init__(self, corpo: bytes, headers: Optional[dict], expira_em: float):
+        self.corpo = corpo
+        # ETag forte: hash do corpo exato que será enviado
+        self.etag = '"' + hashlib.blake2b(corpo, digest_size=16).hexdigest() + '"'
+        self.headers = headers or {}
+        self.expira_em = expira_em
+
+
+class CacheCatalogo:
+    """Cache em memória (TTL + LRU) das respostas já serializadas de uma coleção do catálogo.
+
+    Qualquer escrita na coleção chama `invalidar()`, que limpa tudo e incrementa `versao`.
+    """
+
+    def __init__(self, nome: str, ttl: float = CACHE_TTL_SEGUNDOS, max_itens: int = CACHE_MAX_ITENS):
+        self.nome = nome
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self.versao = 0
+        self.hits = 0
+        self.misses = 0
+        self._itens: "OrderedDict[Hashable, EntradaCache]" = OrderedDict()
+
+    def get(self, chave: Hashable) -> Optional[EntradaCache]:
+        entrada = self._itens.get(chave)
+        if entrada is None:
+            self.misses += 1
+            return None
+        if entrada.expira_em <= time.monotonic():
+            del self._itens[chave]
+            self.misses += 1
+            return None
+        self._itens.move_to_end(chave)
+        self.hits += 1
+        return entrada
+
+    def set(self, chave: Hashable, corpo: bytes, headers: Optional[dict] = None, versao: Optional[int] = None) -> EntradaCache:
+        entrada = EntradaCache(corpo, headers, time.monotonic() + self.ttl)
+        # Se houve escrita enquanto a leitura estava em andamento, não guarda o resultado antigo
+        if versao is not None and versao != self.versao:
+            return entrada
+        self._itens[chave] = entrada
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+        return entrada
+
+    def invalidar(self) -> None:
+        self._itens.clear()
+        self.versao += 1
+
+    def stats(self) -> dict:
+        return {
+            "versao": self.versao,
+            "itens": len(self._itens),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+cache_produtos = CacheCatalogo("produtos")
+cache_componentes = CacheCatalogo("componentes")
+
+
+def etag_confere(request: Request, etag: str) -> bool:
+    valor = request.headers.get("if-none-match")
+    if not valor:
+        return False
+    if valor.strip() == "*":
+        return True
+    return etag in [v.strip() for v in valor.split(",")]
+
+
+def responder_do_cache(request: Request, cache: CacheCatalogo, entrada: EntradaCache) -> Response:
+    headers = {"ETag": entrada.etag, HEADER_VERSAO: str(cache.versao), **entrada.headers}
+    if etag_confere(request, entrada.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entrada.corpo, media_type="application/json", headers=headers)
+
+
+async def listar_com_cache(request: Request, response: Response, cache: CacheCatalogo, collection, adapter: TypeAdapter,
+                           limit=None, cursor=None, fields=None):
+    chave = ("lista", limit, cursor, fields)
+    entrada = cache.get(chave)
+    if entrada is None:
+        versao = cache.versao
+        resultado = await listar(response, collection, {}, "_id", ASC, limit, cursor, fields)
+        if isinstance(resultado, Response):
+            # Com projeção o pagination já devolve o JSON pronto
+            corpo, origem = resultado.body, resultado.headers
+        else:
+            corpo, origem = adapter.dump_json(adapter.validate_python(resultado), by_alias=True), response.headers
+        headers = {}
+        if HEADER_PROXIMO_CURSOR in origem:
+            headers[HEADER_PROXIMO_CURSOR] = origem[HEADER_PROXIMO_CURSOR]
+        entrada = cache.set(chave, corpo, headers, versao)
+    return responder_do_cache(request, cache, entrada)
+
+
+async def buscar_com_cache(request: Request, cache: CacheCatalogo, adapter: TypeAdapter, id: str, carregar):
+    chave = ("id", id)
+    entrada = cache.get(chave)
+    if entrada is None:
+        versao = cache.versao
+        # carregar() é o get_by_id da rota; 400/404 sobem como exceção e não entram no cache
+        doc = await carregar()
+        entrada = cache.set(chave, adapter.dump_json(adapter.validate_python(doc), by_alias=True), None, versao)
+    return responder_do_cache(request, cache, entrada)
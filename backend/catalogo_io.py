@@ -0,0 +1,240 @@
+"""Importação e exportação do catálogo (produtos / componentes) em CSV ou NDJSON.
+
+A exportação sai direto do cursor do Motor, linha a linha. A importação lê o corpo
+da requisição em streaming, valida cada linha com o modelo da coleção e grava em
+lotes de upserts (bulk_write ordered=False) pela chave natural de bulk.py.
+"""
+import csv
+import io
+import json
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from bulk import TAMANHO_LOTE, operacao_upsert
+from models import Componente, Produto
+from pagination import documento_para_json
+
+MODELOS = {"produtos": Produto, "componentes": Componente}
+FORMATOS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# Limite de erros devolvidos no relatório (a contagem continua completa)
+MAX_ERROS_RELATORIO = 1000
+
+
+def campos(colecao: str) -> List[str]:
+    return [nome for nome in MODELOS[colecao].model_fields if nome != "id"]
+
+
+# --- Exportação ---
+
+def _valor_csv(valor) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, (list, dict)):
+        return json.dumps(valor, ensure_ascii=False)
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    return str(valor)
+
+
+def _linha_csv(valores: List[str]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(valores)
+    return buffer.getvalue().encode()
+
+
+async def exportar(collection, colecao: str, formato: str) -> AsyncIterator[bytes]:
+    nomes = campos(colecao)
+    if formato == "csv":
+        yield _linha_csv(["_id"] + nomes)
+    async for doc in collection.find({}).sort("_id", 1):
+        if formato == "csv":
+            yield _linha_csv([str(doc["_id"])] + [_valor_csv(doc.get(nome)) for nome in nomes])
+        else:
+            yield json.dumps(documento_para_json(doc), ensure_ascii=False).encode() + b"\n"
+
+
+# --- Importação ---
+
+async def _linhas(stream) -> AsyncIterator[Tuple[str, bool]]:
+    # Quebra o corpo em linhas (com o "\n") sem carregar o arquivo inteiro na memória.
+    # Cada linha é decodificada sozinha: em UTF-8 o byte "\n" nunca aparece dentro de
+    # um caractere, e uma linha em outra codificação (cp1252 do Excel) vira erro no
+    # relatório em vez de derrubar a importação pela metade. -> (texto, é UTF-8 válido)
+    resto = b""
+    primeiro = True
+    async for pedaco in stream:
+        if primeiro:
+            pedaco = pedaco.removeprefix(b"\xef\xbb\xbf")  # BOM de planilha exportada no Excel
+            primeiro = False
+        resto += pedaco
+        *completas, resto = resto.split(b"\n")
+        for linha in completas:
+            yield _decodificar(linha.rstrip(b"\r") + b"\n")
+    if resto.strip():
+        yield _decodificar(resto.rstrip(b"\r"))
+
+
+def _decodificar(linha: bytes) -> Tuple[str, bool]:
+    try:
+        return linha.decode("utf-8"), True
+    except UnicodeDecodeError:
+        return linha.decode("utf-8", "replace"), False
+
+
+class _Fila:
+    """Iterador sobre as linhas já lidas do corpo, consumido por um único csv.reader."""
+
+    def __init__(self):
+        self.linhas: Deque[str] = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.linhas:
+            raise StopIteration
+        return self.linhas.popleft()
+
+
+ERRO_CODIFICACAO = "linha não está em UTF-8 (salve a planilha como \"CSV UTF-8\")"
+
+
+async def _registros(stream, formato: str) -> AsyncIterator[Tuple[int, Optional[str], Any]]:
+    """(número da primeira linha, erro ou None, campos do CSV / texto do NDJSON)."""
+    if formato != "csv":
+        numero = 0
+        async for texto, valida in _linhas(stream):
+            numero += 1
+            if texto.strip():
+                yield numero, None if valida else ERRO_CODIFICACAO, texto
+        return
+
+    # Um registro CSV pode ocupar várias linhas (campo entre aspas com quebra de linha,
+    # como o csv.writer da exportação grava). O leitor só é chamado quando a fila tem um
+    # registro inteiro: aspas em número par fecham o registro no fim da linha.
+    fila = _Fila()
+    leitor = csv.reader(fila)
+    invalidas: Set[int] = set()
+    entre_aspas = False
+    prontos = 0
+    numero = 0
+    async for texto, valida in _linhas(stream):
+        numero += 1
+        if not valida:
+            invalidas.add(numero)
+        fila.linhas.append(texto)
+        if texto.count('"') % 2:
+            entre_aspas = not entre_aspas
+        if not entre_aspas:
+            prontos += 1
+        while prontos:
+            prontos -= 1
+            inicio = leitor.line_num + 1
+            campos = next(leitor)
+            fim = leitor.line_num
+            ruim = any(n in invalidas for n in range(inicio, fim + 1))
+            invalidas.difference_update(range(inicio, fim + 1))
+            if campos:
+                yield inicio, ERRO_CODIFICACAO if ruim else None, campos
+    if fila.linhas:
+        yield leitor.line_num + 1, "aspas abertas até o fim do arquivo", None
+
+
+def _converter_csv(cabecalho: List[str], valores: List[str]) -> dict:
+    doc = {}
+    for nome, valor in zip(cabecalho, valores):
+        if nome == "_id" or valor == "":
+            continue
+        valor = valor.strip()
+        # Listas e dicionários (tags_dieteticas, regras_composicao) vêm como JSON
+        if valor[:1] in ("[", "{"):
+            valor = json.loads(valor)
+        doc[nome] = valor
+    return doc
+
+
+def _erros_validacao(e: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(p) for p in erro['loc'])}: {erro['msg']}" for erro in e.errors()]
+
+
+class RelatorioImportacao:
+    def __init__(self):
+        self.linhas = 0
+        self.validas = 0
+        self.inseridos = 0
+        self.atualizados = 0
+        self.total_erros = 0
+        self.erros: List[Dict] = []
+
+    def erro(self, linha: int, mensagens: List[str]) -> None:
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS_RELATORIO:
+            self.erros.append({"linha": linha, "erros": mensagens})
+
+    def como_dict(self) -> dict:
+        return {
+            "linhas": self.linhas,
+            "validas": self.validas,
+            "inseridos": self.inseridos,
+            "atualizados": self.atualizados,
+            "total_erros": self.total_erros,
+            "erros": self.erros,
+        }
+
+
+async def _gravar(collection, operacoes: List, numeros: List[int], relatorio: RelatorioImportacao) -> None:
+    try:
+        res = await collection.bulk_write(operacoes, ordered=False)
+        relatorio.inseridos += res.upserted_count
+        relatorio.atualizados += res.modified_count
+    except BulkWriteError as e:
+        detalhes = e.details
+        relatorio.inseridos += detalhes.get("nUpserted", 0)
+        relatorio.atualizados += detalhes.get("nModified", 0)
+        for falha in detalhes.get("writeErrors", []):
+            relatorio.erro(numeros[falha["index"]], [falha.get("errmsg", "erro de escrita")])
+
+
+async def importar(stream, collection, colecao: str, formato: str, tamanho_lote: int = TAMANHO_LOTE) -> dict:
+    modelo = MODELOS[colecao]
+    relatorio = RelatorioImportacao()
+    operacoes, numeros = [], []
+    cabecalho: Optional[List[str]] = None
+
+    async for numero, erro, registro in _registros(stream, formato):
+        if formato == "csv" and cabecalho is None:
+            if erro:
+                raise HTTPException(status_code=400, detail=f"Cabeçalho do CSV: {erro}")
+            cabecalho = [c.strip() for c in registro]
+            continue
+        relatorio.linhas += 1
+        if erro:
+            relatorio.erro(numero, [erro])
+            continue
+        try:
+            if formato == "csv":
+                bruto = _converter_csv(cabecalho, registro)
+            else:
+                bruto = json.loads(registro)
+            doc = modelo.model_validate(bruto).model_dump(mode="json", exclude={"id"})
+        except ValidationError as e:
+            relatorio.erro(numero, _erros_validacao(e))
+            continue
+        except (ValueError, TypeError) as e:
+            relatorio.erro(numero, [f"linha mal formada: {e}"])
+            continue
+
+        relatorio.validas += 1
+        operacoes.append(operacao_upsert(colecao, doc))
+        numeros.append(numero)
+        if len(operacoes) >= tamanho_lote:
+            await _gravar(collection, operacoes, numeros, relatorio)
+            operacoes, numeros = [], []
+
+    if operacoes:
+        await _gravar(collection, operacoes, numeros, relatorio)
+    return relatorio.como_dict()
@@ -0,0 +1,133 @@
+"""Group commit das inserções de pedidos: vários POST /pedidos, um insert_many.
+
+No pico do almoço cada pedido custa uma ida ao banco (e uma espera pelo write
+concern). Com AGRUPAR_PEDIDOS=1 os pedidos que chegam numa janela de até
+AGRUPAR_ESPERA_MS (ou até juntar AGRUPAR_LOTE_MAX) são gravados juntos num
+insert_many(ordered=False): uma confirmação de escrita para o lote inteiro.
+
+Cada requisição espera o próprio resultado: erros do insert_many (ex.: codigo_pedido
+duplicado) voltam só para o pedido do índice que falhou, com as mesmas exceções
+que o insert_one levantaria (DuplicateKeyError, WriteError, WriteConcernError).
+Cancelar quem espera não tira o documento do lote: ele é gravado assim mesmo. Por
+isso criar_pedido (main.py) espera a criação através de asyncio.shield, e os
+efeitos que dependem do pedido gravado não se perdem com o cliente que desconecta.
+
+Para medir contra o caminho de um insert por requisição:
+
+    python -m bench.insercoes --banco mongo --produtores 64 --pedidos 20000
+"""
+import asyncio
+import logging
+import os
+from typing import List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError, WriteError
+
+logger = logging.getLogger("cardapio.coalescer")
+
+AGRUPAR_PEDIDOS = os.getenv("AGRUPAR_PEDIDOS", "0") == "1"
+AGRUPAR_LOTE_MAX = int(os.getenv("AGRUPAR_LOTE_MAX", "64"))
+AGRUPAR_ESPERA_MS = float(os.getenv("AGRUPAR_ESPERA_MS", "5"))
+# Write concern dos lotes; vazio usa o da coleção (MONGO_W_PEDIDOS, ver db.py)
+AGRUPAR_W = os.getenv("AGRUPAR_W", "")
+
+
+def _erro_do_documento(erro: dict) -> Exception:
+    if erro.get("code") in (11000, 11001, 12582):
+        return DuplicateKeyError(erro.get("errmsg"), erro.get("code"), erro)
+    return WriteError(erro.get("errmsg"), erro.get("code"), erro)
+
+
+class AgrupadorInsercoes:
+    def __init__(
+        self,
+        collection,
+        lote_max: int = AGRUPAR_LOTE_MAX,
+        espera_ms: float = AGRUPAR_ESPERA_MS,
+        w: str = AGRUPAR_W,
+    ):
+        if w:
+            collection = collection.with_options(
+                write_concern=WriteConcern(
+                    w=int(w) if w.isdigit() else w, wtimeout=collection.write_concern.document.get("wtimeout")
+                )
+            )
+        self.collection = collection
+        self.lote_max = lote_max
+        self.espera = espera_ms / 1000
+        self._fila: List[Tuple[dict, asyncio.Future]] = []
+        self._temporizador: Optional[asyncio.TimerHandle] = None
+        self._gravando: Set[asyncio.Task] = set()
+        self.lotes = 0
+        self.documentos = 0
+        self.maior_lote = 0
+        self.erros = 0
+
+    async def inserir(self, doc: dict) -> ObjectId:
+        """Enfileira `doc` e espera o lote dele ser gravado; preenche o _id como o insert_one."""
+        doc.setdefault("_id", ObjectId())
+        futuro = asyncio.get_running_loop().create_future()
+        self._fila.append((doc, futuro))
+        if len(self._fila) >= self.lote_max:
+            self._disparar()
+        elif self._temporizador is None:
+            self._temporizador = asyncio.get_running_loop().call_later(self.espera, self._disparar)
+        await futuro
+        return doc["_id"]
+
+    def _disparar(self) -> None:
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        if not self._fila:
+            return
+        lote, self._fila = self._fila, []
+        tarefa = asyncio.create_task(self._gravar(lote))
+        self._gravando.add(tarefa)
+        tarefa.add_done_callback(self._gravando.discard)
+
+    async def _gravar(self, lote: List[Tuple[dict, asyncio.Future]]) -> None:
+        erros, erro_concern = {}, None
+        try:
+            await self.collection.insert_many([doc for doc, _ in lote], ordered=False)
+        except BulkWriteError as erro:
+            erros = {e["index"]: _erro_do_documento(e) for e in erro.details.get("writeErrors", [])}
+            if erro.details.get("writeConcernErrors"):
+                primeiro = erro.details["writeConcernErrors"][0]
+                erro_concern = WriteConcernError(primeiro.get("errmsg"), primeiro.get("code"), primeiro)
+        except Exception as erro:
+            # Falha do lote inteiro (rede, timeout de seleção...): todos recebem o mesmo erro
+            logger.warning("Falha ao gravar lote de %s pedido(s): %s", len(lote), erro)
+            erros = {i: erro for i in range(len(lote))}
+
+        self.lotes += 1
+        self.documentos += len(lote)
+        self.maior_lote = max(self.maior_lote, len(lote))
+        self.erros += len(erros)
+        for i, (_, futuro) in enumerate(lote):
+            if futuro.done():  # requisição cancelada enquanto esperava
+                continue
+            erro = erros.get(i) or erro_concern
+            if erro is None:
+                futuro.set_result(None)
+            else:
+                futuro.set_exception(erro)
+
+    async def esvaziar(self) -> None:
+        """Grava o que estiver na fila e espera os lotes em andamento (desligamento)."""
+        self._disparar()
+        if self._gravando:
+            await asyncio.gather(*self._gravando, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "ativo": AGRUPAR_PEDIDOS,
+            "na_fila": len(self._fila),
+            "lotes": self.lotes,
+            "documentos": self.documentos,
+            "media_por_lote": self.documentos / self.lotes if self.lotes else 0.0,
+            "maior_lote": self.maior_lote,
+            "erros": self.erros,
+        }
@@ -1,16 +1,112 @@
 import motor.motor_asyncio
 from dotenv import load_dotenv
+from importlib.util import find_spec
+from pymongo import ReadPreference, WriteConcern
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+import asyncio
+import logging
 import os
 
 load_dotenv()
 
+from profiler import listeners
+
+logger = logging.getLogger("cardapio.db")
+
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB = os.getenv("MONGO_DB")
 
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGO_URI)
+# Pool de conexões e timeouts (valores na URI também valem; estes têm precedência)
+MONGO_MAX_POOL = int(os.getenv("MONGO_MAX_POOL", "100"))
+MONGO_MIN_POOL = int(os.getenv("MONGO_MIN_POOL", "10"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+# Compressão de rede, em ordem de preferência; zstd/snappy só entram se o módulo estiver instalado
+MONGO_COMPRESSORES = os.getenv("MONGO_COMPRESSORES", "zstd,snappy,zlib")
+# Leituras do catálogo: "primary" (padrão) ou "secondaryPreferred" para aliviar o primário
+MONGO_LEITURA_CATALOGO = os.getenv("MONGO_LEITURA_CATALOGO", "primary")
+# Com leitura em secundário: atraso máximo aceito de replicação (mínimo de 90 s no MongoDB)
+MONGO_MAX_STALENESS_SEGUNDOS = int(os.getenv("MONGO_MAX_STALENESS_SEGUNDOS", "90"))
+# Escritas de pedidos (e do contador de codigo_pedido)
+MONGO_W_PEDIDOS = os.getenv("MONGO_W_PEDIDOS", "majority")
+MONGO_WTIMEOUT_MS = int(os.getenv("MONGO_WTIMEOUT_MS", "5000"))
+
+_MODULOS_COMPRESSAO = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+def _compressores() -> str:
+    disponiveis = []
+    for nome in (c.strip() for c in MONGO_COMPRESSORES.split(",") if c.strip()):
+        if find_spec(_MODULOS_COMPRESSAO.get(nome, nome)) is None:
+            logger.info("Compressão %s indisponível (módulo não instalado); ignorada", nome)
+            continue
+        disponiveis.append(nome)
+    return ",".join(disponiveis)
+
+
+def _leitura_catalogo():
+    modo = read_pref_mode_from_name(MONGO_LEITURA_CATALOGO)
+    if modo == ReadPreference.PRIMARY.mode:
+        return ReadPreference.PRIMARY
+    return make_read_preference(modo, None, max_staleness=MONGO_MAX_STALENESS_SEGUNDOS)
+
+
+def _w(valor: str):
+    return int(valor) if valor.isdigit() else valor
+
+
+COMPRESSORES = _compressores()
+
+# connect=False: nada é aberto na importação (scripts e testes importam este módulo);
+# a API conecta e aquece o pool em conectar(), chamado no lifespan, e fecha em fechar()
+# O perfilador de comandos (profiler.py) cronometra tudo que passa por este client
+client = motor.motor_asyncio.AsyncIOMotorClient(
+    MONGO_URI,
+    connect=False,
+    maxPoolSize=MONGO_MAX_POOL,
+    minPoolSize=MONGO_MIN_POOL,
+    maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    compressors=COMPRESSORES or None,
+    event_listeners=listeners(),
+)
 db = client[MONGO_DB]
 
+escrita_pedidos = WriteConcern(w=_w(MONGO_W_PEDIDOS), wtimeout=MONGO_WTIMEOUT_MS)
+leitura_catalogo = _leitura_catalogo()
+
 usuarios_collection = db.get_collection("usuarios")
 produtos_collection = db.get_collection("produtos")
 componentes_collection = db.get_collection("componentes")
-pedidos_collection = db.get_collection("pedidos")
+pedidos_collection = db.get_collection("pedidos", write_concern=escrita_pedidos)
+counters_collection = db.get_collection("counters", write_concern=escrita_pedidos)
+vendas_diarias_collection = db.get_collection("vendas_diarias")
+cardapio_collection = db.get_collection("cardapio_materializado")
+producao_collection = db.get_collection("producao")
+bairros_collection = db.get_collection("bairros")
+# Respostas de POST /pedidos por Idempotency-Key (idempotency.py), com TTL
+idempotencia_collection = db.get_collection("idempotencia", write_concern=escrita_pedidos)
+
+# Leituras de vitrine do catálogo (listagens, detalhe, exportação). Escritas e o
+# índice de preços usam sempre as coleções acima, que leem do primário.
+produtos_leitura_collection = db.get_collection("produtos", read_preference=leitura_catalogo)
+componentes_leitura_collection = db.get_collection("componentes", read_preference=leitura_catalogo)
+
+
+async def conectar(aquecer: int = MONGO_MIN_POOL) -> None:
+    """Confirma o acesso ao MongoDB e abre `aquecer` conexões antes da primeira requisição."""
+    await client.admin.command("ping")
+    # Pings simultâneos forçam o pool a abrir conexões agora, e não no primeiro pico
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(0, aquecer - 1))))
+    if leitura_catalogo is not ReadPreference.PRIMARY:
+        await db.command("ping", read_preference=leitura_catalogo)
+    logger.info("MongoDB conectado (pool %s-%s, compressão: %s, catálogo: %s)",
+                MONGO_MIN_POOL, MONGO_MAX_POOL, COMPRESSORES or "nenhuma", MONGO_LEITURA_CATALOGO)
+
+
+def fechar() -> None:
+    client.close()
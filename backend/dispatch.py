@@ -0,0 +1,159 @@
+"""Despacho de entregas: pedidos DELIVERY prontos agrupados por bairro, em memória.
+
+Para cada bairro (nome normalizado: sem acento, minúsculas) o índice guarda a taxa
+de entrega, vinda da coleção `bairros`, e os pedidos PRONTO esperando motoboy,
+do mais antigo para o mais novo (data_criacao). A mesma tabela dá a taxa de
+POST /pedidos; bairro fora da tabela paga TAXA_ENTREGA_PADRAO_CENTAVOS.
+
+As rotas de status mantêm o índice (`atualizar` com o pedido depois da mudança:
+entra ao ficar PRONTO, sai em qualquer outro status), em O(1) por pedido no caso
+comum. Como o pricing.IndiceCardapio, é recarregado por inteiro a cada
+INDICE_RECARGA_SEGUNDOS para pegar mudanças feitas por outros workers.
+
+`propor` monta as viagens: por bairro, lotes de até `max_pedidos`; a viagem está
+pronta para sair quando enche ou quando o pedido mais antigo já espera
+`espera_max` desde a criação.
+"""
+import asyncio
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pricing import INDICE_RECARGA_SEGUNDOS
+from search import normalizar
+
+TAXA_ENTREGA_PADRAO_CENTAVOS = int(os.getenv("TAXA_ENTREGA_PADRAO_CENTAVOS", "1000"))
+
+_ESPACOS = re.compile(r"\s+")
+
+
+def chave_bairro(nome: str) -> str:
+    return _ESPACOS.sub(" ", normalizar(nome)).strip()
+
+
+def _valor(campo):
+    return getattr(campo, "value", campo)
+
+
+class IndiceDespacho:
+    def __init__(self):
+        # chave do bairro -> {"nome", "taxa_entrega_centavos", "pedidos": {id: entrada}}
+        self.bairros: Dict[str, dict] = {}
+        # id do pedido -> chave do bairro em que está na fila
+        self.fila_de: Dict[str, str] = {}
+        self.carregado_em = 0.0
+        self._lock = asyncio.Lock()
+
+    def _bairro(self, nome: str) -> dict:
+        chave = chave_bairro(nome)
+        bairro = self.bairros.get(chave)
+        if bairro is None:
+            bairro = self.bairros[chave] = {"nome": nome.strip(), "taxa_entrega_centavos": None, "pedidos": {}}
+        return bairro
+
+    # --- Tabela de taxas ---
+
+    def taxa(self, nome_bairro: str) -> int:
+        bairro = self.bairros.get(chave_bairro(nome_bairro))
+        taxa = bairro["taxa_entrega_centavos"] if bairro else None
+        return TAXA_ENTREGA_PADRAO_CENTAVOS if taxa is None else taxa
+
+    def definir_bairro(self, doc: dict) -> None:
+        bairro = self._bairro(doc["nome"])
+        bairro["nome"] = doc["nome"]
+        bairro["taxa_entrega_centavos"] = doc["taxa_entrega_centavos"]
+
+    def remover_bairro(self, nome: str) -> None:
+        bairro = self.bairros.get(chave_bairro(nome))
+        if bairro is None:
+            return
+        bairro["taxa_entrega_centavos"] = None
+        if not bairro["pedidos"]:
+            del self.bairros[chave_bairro(nome)]
+
+    def tabela(self) -> List[dict]:
+        return sorted(
+            ({"nome": b["nome"], "taxa_entrega_centavos": b["taxa_entrega_centavos"]}
+             for b in self.bairros.values() if b["taxa_entrega_centavos"] is not None),
+            key=lambda b: chave_bairro(b["nome"]),
+        )
+
+    # --- Fila de despacho ---
+
+    def _retirar(self, id: str) -> None:
+        chave = self.fila_de.pop(id, None)
+        if chave is None:
+            return
+        bairro = self.bairros[chave]
+        del bairro["pedidos"][id]
+        if not bairro["pedidos"] and bairro["taxa_entrega_centavos"] is None:
+            del self.bairros[chave]
+
+    def atualizar(self, pedido: dict) -> None:
+        """Coloca o pedido na fila do bairro se for DELIVERY PRONTO; senão, tira."""
+        id = str(pedido["_id"])
+        self._retirar(id)
+        entrega = pedido.get("entrega") or {}
+        if _valor(pedido.get("status")) != "PRONTO" or _valor(pedido.get("modalidade")) != "DELIVERY" or not entrega.get("bairro"):
+            return
+        bairro = self._bairro(entrega["bairro"])
+        fila = bairro["pedidos"]
+        entrada = {
+            "_id": id,
+            "codigo_pedido": pedido.get("codigo_pedido"),
+            "data_criacao": pedido["data_criacao"],
+            "cliente": (pedido.get("cliente") or {}).get("nome"),
+            "logradouro": entrega.get("logradouro"),
+            "numero": entrega.get("numero"),
+            "valor_total_centavos": pedido.get("valor_total_centavos", 0),
+        }
+        ultimo = next(reversed(fila.values()), None) if fila else None
+        fila[id] = entrada
+        # Pedidos costumam ficar prontos na ordem em que chegaram; fora de ordem, reordena o bairro
+        if ultimo is not None and ultimo["data_criacao"] > entrada["data_criacao"]:
+            bairro["pedidos"] = dict(sorted(fila.items(), key=lambda kv: (kv[1]["data_criacao"], kv[0])))
+        self.fila_de[id] = chave_bairro(entrega["bairro"])
+
+    def remover(self, id: str) -> None:
+        self._retirar(id)
+
+    async def carregar(self, bairros_collection, pedidos_collection) -> None:
+        novo = IndiceDespacho()
+        async for doc in bairros_collection.find({}):
+            novo.definir_bairro(doc)
+        async for doc in pedidos_collection.find({"status": "PRONTO", "modalidade": "DELIVERY"}).sort("data_criacao", 1):
+            novo.atualizar(doc)
+        self.bairros, self.fila_de = novo.bairros, novo.fila_de
+        self.carregado_em = time.monotonic()
+
+    async def garantir_atualizado(self, bairros_collection, pedidos_collection) -> None:
+        if time.monotonic() - self.carregado_em < INDICE_RECARGA_SEGUNDOS:
+            return
+        async with self._lock:
+            if time.monotonic() - self.carregado_em >= INDICE_RECARGA_SEGUNDOS:
+                await self.carregar(bairros_collection, pedidos_collection)
+
+    def propor(self, max_pedidos: int, espera_max: timedelta, agora: Optional[datetime] = None) -> dict:
+        agora = agora or datetime.now()
+        viagens = []
+        for bairro in self.bairros.values():
+            pedidos = list(bairro["pedidos"].values())
+            for inicio in range(0, len(pedidos), max_pedidos):
+                lote = pedidos[inicio:inicio + max_pedidos]
+                espera = agora - lote[0]["data_criacao"]
+                cheia = len(lote) == max_pedidos
+                viagens.append({
+                    "bairro": bairro["nome"],
+                    "pedidos": lote,
+                    "espera_minutos": round(espera.total_seconds() / 60, 1),
+                    "pronta": cheia or espera >= espera_max,
+                    "motivo": "cheia" if cheia else "espera" if espera >= espera_max else None,
+                })
+        # Prontas primeiro; dentro de cada grupo, quem espera há mais tempo
+        viagens.sort(key=lambda v: (not v["pronta"], -v["espera_minutos"]))
+        return {"pedidos_aguardando": len(self.fila_de), "viagens": viagens}
+
+
+indice_despacho = IndiceDespacho()
@@ -0,0 +1,200 @@
+"""Feed em tempo real dos pedidos (cozinha / painel admin).
+
+Os handlers de pedidos publicam eventos num barramento em memória; cada conexão
+SSE ou WebSocket é um assinante com fila própria e limitada. Um assinante lento
+não segura os outros: quando a fila dele enche, os eventos pendentes são
+descartados e ele recebe um evento `resync`, sinal para recarregar GET /pedidos.
+
+Cada evento tem um id `<boot>-<seq>` que serve de token de retomada
+(`Last-Event-ID` no SSE, `?desde=` em ambos). Se o id ainda estiver no buffer,
+a conexão retoma do ponto; se não (buffer rodou, processo reiniciou), vem `resync`.
+
+Os eventos trazem o pedido com os dados do cliente: as duas rotas exigem token de
+ADMIN (header Authorization no SSE, `?token=` no WebSocket).
+
+Com PEDIDOS_CHANGE_STREAM=1 e um replica set, os eventos passam a vir do change
+stream de `pedidos`, enxergando escritas de todos os workers.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, List, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from pagination import documento_para_json
+
+logger = logging.getLogger("cardapio.events")
+
+EVENTOS_BUFFER = int(os.getenv("EVENTOS_BUFFER", "1000"))
+EVENTOS_FILA_ASSINANTE = int(os.getenv("EVENTOS_FILA_ASSINANTE", "256"))
+EVENTOS_HEARTBEAT_SEGUNDOS = float(os.getenv("EVENTOS_HEARTBEAT_SEGUNDOS", "15"))
+USAR_CHANGE_STREAM = os.getenv("PEDIDOS_CHANGE_STREAM", "0") == "1"
+
+PEDIDO_CRIADO = "pedido_criado"
+STATUS_ALTERADO = "status_alterado"
+PEDIDO_ATUALIZADO = "pedido_atualizado"
+RESYNC = "resync"
+
+# Campos enviados num status_alterado: o cliente já tem o resto do pedido
+_CAMPOS_STATUS = ("_id", "codigo_pedido", "status", "modalidade")
+
+
+class Assinante:
+    def __init__(self, tamanho_fila: int):
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=tamanho_fila)
+        self.descartados = 0
+
+    def entregar(self, evento: dict) -> None:
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Backpressure: esvazia a fila e pede para o cliente ressincronizar
+            self.descartados += self.fila.qsize()
+            while not self.fila.empty():
+                self.fila.get_nowait()
+            self.fila.put_nowait({"id": evento["id"], "tipo": RESYNC, "dados": None})
+
+
+class BarramentoPedidos:
+    def __init__(self, tamanho_buffer: int = EVENTOS_BUFFER, tamanho_fila: int = EVENTOS_FILA_ASSINANTE):
+        self.boot = format(int(time.time() * 1000), "x")
+        self.seq = 0
+        self.tamanho_fila = tamanho_fila
+        self.buffer: Deque[dict] = deque(maxlen=tamanho_buffer)
+        self.assinantes: Set[Assinante] = set()
+        self.publicados = 0
+
+    def _novo_id(self) -> str:
+        self.seq += 1
+        return f"{self.boot}-{self.seq}"
+
+    def publicar(self, tipo: str, dados: Any) -> dict:
+        evento = {"id": self._novo_id(), "tipo": tipo, "dados": dados}
+        self.buffer.append(evento)
+        self.publicados += 1
+        for assinante in self.assinantes:
+            assinante.entregar(evento)
+        return evento
+
+    def _resync(self) -> dict:
+        # Aponta para o último evento emitido: depois de recarregar, o cliente retoma daqui
+        return {"id": f"{self.boot}-{self.seq}", "tipo": RESYNC, "dados": None}
+
+    def _pendentes_desde(self, ultimo_id: Optional[str]) -> List[dict]:
+        if not ultimo_id:
+            return []
+        boot, _, seq = ultimo_id.partition("-")
+        try:
+            seq = int(seq)
+        except ValueError:
+            return [self._resync()]
+        mais_antigo = int(self.buffer[0]["id"].split("-")[1]) if self.buffer else self.seq + 1
+        if boot != self.boot or seq < mais_antigo - 1:
+            return [self._resync()]
+        return [e for e in self.buffer if int(e["id"].split("-")[1]) > seq]
+
+    def assinar(self, ultimo_id: Optional[str] = None) -> Assinante:
+        assinante = Assinante(self.tamanho_fila)
+        # Sem await entre o replay e o registro: nenhum evento se perde no meio
+        for evento in self._pendentes_desde(ultimo_id):
+            assinante.entregar(evento)
+        self.assinantes.add(assinante)
+        return assinante
+
+    def cancelar(self, assinante: Assinante) -> None:
+        self.assinantes.discard(assinante)
+
+    def stats(self) -> dict:
+        return {
+            "assinantes": len(self.assinantes),
+            "publicados": self.publicados,
+            "buffer": len(self.buffer),
+            "change_stream": USAR_CHANGE_STREAM,
+        }
+
+
+barramento_pedidos = BarramentoPedidos()
+
+
+# --- Publicação a partir dos handlers ---
+
+def _resumo_status(pedido: dict) -> dict:
+    return {campo: pedido.get(campo) for campo in _CAMPOS_STATUS}
+
+
+def publicar_pedido(tipo: str, pedido: Optional[dict]) -> None:
+    # Com change stream ativo quem publica é o watcher, senão o evento sairia duplicado
+    if USAR_CHANGE_STREAM or pedido is None:
+        return
+    dados = _resumo_status(pedido) if tipo == STATUS_ALTERADO else pedido
+    barramento_pedidos.publicar(tipo, documento_para_json(dados))
+
+
+async def acompanhar_change_stream(pedidos_collection) -> None:
+    """Publica no barramento os inserts/updates vistos no change stream de `pedidos`."""
+    token = None
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+    while True:
+        try:
+            async with pedidos_collection.watch(
+                pipeline, full_document="updateLookup", resume_after=token
+            ) as stream:
+                async for mudanca in stream:
+                    token = mudanca["_id"]
+                    pedido = mudanca.get("fullDocument")
+                    if pedido is None:
+                        continue
+                    if mudanca["operationType"] == "insert":
+                        tipo, dados = PEDIDO_CRIADO, pedido
+                    elif set(mudanca.get("updateDescription", {}).get("updatedFields", {})) == {"status"}:
+                        tipo, dados = STATUS_ALTERADO, _resumo_status(pedido)
+                    else:
+                        tipo, dados = PEDIDO_ATUALIZADO, pedido
+                    barramento_pedidos.publicar(tipo, documento_para_json(dados))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Change stream de pedidos interrompido; reconectando")
+            await asyncio.sleep(1)
+
+
+# --- Transporte ---
+
+async def eventos(assinante: Assinante) -> AsyncIterator[Optional[dict]]:
+    # Gera os eventos do assinante; None a cada heartbeat sem eventos
+    while True:
+        try:
+            yield await asyncio.wait_for(assinante.fila.get(), timeout=EVENTOS_HEARTBEAT_SEGUNDOS)
+        except asyncio.TimeoutError:
+            yield None
+
+
+async def stream_sse(ultimo_id: Optional[str]) -> AsyncIterator[bytes]:
+    assinante = barramento_pedidos.assinar(ultimo_id)
+    try:
+        yield b"retry: 3000\n\n"
+        async for evento in eventos(assinante):
+            if evento is None:
+                yield b": heartbeat\n\n"
+                continue
+            dados = json.dumps(evento["dados"], ensure_ascii=False)
+            yield f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {dados}\n\n".encode()
+    finally:
+        barramento_pedidos.cancelar(assinante)
+
+
+async def servir_websocket(websocket: WebSocket, ultimo_id: Optional[str]) -> None:
+    await websocket.accept()
+    assinante = barramento_pedidos.assinar(ultimo_id)
+    try:
+        async for evento in eventos(assinante):
+            # O heartbeat também serve para descobrir que o cliente caiu
+            await websocket.send_json(evento or {"tipo": "heartbeat"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        barramento_pedidos.cancelar(assinante)
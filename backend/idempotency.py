@@ -0,0 +1,217 @@
+"""Idempotency-Key em POST /pedidos: a repetição devolve a resposta original.
+
+Clientes móveis em rede ruim reenviam o POST; com o header `Idempotency-Key` o
+pedido é criado uma vez só e as repetições recebem a mesma resposta (status e
+corpo JSON já serializado), com o header `Idempotent-Replayed: true`.
+
+- Coleção `idempotencia`: a chave é o _id. Quem consegue inserir a reserva
+  (estado EM_ANDAMENTO) executa; os demais esperam a conclusão. O índice TTL em
+  `criado_em` (indexes.py) apaga as chaves sozinho depois de IDEMPOTENCIA_TTL_SEGUNDOS.
+- LRU em memória na frente: repetições no mesmo worker não vão ao banco, e
+  requisições simultâneas com a mesma chave esperam a mesma execução.
+- A mesma chave com outro corpo é recusada (422). Se a execução falha antes de
+  gravar, a reserva é apagada e o cliente pode tentar de novo com a mesma chave.
+- `executar` recebe `concluir(corpo)` e o chama assim que o efeito está gravado
+  (o insert do pedido): dali em diante a chave fica CONCLUIDO mesmo que o resto
+  falhe, e a repetição devolve o pedido em vez de criar outro.
+- A execução roda numa tarefa protegida (asyncio.shield): se o cliente desconecta
+  no meio, a requisição é cancelada mas o pedido e a chave terminam de ser gravados.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pymongo.errors import DuplicateKeyError
+
+IDEMPOTENCIA_TTL_SEGUNDOS = int(os.getenv("IDEMPOTENCIA_TTL_SEGUNDOS", "86400"))
+IDEMPOTENCIA_LRU = int(os.getenv("IDEMPOTENCIA_LRU", "10000"))
+# Quanto uma repetição espera a execução em andamento (em outro worker) antes do 409
+IDEMPOTENCIA_ESPERA_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_ESPERA_SEGUNDOS", "5"))
+# Reserva sem conclusão há mais que isso é de um worker que caiu: pode ser retomada
+IDEMPOTENCIA_RESERVA_SEGUNDOS = float(os.getenv("IDEMPOTENCIA_RESERVA_SEGUNDOS", "30"))
+
+HEADER_CHAVE = "Idempotency-Key"
+HEADER_REPETIDA = "Idempotent-Replayed"
+TAMANHO_MAXIMO_CHAVE = 255
+
+EM_ANDAMENTO = "EM_ANDAMENTO"
+CONCLUIDO = "CONCLUIDO"
+
+# (status, corpo JSON)
+Resposta = Tuple[int, bytes]
+
+
+def impressao(corpo: bytes) -> str:
+    return hashlib.blake2b(corpo, digest_size=16).hexdigest()
+
+
+def _resposta(status_code: int, corpo: bytes, repetida: bool) -> Response:
+    resposta = Response(content=corpo, status_code=status_code, media_type="application/json")
+    if repetida:
+        resposta.headers[HEADER_REPETIDA] = "true"
+    return resposta
+
+
+class ChavesIdempotencia:
+    def __init__(self, capacidade: int = IDEMPOTENCIA_LRU):
+        self.capacidade = capacidade
+        # chave -> (impressão, resposta, expira_em em time.monotonic)
+        self._lru: "OrderedDict[str, Tuple[str, Resposta, float]]" = OrderedDict()
+        self._em_andamento: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.execucoes = 0
+        self.repeticoes_memoria = 0
+        self.repeticoes_banco = 0
+        self.coalescidas = 0
+
+    def _lembrar(self, chave: str, digest: str, resposta: Resposta, criado_em: datetime) -> None:
+        restante = IDEMPOTENCIA_TTL_SEGUNDOS - (datetime.now() - criado_em).total_seconds()
+        self._lru[chave] = (digest, resposta, time.monotonic() + restante)
+        self._lru.move_to_end(chave)
+        while len(self._lru) > self.capacidade:
+            self._lru.popitem(last=False)
+
+    def _da_memoria(self, chave: str) -> Optional[Tuple[str, Resposta]]:
+        entrada = self._lru.get(chave)
+        if entrada is None:
+            return None
+        if entrada[2] <= time.monotonic():
+            del self._lru[chave]
+            return None
+        self._lru.move_to_end(chave)
+        return entrada[0], entrada[1]
+
+    @staticmethod
+    def _conferir(digest: str, esperado: str) -> None:
+        if digest != esperado:
+            raise HTTPException(
+                status_code=422, detail=f"{HEADER_CHAVE} já usada com outro conteúdo de requisição"
+            )
+
+    async def _reservar(self, colecao, chave: str, digest: str) -> Optional[Resposta]:
+        """Reserva a chave no banco; devolve a resposta guardada se outra execução já concluiu."""
+        limite_espera = time.monotonic() + IDEMPOTENCIA_ESPERA_SEGUNDOS
+        while True:
+            agora = datetime.now()
+            try:
+                await colecao.insert_one({"_id": chave, "impressao": digest, "estado": EM_ANDAMENTO, "criado_em": agora})
+                return None
+            except DuplicateKeyError:
+                pass
+            doc = await colecao.find_one({"_id": chave})
+            if doc is None:
+                continue  # expirou ou foi liberada entre o insert e o find
+            self._conferir(doc["impressao"], digest)
+            if doc["estado"] == CONCLUIDO:
+                if (agora - doc["criado_em"]).total_seconds() < IDEMPOTENCIA_TTL_SEGUNDOS:
+                    self.repeticoes_banco += 1
+                    resposta = (doc["status_code"], bytes(doc["corpo"]))
+                    self._lembrar(chave, digest, resposta, doc["criado_em"])
+                    return resposta
+                # Vencida mas ainda não apagada pelo TTL do MongoDB (roda a cada ~60 s)
+                await colecao.delete_one({"_id": chave, "criado_em": doc["criado_em"]})
+                continue
+            if (agora - doc["criado_em"]).total_seconds() > IDEMPOTENCIA_RESERVA_SEGUNDOS:
+                await colecao.delete_one({"_id": chave, "estado": EM_ANDAMENTO, "criado_em": doc["criado_em"]})
+                continue
+            if time.monotonic() >= limite_espera:
+                raise HTTPException(
+                    status_code=409, detail=f"Requisição com esta {HEADER_CHAVE} ainda em processamento"
+                )
+            await asyncio.sleep(0.05)
+
+    async def _executar(
+        self,
+        colecao,
+        chave: str,
+        digest: str,
+        status_code: int,
+        executar: Callable[[Callable[[bytes], Awaitable[None]]], Awaitable[bytes]],
+    ) -> Tuple[Resposta, bool]:
+        guardada = await self._reservar(colecao, chave, digest)
+        if guardada is not None:
+            return guardada, True
+        concluida: List[Resposta] = []
+
+        async def concluir(corpo: bytes) -> None:
+            resposta = (status_code, corpo)
+            criado_em = datetime.now()
+            # Marca o efeito como gravado antes de ir ao banco: se o update falhar, a reserva
+            # não é liberada (a repetição não cria outro pedido) e este worker já responde da memória
+            concluida.append(resposta)
+            self._lembrar(chave, digest, resposta, criado_em)
+            await colecao.update_one(
+                {"_id": chave},
+                {"$set": {"estado": CONCLUIDO, "status_code": status_code, "corpo": corpo, "criado_em": criado_em}},
+            )
+
+        try:
+            corpo = await executar(concluir)
+        except BaseException:
+            # Só libera a chave se nada foi gravado; senão a repetição criaria outro pedido
+            if not concluida:
+                await colecao.delete_one({"_id": chave, "estado": EM_ANDAMENTO})
+            raise
+        self.execucoes += 1
+        if not concluida:
+            await concluir(corpo)
+        return concluida[0], False
+
+    async def responder(
+        self,
+        colecao,
+        chave: str,
+        corpo_requisicao: bytes,
+        status_code: int,
+        executar: Callable[[Callable[[bytes], Awaitable[None]]], Awaitable[bytes]],
+    ) -> Response:
+        """Executa `executar(concluir)` (que devolve o corpo JSON) uma única vez por chave."""
+        if not chave or len(chave) > TAMANHO_MAXIMO_CHAVE:
+            raise HTTPException(status_code=400, detail=f"{HEADER_CHAVE} deve ter de 1 a {TAMANHO_MAXIMO_CHAVE} caracteres")
+        digest = impressao(corpo_requisicao)
+
+        lembrada = self._da_memoria(chave)
+        if lembrada is not None:
+            self._conferir(lembrada[0], digest)
+            self.repeticoes_memoria += 1
+            return _resposta(*lembrada[1], repetida=True)
+
+        em_andamento = self._em_andamento.get(chave)
+        if em_andamento is not None:
+            self._conferir(em_andamento[0], digest)
+            self.coalescidas += 1
+            resposta, _ = await asyncio.shield(em_andamento[1])
+            return _resposta(*resposta, repetida=True)
+
+        tarefa = asyncio.ensure_future(self._executar(colecao, chave, digest, status_code, executar))
+        self._em_andamento[chave] = (digest, tarefa)
+
+        def encerrar(concluida: asyncio.Future) -> None:
+            if self._em_andamento.get(chave, (None, None))[1] is concluida:
+                del self._em_andamento[chave]
+            if not concluida.cancelled():
+                # Marca a exceção como lida: quem esperava pode ter sido cancelado
+                concluida.exception()
+
+        tarefa.add_done_callback(encerrar)
+        # Cliente desconectado cancela só a espera; a tarefa termina de gravar o pedido e a chave
+        resposta, repetida = await asyncio.shield(tarefa)
+        return _resposta(*resposta, repetida=repetida)
+
+    def stats(self) -> dict:
+        return {
+            "em_memoria": len(self._lru),
+            "em_andamento": len(self._em_andamento),
+            "execucoes": self.execucoes,
+            "repeticoes_memoria": self.repeticoes_memoria,
+            "repeticoes_banco": self.repeticoes_banco,
+            "coalescidas": self.coalescidas,
+        }
+
+
+chaves_pedidos = ChavesIdempotencia()
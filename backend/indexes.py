@@ -0,0 +1,200 @@
+"""Índices declarados por coleção e reconciliação com o que existe no MongoDB.
+
+Na subida da API (lifespan) os índices faltando são criados em segundo plano e
+diferenças são registradas no log. Também pode ser usado pela linha de comando
+(na pasta backend):
+
+    python indexes.py status     # mostra o que falta / sobra em cada coleção
+    python indexes.py criar      # cria os índices faltando
+    python indexes.py explain    # plano vencedor das consultas mais usadas pela API
+"""
+import asyncio
+import logging
+import sys
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from idempotency import IDEMPOTENCIA_TTL_SEGUNDOS
+
+logger = logging.getLogger("cardapio.indexes")
+
+def _indice(chaves, **opcoes) -> IndexModel:
+    # background é ignorado a partir do MongoDB 4.2, mas evita travar versões antigas
+    return IndexModel(chaves, background=True, **opcoes)
+
+
+# Histórico do cliente ("meus pedidos"): filtro por telefone ou CPF, ordem keyset
+# (data_criacao, _id) e os campos do resumo no próprio índice, para a listagem
+# ser respondida só com o índice (PROJECTION_COVERED, sem FETCH)
+CAMPOS_RESUMO_PEDIDO = ("codigo_pedido", "status", "modalidade", "valor_total_centavos")
+PROJECAO_RESUMO_PEDIDO = {campo: 1 for campo in ("_id", "data_criacao", *CAMPOS_RESUMO_PEDIDO)}
+
+
+def _indice_historico(campo_cliente: str) -> IndexModel:
+    return _indice(
+        [(campo_cliente, ASCENDING), ("data_criacao", DESCENDING), ("_id", DESCENDING)]
+        + [(campo, ASCENDING) for campo in CAMPOS_RESUMO_PEDIDO]
+    )
+
+
+INDICES_HISTORICO = [_indice_historico("cliente.telefone"), _indice_historico("cliente.cpf_nota")]
+
+# Nome da coleção -> índices esperados. Os nomes são os gerados pelo MongoDB
+# (ex.: codigo_pedido_1), e a reconciliação compara por nome para achar chaves/opções divergentes.
+INDICES: Dict[str, List[IndexModel]] = {
+    "usuarios": [
+        _indice([("email", ASCENDING)], unique=True),
+    ],
+    "pedidos": [
+        _indice([("codigo_pedido", ASCENDING)], unique=True),
+        # _id no fim cobre a ordenação (data_criacao, _id) da paginação keyset
+        _indice([("status", ASCENDING), ("data_criacao", DESCENDING), ("_id", DESCENDING)]),
+        _indice([("data_criacao", DESCENDING), ("_id", DESCENDING)]),
+        *INDICES_HISTORICO,
+    ],
+    "produtos": [
+        _indice([("ativo", ASCENDING), ("categoria", ASCENDING)]),
+        _indice([("tags_dieteticas", ASCENDING)]),
+    ],
+    "componentes": [
+        _indice([("ativo", ASCENDING), ("tipo", ASCENDING)]),
+        _indice([("tags_dieteticas", ASCENDING)]),
+    ],
+    "idempotencia": [
+        # TTL: o MongoDB apaga as chaves vencidas sozinho
+        _indice([("criado_em", ASCENDING)], expireAfterSeconds=IDEMPOTENCIA_TTL_SEGUNDOS),
+    ],
+}
+
+# Opções que, se diferentes, fazem o índice existente ser considerado divergente
+_OPCOES_COMPARADAS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _chaves(spec) -> list:
+    return [(campo, int(direcao) if isinstance(direcao, (int, float)) else direcao) for campo, direcao in spec]
+
+
+async def diferencas(db) -> Dict[str, dict]:
+    """Compara INDICES com index_information() de cada coleção."""
+    relatorio = {}
+    for nome_colecao, modelos in INDICES.items():
+        existentes = await db[nome_colecao].index_information()
+        existentes.pop("_id_", None)
+        faltando, divergentes = [], []
+        for modelo in modelos:
+            doc = modelo.document
+            atual = existentes.pop(doc["name"], None)
+            if atual is None:
+                faltando.append(doc["name"])
+                continue
+            mesma_chave = _chaves(atual["key"]) == _chaves(doc["key"].items())
+            mesmas_opcoes = all(atual.get(op) == doc.get(op) for op in _OPCOES_COMPARADAS)
+            if not (mesma_chave and mesmas_opcoes):
+                divergentes.append(doc["name"])
+        relatorio[nome_colecao] = {
+            "faltando": faltando,
+            "divergentes": divergentes,
+            "extras": sorted(existentes),
+        }
+    return relatorio
+
+
+async def reconciliar(db) -> Dict[str, dict]:
+    """Cria os índices faltando e registra no log o que ficou diferente.
+
+    Índices divergentes ou extras nunca são removidos automaticamente: isso fica
+    para quem administra o banco, já que um drop em produção é caro de desfazer.
+    """
+    relatorio = await diferencas(db)
+    for nome_colecao, estado in relatorio.items():
+        faltando = [m for m in INDICES[nome_colecao] if m.document["name"] in estado["faltando"]]
+        for modelo in faltando:
+            try:
+                await db[nome_colecao].create_indexes([modelo])
+                logger.info("Índice %s.%s criado", nome_colecao, modelo.document["name"])
+            except OperationFailure as e:
+                # Ex.: índice único sobre dados antigos com duplicados
+                logger.warning("Não foi possível criar %s.%s: %s", nome_colecao, modelo.document["name"], e)
+        if estado["divergentes"] or estado["extras"]:
+            logger.warning(
+                "Índices de %s fora do declarado: divergentes=%s extras=%s",
+                nome_colecao, estado["divergentes"], estado["extras"],
+            )
+    return relatorio
+
+
+async def reconciliar_em_segundo_plano(db) -> None:
+    # Usado no lifespan: uma falha aqui não pode derrubar a API
+    try:
+        await reconciliar(db)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Falha ao reconciliar índices")
+
+
+def consultas_quentes(db) -> Dict[str, object]:
+    # Consultas que a API faz o tempo todo, no formato em que main.py as faz
+    return {
+        "login / criar_usuario: usuarios por email": db.usuarios.find({"email": "admin@coracaodemae.com"}),
+        "listar_pedidos: primeira página": db.pedidos.find({}).sort([("data_criacao", -1), ("_id", -1)]).limit(101),
+        "listar_pedidos: filtro por status": db.pedidos.find({"status": "RECEBIDO"}).sort([("data_criacao", -1), ("_id", -1)]).limit(101),
+        "pedido por codigo_pedido": db.pedidos.find({"codigo_pedido": 1001}),
+        "historico_cliente: por telefone (coberta)": db.pedidos.find(
+            {"cliente.telefone": "16999999999"}, PROJECAO_RESUMO_PEDIDO
+        ).sort([("data_criacao", -1), ("_id", -1)]).limit(21),
+        "índice do cardápio: produtos ativos": db.produtos.find({"ativo": True}),
+        "produtos por tag dietética": db.produtos.find({"tags_dieteticas": "VEGANO"}),
+        "índice do cardápio: componentes ativos": db.componentes.find({"ativo": True}),
+    }
+
+
+def _resumo_plano(plano: dict) -> str:
+    etapas = []
+    while plano:
+        etapa = plano.get("stage", "?")
+        if plano.get("indexName"):
+            etapa += f"({plano['indexName']})"
+        etapas.append(etapa)
+        plano = plano.get("inputStage") or (plano.get("inputStages") or [None])[0]
+    return " <- ".join(etapas)
+
+
+def plano_vencedor(explicacao: dict) -> str:
+    """Resume o plano vencedor de um explain (ex.: 'FETCH <- IXSCAN(email_1)')."""
+    planejador = explicacao.get("queryPlanner")
+    if planejador is None:
+        # aggregate: o planejador fica dentro do primeiro estágio ($cursor)
+        primeiro = (explicacao.get("stages") or [{}])[0]
+        planejador = primeiro.get("$cursor", {}).get("queryPlanner", {})
+    plano = planejador.get("winningPlan", {})
+    # MongoDB 7+ (SBE) aninha o plano em queryPlan
+    return _resumo_plano(plano.get("queryPlan", plano))
+
+
+async def imprimir_explain(db) -> None:
+    for nome, cursor in consultas_quentes(db).items():
+        print(f"- {nome}\n    {plano_vencedor(await cursor.explain())}")
+
+
+async def _cli(comando: str) -> int:
+    from db import db
+
+    if comando == "explain":
+        await imprimir_explain(db)
+        return 0
+    relatorio = await (reconciliar(db) if comando == "criar" else diferencas(db))
+    for nome_colecao, estado in relatorio.items():
+        print(f"{nome_colecao}: faltando={estado['faltando']} divergentes={estado['divergentes']} extras={estado['extras']}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    comando = sys.argv[1] if len(sys.argv) > 1 else "status"
+    if comando not in ("status", "criar", "explain"):
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(_cli(comando)))
@@ -0,0 +1,158 @@
+"""Quadro de produção da cozinha: porções pendentes por componente.
+
+Um único documento na coleção `producao` guarda, para cada componente, quantas
+porções ainda faltam sair (ex.: 7 de "Strogonoff de Frango"). Pendente é o pedido
+RECEBIDO ou EM_PREPARO; ao virar PRONTO (ou ENTREGUE) ele deixa de contar.
+
+Mesmo esquema do rollups.py: cada pedido contribui com `selecoes × quantidade`
+enquanto está pendente, e toda mudança de pedido aplica num único `$inc` a
+diferença entre o depois e o antes. Ler o quadro é um find_one, proporcional ao
+número de componentes e não ao de pedidos abertos.
+
+Na subida da API o documento só é montado a partir de `pedidos` se ainda não
+existe: recalcular em toda subida sobrescreveria os `$inc` que os outros workers
+aplicam no meio de um deploy escalonado. Depois de gravar pedidos pendentes direto
+no banco (scripts), refaça o quadro em POST /cozinha/producao/reconstruir ou, na
+pasta backend:
+
+    python kitchen.py rebuild
+"""
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from rollups import chave_segura, nome_da_chave
+
+ID_QUADRO = "quadro"
+STATUS_PENDENTES = ("RECEBIDO", "EM_PREPARO")
+ORDEM_TIPOS = ("PROTEINA", "GUARNICAO", "BASE")
+
+
+def _status(pedido: dict) -> str:
+    return getattr(pedido.get("status"), "value", pedido.get("status") or "RECEBIDO")
+
+
+def contribuicao(pedido: Optional[dict]) -> Dict[str, int]:
+    if not pedido or _status(pedido) not in STATUS_PENDENTES:
+        return {}
+    inc = defaultdict(int)
+    inc["pedidos"] += 1
+    for item in pedido.get("itens", []):
+        for selecao in item.get("selecoes") or []:
+            inc[f"porcoes.{chave_segura(selecao)}"] += item["quantidade"]
+    return inc
+
+
+def delta(antes: Optional[dict], depois: Optional[dict]) -> Dict[str, int]:
+    inc = defaultdict(int, contribuicao(depois))
+    for campo, valor in contribuicao(antes).items():
+        inc[campo] -= valor
+    return {campo: valor for campo, valor in inc.items() if valor}
+
+
+async def _aplicar(producao_collection, inc: Dict[str, int]) -> None:
+    if not inc:
+        return
+    await producao_collection.update_one(
+        {"_id": ID_QUADRO}, {"$inc": inc, "$set": {"atualizado_em": datetime.now()}}, upsert=True
+    )
+
+
+async def registrar(producao_collection, antes: Optional[dict], depois: Optional[dict]) -> None:
+    """Aplica no quadro a mudança de um pedido (antes=None na criação)."""
+    await _aplicar(producao_collection, delta(antes, depois))
+
+
+async def registrar_lote(producao_collection, mudancas: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> None:
+    """Como `registrar` para vários pedidos: um único `$inc` com a soma dos deltas."""
+    inc = defaultdict(int)
+    for antes, depois in mudancas:
+        for campo, valor in delta(antes, depois).items():
+            inc[campo] += valor
+    await _aplicar(producao_collection, {campo: valor for campo, valor in inc.items() if valor})
+
+
+async def _calcular(pedidos_collection) -> dict:
+    filtro = {"status": {"$in": list(STATUS_PENDENTES)}}
+    pedidos = await pedidos_collection.count_documents(filtro)
+    porcoes = {}
+    pipeline = [
+        {"$match": filtro},
+        {"$unwind": "$itens"},
+        {"$unwind": "$itens.selecoes"},
+        {"$group": {"_id": "$itens.selecoes", "porcoes": {"$sum": "$itens.quantidade"}}},
+    ]
+    async for grupo in pedidos_collection.aggregate(pipeline):
+        porcoes[chave_segura(grupo["_id"])] = grupo["porcoes"]
+    return {"_id": ID_QUADRO, "pedidos": pedidos, "porcoes": porcoes, "atualizado_em": datetime.now()}
+
+
+async def reconstruir(pedidos_collection, producao_collection) -> dict:
+    """Recalcula o quadro somando os pedidos pendentes e substitui o documento.
+
+    Um `$inc` aplicado entre a contagem e a troca se perde: use com o movimento parado.
+    """
+    doc = await _calcular(pedidos_collection)
+    await producao_collection.replace_one({"_id": ID_QUADRO}, doc, upsert=True)
+    return doc
+
+
+async def criar_se_ausente(pedidos_collection, producao_collection) -> bool:
+    """Monta o quadro na subida só se ele não existe (primeiro deploy, banco recém-populado)."""
+    if await producao_collection.find_one({"_id": ID_QUADRO}, {"_id": 1}):
+        return False
+    doc = await _calcular(pedidos_collection)
+    try:
+        await producao_collection.insert_one(doc)
+    except DuplicateKeyError:
+        # Outro worker (ou o primeiro `registrar`) criou antes
+        return False
+    return True
+
+
+async def quadro(producao_collection, componente) -> dict:
+    """Porções pendentes em quente (por tipo) e em embalagem separada.
+
+    `componente(nome)` resolve o componente no catálogo (pricing.indice_cardapio);
+    os que saíram do catálogo com porções pendentes aparecem em OUTROS.
+    """
+    doc = await producao_collection.find_one({"_id": ID_QUADRO}) or {}
+    quente: Dict[str, List[dict]] = {tipo: [] for tipo in ORDEM_TIPOS}
+    separados: List[dict] = []
+    for chave, porcoes in (doc.get("porcoes") or {}).items():
+        if porcoes <= 0:
+            continue
+        nome = nome_da_chave(chave)
+        info = componente(nome)
+        entrada = {"nome": nome, "porcoes": porcoes}
+        if info and info["embalagem_separada"]:
+            separados.append(entrada)
+        else:
+            tipo = getattr(info["tipo"], "value", info["tipo"]) if info else "OUTROS"
+            quente.setdefault(tipo, []).append(entrada)
+    mais_pedidos = lambda e: (-e["porcoes"], e["nome"])
+    return {
+        "pedidos_pendentes": max(doc.get("pedidos", 0), 0),
+        "quente": {tipo: sorted(itens, key=mais_pedidos) for tipo, itens in quente.items()},
+        "separados": sorted(separados, key=mais_pedidos),
+        "atualizado_em": doc.get("atualizado_em"),
+    }
+
+
+async def _cli() -> int:
+    from db import pedidos_collection, producao_collection
+
+    doc = await reconstruir(pedidos_collection, producao_collection)
+    print(f"{doc['pedidos']} pedido(s) pendente(s), {len(doc['porcoes'])} componente(s) no quadro")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(_cli()))
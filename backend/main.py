@@ -1,20 +1,57 @@
-from fastapi import FastAPI, HTTPException, Body, status
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Body, Depends, Header, Query, Request, Response, WebSocket, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from typing import Awaitable, Callable, List, Literal, Optional
 from bson import ObjectId
-from datetime import datetime
-from pydantic import BaseModel 
-
-from db import db, usuarios_collection, produtos_collection, componentes_collection, pedidos_collection
+from datetime import date, datetime, timedelta
+from pydantic import BaseModel, TypeAdapter
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+
+from db import (
+    client, db, conectar, fechar,
+    usuarios_collection, produtos_collection, componentes_collection, pedidos_collection, counters_collection,
+    vendas_diarias_collection, produtos_leitura_collection, componentes_leitura_collection, cardapio_collection,
+    idempotencia_collection, producao_collection, bairros_collection,
+)
 from models import (
     Usuario, UsuarioCreate, UsuarioUpdate,
     Produto, ProdutoUpdate,
     Componente, ComponenteUpdate,
-    Pedido, PedidoCreate, PedidoUpdateStatus, PedidoUpdate
+    Pedido, PedidoCreate, PedidoUpdateStatus, PedidoUpdate,
+    PedidoStatusLote, ResultadoLote, CardapioDoDia, ResultadoBusca,
+    QuadroProducao, Bairro, PropostaDespacho, ResumoPedido, StatusPedido, ModalidadeEntrega, TRANSICOES_STATUS
+)
+from archive import (
+    arquivador, arquivar_periodicamente, buscar_arquivado, colecoes_do_periodo, colecoes_para_consulta,
+    ARQUIVAMENTO_AUTOMATICO,
 )
-from security import get_password_hash, verify_password 
+from pagination import listar, buscar_pagina, PAGE_SIZE_PADRAO, PAGE_SIZE_MAXIMO, HEADER_PROXIMO_CURSOR, ASC, DESC
+from auth import admin_do_token, exigir_admin, usuario_atual, usuario_opcional, par_de_tokens, validar, revogados, REFRESH
+from coalescer import AgrupadorInsercoes, AGRUPAR_PEDIDOS
+from dispatch import indice_despacho, chave_bairro
+from cache import cache_produtos, cache_componentes, listar_com_cache, buscar_com_cache, etag_confere, HEADER_VERSAO
+import catalogo_io
+from events import (
+    barramento_pedidos, publicar_pedido, acompanhar_change_stream, stream_sse, servir_websocket,
+    USAR_CHANGE_STREAM, PEDIDO_CRIADO, STATUS_ALTERADO, PEDIDO_ATUALIZADO
+)
+from idempotency import chaves_pedidos, HEADER_CHAVE
+from indexes import reconciliar_em_segundo_plano as reconciliar_indices, PROJECAO_RESUMO_PEDIDO
+import kitchen
+from menu import cardapio_materializado
+from metrics import metricas, MetricasMiddleware, monitorar_event_loop, CONTENT_TYPE as CONTENT_TYPE_METRICAS
+from pricing import indice_cardapio
+from profiler import perfilador, explicar_lentos, MONGO_PERFIL
+import rollups
+from sequences import AlocadorSequencia, preparar_alocador
+from serialization import SERIALIZACAO_RAPIDA, RespostaRapida, SerializadorRapido, dumps
+from search import indice_busca
+from security import gerar_hash_senha, verificar_senha, metricas_hash
 
 # --- CONFIGURAÇÃO DO SWAGGER (METADADOS) ---
 tags_metadata = [
@@ -30,6 +67,10 @@ tags_metadata = [
         "name": "Produtos",
         "description": "Gerenciamento de itens do cardápio.",
     },
+    {
+        "name": "Cardapio",
+        "description": "Cardápio do dia pronto para exibir, numa única leitura.",
+    },
     {
         "name": "Componentes",
         "description": "Gerenciamento de ingredientes e adicionais.",
@@ -38,10 +79,75 @@ tags_metadata = [
         "name": "Pedidos",
         "description": "Criação e atualização de status dos pedidos.",
     },
+    {
+        "name": "Entregas",
+        "description": "Taxa por bairro e viagens de motoboy montadas com os pedidos prontos.",
+    },
+    {
+        "name": "Cozinha",
+        "description": "Quadro de produção: porções pendentes por componente.",
+    },
+    {
+        "name": "Admin",
+        "description": "Diagnóstico e manutenção do backend (consultas lentas, arquivamento de pedidos).",
+    },
+    {
+        "name": "Relatorios",
+        "description": "Faturamento, ticket médio e produtos mais vendidos (consolidados por dia).",
+    },
+    {
+        "name": "Catalogo",
+        "description": "Importação e exportação em lote de produtos e componentes (CSV/NDJSON).",
+    },
 ]
 
+logger = logging.getLogger("cardapio")
+
+# Numeração dos pedidos: blocos reservados no documento counters/"codigo_pedido"
+alocador_pedidos = AlocadorSequencia(counters_collection, "codigo_pedido")
+# Group commit opcional dos inserts de pedidos (AGRUPAR_PEDIDOS=1, ver coalescer.py)
+agrupador_pedidos = AgrupadorInsercoes(pedidos_collection)
+
+def catalogo_alterado():
+    # Chamado por toda escrita em produtos/componentes
+    cardapio_materializado.agendar(produtos_collection, componentes_collection, cardapio_collection)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Ping + aquecimento do pool: o primeiro pico depois do deploy já encontra conexões abertas
+    await conectar()
+    # Índices são reconciliados em segundo plano para não atrasar a subida
+    tarefa_indices = asyncio.create_task(reconciliar_indices(db))
+    tarefa_lag = asyncio.create_task(monitorar_event_loop())
+    tarefa_explain = asyncio.create_task(explicar_lentos(client)) if MONGO_PERFIL else None
+    await preparar_alocador(alocador_pedidos, pedidos_collection, "codigo_pedido")
+    await indice_cardapio.carregar(produtos_collection, componentes_collection)
+    await indice_busca.carregar(produtos_collection, componentes_collection)
+    # Quadro da cozinha: só é montado se não existe (refazer: POST /cozinha/producao/reconstruir)
+    await kitchen.criar_se_ausente(pedidos_collection, producao_collection)
+    await indice_despacho.carregar(bairros_collection, pedidos_collection)
+    # Refaz o cardápio materializado: o seed e scripts gravam direto nas coleções
+    catalogo_alterado()
+    tarefa_change_stream = asyncio.create_task(acompanhar_change_stream(pedidos_collection)) if USAR_CHANGE_STREAM else None
+    tarefa_arquivo = (
+        asyncio.create_task(arquivar_periodicamente(db, pedidos_collection, counters_collection))
+        if ARQUIVAMENTO_AUTOMATICO else None
+    )
+    yield
+    tarefa_indices.cancel()
+    tarefa_lag.cancel()
+    if tarefa_explain:
+        tarefa_explain.cancel()
+    if tarefa_change_stream:
+        tarefa_change_stream.cancel()
+    if tarefa_arquivo:
+        tarefa_arquivo.cancel()
+    await agrupador_pedidos.esvaziar()
+    fechar()
+
 # Inicialização com os metadados do Swagger
 app = FastAPI(
+    lifespan=lifespan,
     title="API Restaurante - CRUD Completo",
     description="API backend para sistema de delivery. Acesse /docs para ver a documentação interativa.",
     version="1.0.0",
@@ -64,13 +170,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[HEADER_PROXIMO_CURSOR, HEADER_VERSAO, "ETag"],
 )
 
+# Adicionado por último para ficar por fora: mede também o tempo do CORS
+app.add_middleware(MetricasMiddleware)
+metricas.adicionar_coletor("hash_senhas", "Pool de hash de senhas (bcrypt).", metricas_hash)
+metricas.adicionar_coletor("cache_produtos", "Cache do catálogo de produtos.", cache_produtos.stats)
+metricas.adicionar_coletor("cache_componentes", "Cache do catálogo de componentes.", cache_componentes.stats)
+metricas.adicionar_coletor("eventos_pedidos", "Feed em tempo real de pedidos.", barramento_pedidos.stats)
+metricas.adicionar_coletor("agrupador_pedidos", "Group commit dos inserts de pedidos.", agrupador_pedidos.stats)
+metricas.adicionar_coletor("idempotencia_pedidos", "Idempotency-Key de POST /pedidos.", chaves_pedidos.stats)
+
 # --- Modelo para Login ---
 class LoginRequest(BaseModel):
     email: str
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+# Adapters usados para serializar as respostas do cache do catálogo
+produto_adapter = TypeAdapter(Produto)
+produtos_adapter = TypeAdapter(List[Produto])
+componente_adapter = TypeAdapter(Componente)
+componentes_adapter = TypeAdapter(List[Componente])
+
+# Caminho rápido (SERIALIZACAO_RAPIDA=1) das listagens e detalhes sem cache;
+# no stream NDJSON, recorte de cada linha nos campos do response_model
+pedido_rapido = SerializadorRapido(Pedido)
+usuario_rapido = SerializadorRapido(Usuario)
+produto_rapido = SerializadorRapido(Produto)
+componente_rapido = SerializadorRapido(Componente)
+
 async def get_by_id(collection, id: str):
     if not ObjectId.is_valid(id):
         raise HTTPException(status_code=400, detail="ID inválido")
@@ -79,12 +211,68 @@ async def get_by_id(collection, id: str):
         raise HTTPException(status_code=404, detail="Item não encontrado")
     return doc
 
+async def update_by_id(collection, id: str, update_data: dict, antes: bool = False):
+    # Uma ida ao banco: aplica o $set e já devolve o documento atualizado
+    # (ou, com antes=True, a versão anterior à alteração)
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+    if not update_data:
+        return await get_by_id(collection, id)
+    doc = await collection.find_one_and_update(
+        {"_id": ObjectId(id)}, {"$set": update_data},
+        return_document=ReturnDocument.BEFORE if antes else ReturnDocument.AFTER
+    )
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Item não encontrado")
+    return doc
+
 # --- Rota de Health Check ---
 @app.get("/", tags=["Status"])
 async def root():
     return {
         "status": "online",
-        "mensagem": "API no ar!"
+        "mensagem": "API no ar!",
+        "hash_senhas": metricas_hash()
+    }
+
+@app.get("/metrics", tags=["Status"], response_class=PlainTextResponse)
+async def exportar_metricas():
+    return PlainTextResponse(metricas.exportar(), media_type=CONTENT_TYPE_METRICAS)
+
+@app.get("/admin/consultas", tags=["Admin"], dependencies=[Depends(exigir_admin)])
+async def consultas_mais_lentas(
+    limite: int = Query(20, ge=1, le=200),
+    ordem: Literal["total_ms", "media_ms", "max_ms", "execucoes", "lentos"] = "total_ms",
+):
+    return {
+        "ativo": MONGO_PERFIL,
+        "limite_lento_ms": perfilador.limite_lento_ms,
+        "desde": datetime.fromtimestamp(perfilador.inicio),
+        "consultas": perfilador.mais_lentas(limite, ordem),
+    }
+
+@app.delete("/admin/consultas", status_code=204, tags=["Admin"], dependencies=[Depends(exigir_admin)])
+async def limpar_consultas():
+    perfilador.limpar()
+
+@app.get("/admin/arquivamento", tags=["Admin"], dependencies=[Depends(exigir_admin)])
+async def status_arquivamento():
+    return await arquivador.status(db)
+
+@app.post("/admin/arquivamento", tags=["Admin"], dependencies=[Depends(exigir_admin)])
+async def executar_arquivamento(
+    idade_dias: Optional[int] = Query(None, ge=1),
+    max_lotes: Optional[int] = Query(None, ge=1),
+):
+    # Roda uma vez agora (mesmos lotes e pausas da tarefa automática)
+    kwargs = {"idade_dias": idade_dias} if idade_dias else {}
+    return await arquivador.executar(db, pedidos_collection, max_lotes=max_lotes, **kwargs)
+
+@app.get("/catalogo/versao", tags=["Status"])
+async def versao_catalogo():
+    return {
+        "produtos": cache_produtos.stats(),
+        "componentes": cache_componentes.stats(),
     }
 
 # Rotas de Autenticação
@@ -94,42 +282,76 @@ async def login(data: LoginRequest):
     # 1. Buscar usuário pelo email
     user = await usuarios_collection.find_one({"email": data.email})
     
-    # 2. Verificar se usuário existe e se a senha bate
-    if not user or not verify_password(data.password, user["senha_hash"]):
+    # 2. Verificar se usuário existe e se a senha bate (bcrypt roda fora do event loop)
+    if not user:
+        raise HTTPException(status_code=401, detail="Email ou senha incorretos")
+    senha_ok, novo_hash = await verificar_senha(data.password, user["senha_hash"])
+    if not senha_ok:
         raise HTTPException(status_code=401, detail="Email ou senha incorretos")
+
+    # Hash com custo desatualizado: regrava com o BCRYPT_ROUNDS atual
+    if novo_hash:
+        await usuarios_collection.update_one({"_id": user["_id"]}, {"$set": {"senha_hash": novo_hash}})
     
     # 3. Preparar resposta (Converter ObjectId para string)
     user["_id"] = str(user["_id"])
     user.pop("senha_hash", None) # Remover hash da senha por segurança
     
-    # 4. Retornar Token (Simulado temporariamente) e Dados do Usuário
-    # TODO: Implementar JWT real futuramente
+    # 4. Retornar tokens (JWT assinado com _id e role, ver auth.py) e dados do usuário
     return {
-        "access_token": "mock_jwt_token_123", 
-        "token_type": "bearer",
+        **par_de_tokens(user["_id"], user["role"]),
         "user": user
     }
 
+@app.post("/auth/refresh", tags=["Auth"])
+async def renovar_token(data: RefreshRequest):
+    claims = validar(data.refresh_token, REFRESH)
+    # Única leitura do usuário fora do login: pega role alterado ou conta removida
+    user = await usuarios_collection.find_one({"_id": ObjectId(claims["sub"])}, {"role": 1})
+    if not user:
+        raise HTTPException(status_code=401, detail="Usuário não encontrado")
+    # Refresh é de uso único: o usado entra na lista de revogados
+    revogados.revogar(claims)
+    return par_de_tokens(claims["sub"], user["role"])
+
+@app.post("/auth/logout", status_code=204, tags=["Auth"])
+async def logout(data: Optional[RefreshRequest] = None, claims: dict = Depends(usuario_atual)):
+    revogados.revogar(claims)
+    if data:
+        revogados.revogar(validar(data.refresh_token, REFRESH))
+
 # Rotas de Usuários
 
 @app.post("/usuarios", response_model=Usuario, status_code=201, tags=["Usuarios"])
-async def criar_usuario(usuario: UsuarioCreate):
+async def criar_usuario(usuario: UsuarioCreate, claims: Optional[dict] = Depends(usuario_opcional)):
+    # Cadastro é aberto, mas só um ADMIN cria outro ADMIN
+    if usuario.role == "ADMIN" and (claims is None or claims["role"] != "ADMIN"):
+        raise HTTPException(status_code=403, detail="Só administradores podem criar administradores")
     if await usuarios_collection.find_one({"email": usuario.email}):
         raise HTTPException(status_code=400, detail="Email já cadastrado")
     
     usuario_dict = usuario.model_dump()
-    usuario_dict["senha_hash"] = get_password_hash(usuario_dict.pop("senha"))
+    usuario_dict["senha_hash"] = await gerar_hash_senha(usuario_dict.pop("senha"))
     
-    new_usuario = await usuarios_collection.insert_one(usuario_dict)
+    try:
+        new_usuario = await usuarios_collection.insert_one(usuario_dict)
+    except DuplicateKeyError:
+        # Cadastro simultâneo com o mesmo email, barrado pelo índice único
+        raise HTTPException(status_code=400, detail="Email já cadastrado")
     created_usuario = await usuarios_collection.find_one({"_id": new_usuario.inserted_id})
     return created_usuario
 
-@app.get("/usuarios", response_model=List[Usuario], tags=["Usuarios"])
-async def listar_usuarios():
-    usuarios = await usuarios_collection.find().to_list(1000)
-    return usuarios
-
-@app.put("/usuarios/{id}", response_model=Usuario, tags=["Usuarios"])
+@app.get("/usuarios", response_model=List[Usuario], tags=["Usuarios"], dependencies=[Depends(exigir_admin)])
+async def listar_usuarios(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAXIMO),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+):
+    return await listar(response, usuarios_collection, {}, "_id", ASC, limit, cursor, fields, stream, usuario_rapido)
+
+@app.put("/usuarios/{id}", response_model=Usuario, tags=["Usuarios"], dependencies=[Depends(exigir_admin)])
 async def atualizar_usuario(id: str, usuario: UsuarioUpdate):
     update_data = {k: v for k, v in usuario.model_dump().items() if v is not None}
     
@@ -143,106 +365,533 @@ async def atualizar_usuario(id: str, usuario: UsuarioUpdate):
     doc = await get_by_id(usuarios_collection, id)
     return doc
 
-@app.delete("/usuarios/{id}", status_code=204, tags=["Usuarios"])
+@app.delete("/usuarios/{id}", status_code=204, tags=["Usuarios"], dependencies=[Depends(exigir_admin)])
 async def deletar_usuario(id: str):
     result = await usuarios_collection.delete_one({"_id": ObjectId(id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
+# Rota do Cardápio do dia (documento materializado em menu.py)
+
+@app.get("/cardapio", response_model=CardapioDoDia, tags=["Cardapio"])
+async def ver_cardapio(request: Request):
+    doc = await cardapio_materializado.obter(produtos_collection, componentes_collection, cardapio_collection)
+    etag = f'"{doc["versao"]}"'
+    if etag_confere(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    corpo = {campo: doc[campo] for campo in CardapioDoDia.model_fields}
+    return Response(content=dumps(corpo), media_type="application/json", headers={"ETag": etag})
+
+@app.get("/busca", response_model=ResultadoBusca, tags=["Cardapio"])
+async def buscar_catalogo(
+    q: str = "",
+    tags: Optional[str] = Query(None, description="Tags dietéticas separadas por vírgula, ex.: SEM_GLUTEN,VEGANO"),
+    modo: Literal["todas", "qualquer"] = "todas",
+    colecao: Optional[Literal["produtos", "componentes"]] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    # Só itens ativos; palavras do q casam por prefixo, sem acento ("pure" acha "Purê")
+    await indice_busca.garantir_atualizado(produtos_collection, componentes_collection)
+    lista_tags = tags.split(",") if tags else []
+    total, itens = indice_busca.buscar(q, lista_tags, modo == "todas", colecao, limit)
+    return {"total": total, "itens": itens}
+
+@app.get("/busca/tags", tags=["Cardapio"])
+async def tags_dieteticas():
+    await indice_busca.garantir_atualizado(produtos_collection, componentes_collection)
+    return indice_busca.tags()
+
 # Rotas de Componentes
 
-@app.post("/componentes", response_model=Componente, status_code=201, tags=["Componentes"])
+@app.post("/componentes", response_model=Componente, status_code=201, tags=["Componentes"], dependencies=[Depends(exigir_admin)])
 async def criar_componente(componente: Componente):
     new_comp = await componentes_collection.insert_one(componente.model_dump(by_alias=True, exclude=["id"]))
+    cache_componentes.invalidar()
     created_comp = await componentes_collection.find_one({"_id": new_comp.inserted_id})
+    indice_cardapio.atualizar_componente(created_comp)
+    indice_busca.atualizar("componentes", created_comp)
+    catalogo_alterado()
     return created_comp
 
 @app.get("/componentes", response_model=List[Componente], tags=["Componentes"])
-async def listar_componentes():
-    return await componentes_collection.find().to_list(1000)
-
-@app.put("/componentes/{id}", response_model=Componente, tags=["Componentes"])
+async def listar_componentes(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAXIMO),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+):
+    if stream:
+        return await listar(response, componentes_leitura_collection, {}, "_id", ASC, limit, cursor, fields, stream, componente_rapido)
+    return await listar_com_cache(request, response, cache_componentes, componentes_leitura_collection, componentes_adapter,
+                                  limit, cursor, fields)
+
+@app.get("/componentes/{id}", response_model=Componente, tags=["Componentes"])
+async def ver_componente(id: str, request: Request):
+    return await buscar_com_cache(request, cache_componentes, componente_adapter, id,
+                                  lambda: get_by_id(componentes_leitura_collection, id))
+
+@app.put("/componentes/{id}", response_model=Componente, tags=["Componentes"], dependencies=[Depends(exigir_admin)])
 async def atualizar_componente(id: str, componente: ComponenteUpdate):
     update_data = {k: v for k, v in componente.model_dump().items() if v is not None}
+    doc = await update_by_id(componentes_collection, id, update_data)
     if update_data:
-        await componentes_collection.update_one({"_id": ObjectId(id)}, {"$set": update_data})
-    return await get_by_id(componentes_collection, id)
+        cache_componentes.invalidar()
+        catalogo_alterado()
+    indice_cardapio.atualizar_componente(doc)
+    indice_busca.atualizar("componentes", doc)
+    return doc
 
-@app.delete("/componentes/{id}", status_code=204, tags=["Componentes"])
+@app.delete("/componentes/{id}", status_code=204, tags=["Componentes"], dependencies=[Depends(exigir_admin)])
 async def deletar_componente(id: str):
     res = await componentes_collection.delete_one({"_id": ObjectId(id)})
+    cache_componentes.invalidar()
+    indice_cardapio.remover_componente(id)
+    indice_busca.remover("componentes", id)
+    catalogo_alterado()
     if res.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Componente não encontrado")
 
 # Rotas de Produtos
 
-@app.post("/produtos", response_model=Produto, status_code=201, tags=["Produtos"])
+@app.post("/produtos", response_model=Produto, status_code=201, tags=["Produtos"], dependencies=[Depends(exigir_admin)])
 async def criar_produto(produto: Produto):
     new_prod = await produtos_collection.insert_one(produto.model_dump(by_alias=True, exclude=["id"]))
+    cache_produtos.invalidar()
     created_prod = await produtos_collection.find_one({"_id": new_prod.inserted_id})
+    indice_cardapio.atualizar_produto(created_prod)
+    indice_busca.atualizar("produtos", created_prod)
+    catalogo_alterado()
     return created_prod
 
 @app.get("/produtos", response_model=List[Produto], tags=["Produtos"])
-async def listar_produtos():
-    return await produtos_collection.find().to_list(1000)
-
-@app.put("/produtos/{id}", response_model=Produto, tags=["Produtos"])
+async def listar_produtos(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAXIMO),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+):
+    if stream:
+        return await listar(response, produtos_leitura_collection, {}, "_id", ASC, limit, cursor, fields, stream, produto_rapido)
+    return await listar_com_cache(request, response, cache_produtos, produtos_leitura_collection, produtos_adapter,
+                                  limit, cursor, fields)
+
+@app.get("/produtos/{id}", response_model=Produto, tags=["Produtos"])
+async def ver_produto(id: str, request: Request):
+    return await buscar_com_cache(request, cache_produtos, produto_adapter, id,
+                                  lambda: get_by_id(produtos_leitura_collection, id))
+
+@app.put("/produtos/{id}", response_model=Produto, tags=["Produtos"], dependencies=[Depends(exigir_admin)])
 async def atualizar_produto(id: str, produto: ProdutoUpdate):
     update_data = {k: v for k, v in produto.model_dump().items() if v is not None}
+    doc = await update_by_id(produtos_collection, id, update_data)
     if update_data:
-        await produtos_collection.update_one({"_id": ObjectId(id)}, {"$set": update_data})
-    return await get_by_id(produtos_collection, id)
+        cache_produtos.invalidar()
+        catalogo_alterado()
+    indice_cardapio.atualizar_produto(doc)
+    indice_busca.atualizar("produtos", doc)
+    return doc
 
-@app.delete("/produtos/{id}", status_code=204, tags=["Produtos"])
+@app.delete("/produtos/{id}", status_code=204, tags=["Produtos"], dependencies=[Depends(exigir_admin)])
 async def deletar_produto(id: str):
     res = await produtos_collection.delete_one({"_id": ObjectId(id)})
+    cache_produtos.invalidar()
+    indice_cardapio.remover_produto(id)
+    indice_busca.remover("produtos", id)
+    catalogo_alterado()
     if res.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
 
 # Rotas de Pedidos
 
 @app.post("/pedidos", response_model=Pedido, status_code=201, tags=["Pedidos"])
-async def criar_pedido(pedido_in: PedidoCreate):
-    valor_produtos = sum([item.preco_unitario * item.quantidade for item in pedido_in.itens])
-    taxa_entrega = 1000 if pedido_in.modalidade == "DELIVERY" else 0
-    valor_total = valor_produtos + taxa_entrega
+async def criar_pedido(pedido_in: PedidoCreate, idempotency_key: Optional[str] = Header(None, alias=HEADER_CHAVE)):
+    if idempotency_key is None:
+        # O insert segue no driver (ou no lote do agrupador) mesmo se o cliente desconectar:
+        # a criação roda protegida para que rollups, quadro e eventos acompanhem o pedido gravado
+        tarefa = asyncio.ensure_future(_criar_pedido(pedido_in))
+        tarefa.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(tarefa)
+
+    # Com a chave, repetições (retry do app) devolvem o corpo guardado sem criar outro pedido
+    async def executar(concluir):
+        corpo = b""
+
+        async def gravado(pedido: dict):
+            # Chave concluída logo depois do insert, antes dos rollups: falha dali em diante não duplica o pedido
+            nonlocal corpo
+            corpo = dumps(pedido_rapido.documento(pedido))
+            await concluir(corpo)
+
+        await _criar_pedido(pedido_in, gravado)
+        return corpo
+
+    return await chaves_pedidos.responder(
+        idempotencia_collection, idempotency_key, pedido_in.model_dump_json().encode(), 201, executar
+    )
 
-    import time
-    codigo_pedido = int(time.time())
+async def _criar_pedido(
+    pedido_in: PedidoCreate, ao_gravar: Optional[Callable[[dict], Awaitable[None]]] = None
+) -> dict:
+    if pedido_in.modalidade == "DELIVERY" and pedido_in.entrega is None:
+        raise HTTPException(status_code=422, detail="Pedidos DELIVERY precisam do endereço de entrega")
 
+    # Preços e regras de composição vêm do índice do cardápio, nunca do cliente
+    await indice_cardapio.garantir_atualizado(produtos_collection, componentes_collection)
     pedido_dict = pedido_in.model_dump()
+    pedido_dict["itens"], valor_produtos = indice_cardapio.precificar_pedido(pedido_dict["itens"])
+    taxa_entrega = 0
+    if pedido_in.modalidade == "DELIVERY":
+        # Taxa pela tabela de bairros do índice de despacho (padrão para bairro fora dela)
+        await indice_despacho.garantir_atualizado(bairros_collection, pedidos_collection)
+        taxa_entrega = indice_despacho.taxa(pedido_in.entrega.bairro)
+    valor_total = valor_produtos + taxa_entrega
+
+    # O MongoDB guarda datas com precisão de milissegundo: truncar aqui deixa o
+    # documento em memória (que vira a resposta) igual ao que foi gravado
+    agora = datetime.now()
     pedido_dict.update({
-        "codigo_pedido": codigo_pedido,
-        "data_criacao": datetime.now(),
+        "data_criacao": agora.replace(microsecond=agora.microsecond // 1000 * 1000),
         "status": "RECEBIDO",
         "valor_produtos_centavos": valor_produtos,
         "taxa_entrega_centavos": taxa_entrega,
         "valor_total_centavos": valor_total
     })
 
-    new_pedido = await pedidos_collection.insert_one(pedido_dict)
-    created_pedido = await pedidos_collection.find_one({"_id": new_pedido.inserted_id})
-    return created_pedido
+    # O índice único em codigo_pedido é a última linha de defesa; se algum
+    # código já existir (ex.: inserido fora da API), tenta o próximo
+    for _ in range(3):
+        pedido_dict["codigo_pedido"] = await alocador_pedidos.proximo()
+        pedido_dict.pop("_id", None)
+        try:
+            if AGRUPAR_PEDIDOS:
+                await agrupador_pedidos.inserir(pedido_dict)
+            else:
+                await pedidos_collection.insert_one(pedido_dict)
+            break
+        except DuplicateKeyError:
+            continue
+    else:
+        raise HTTPException(status_code=500, detail="Não foi possível gerar o código do pedido")
+    # O insert preenche o _id no próprio dict: ele já é o documento gravado, sem reler do banco
+    if ao_gravar:
+        await ao_gravar(pedido_dict)
+    await rollups.registrar(vendas_diarias_collection, None, pedido_dict)
+    await kitchen.registrar(producao_collection, None, pedido_dict)
+    publicar_pedido(PEDIDO_CRIADO, pedido_dict)
+    return pedido_dict
 
 @app.get("/pedidos", response_model=List[Pedido], tags=["Pedidos"])
-async def listar_pedidos():
-    return await pedidos_collection.find().to_list(1000)
+async def listar_pedidos(
+    response: Response,
+    status_pedido: Optional[StatusPedido] = Query(None, alias="status"),
+    modalidade: Optional[ModalidadeEntrega] = None,
+    desde: Optional[datetime] = None,
+    ate: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAXIMO),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+    incluir_arquivo: bool = False,
+    arquivo_completo: bool = False,
+):
+    # Mais recentes primeiro; o cursor é o par (data_criacao, _id) do último item
+    filtro = {}
+    if status_pedido:
+        filtro["status"] = status_pedido.value
+    if modalidade:
+        filtro["modalidade"] = modalidade.value
+    if desde or ate:
+        filtro["data_criacao"] = {}
+        if desde:
+            filtro["data_criacao"]["$gte"] = desde
+        if ate:
+            filtro["data_criacao"]["$lt"] = ate
+    # incluir_arquivo: o histórico entra também pelos buckets mensais que cruzam o período
+    # (sem `desde`, só os meses recentes; o arquivo inteiro com arquivo_completo)
+    colecoes = pedidos_collection
+    if incluir_arquivo:
+        colecoes = [pedidos_collection] + await colecoes_para_consulta(db, desde, ate, arquivo_completo)
+    return await listar(
+        response, colecoes, filtro, "data_criacao", DESC, limit, cursor, fields, stream, pedido_rapido
+    )
+
+# Feed em tempo real: SSE (retoma com Last-Event-ID) ou WebSocket (retoma com ?desde=).
+# Os eventos levam o pedido inteiro (cliente, endereço, telefone): só para admin
+@app.get("/eventos/pedidos", tags=["Pedidos"], dependencies=[Depends(exigir_admin)])
+async def eventos_pedidos(request: Request, desde: Optional[str] = None):
+    ultimo_id = request.headers.get("last-event-id") or desde
+    return StreamingResponse(
+        stream_sse(ultimo_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/ws/pedidos")
+async def ws_pedidos(websocket: WebSocket, desde: Optional[str] = None, token: Optional[str] = None):
+    # O navegador não manda Authorization no handshake: o access token vem em ?token=
+    try:
+        await admin_do_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await servir_websocket(websocket, desde)
+
+@app.get("/eventos/pedidos/status", tags=["Pedidos"], dependencies=[Depends(exigir_admin)])
+async def status_eventos_pedidos():
+    return barramento_pedidos.stats()
+
+async def buscar_pedido(id: str, projecao: Optional[dict] = None) -> dict:
+    if not ObjectId.is_valid(id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+    pedido = await pedidos_collection.find_one({"_id": ObjectId(id)}, projecao)
+    if pedido is None:
+        # Pedidos entregues antigos saem de `pedidos` para o arquivo (archive.py)
+        pedido = await buscar_arquivado(db, ObjectId(id))
+    if pedido is None:
+        raise HTTPException(status_code=404, detail="Item não encontrado")
+    return pedido
+
+# "Meus pedidos": resumo por telefone ou CPF, respondido só com o índice de histórico
+@app.get("/clientes/pedidos", response_model=List[ResumoPedido], tags=["Pedidos"])
+async def historico_cliente(
+    response: Response,
+    telefone: Optional[str] = None,
+    cpf: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAXIMO),
+    cursor: Optional[str] = None,
+    incluir_arquivo: bool = True,
+    arquivo_completo: bool = False,
+):
+    if bool(telefone) == bool(cpf):
+        raise HTTPException(status_code=400, detail="Informe telefone ou cpf (apenas um)")
+    filtro = {"cliente.telefone": telefone} if telefone else {"cliente.cpf_nota": cpf}
+    colecoes = pedidos_collection
+    if incluir_arquivo:
+        colecoes = [pedidos_collection] + await colecoes_para_consulta(db, completo=arquivo_completo)
+    docs, proximo = await buscar_pagina(
+        colecoes, filtro, "data_criacao", DESC, limit or PAGE_SIZE_PADRAO, cursor, PROJECAO_RESUMO_PEDIDO
+    )
+    if proximo:
+        response.headers[HEADER_PROXIMO_CURSOR] = proximo
+    return docs
+
+@app.get("/pedidos/{id}/repetir", response_model=PedidoCreate, tags=["Pedidos"])
+async def repetir_pedido(id: str):
+    # Uma leitura só com o que o PedidoCreate precisa; preços e disponibilidade
+    # saem do cardápio atual (422 lista o que não está mais disponível)
+    pedido = await buscar_pedido(id, {"cliente": 1, "modalidade": 1, "entrega": 1, "forma_pagamento": 1, "itens": 1})
+    await indice_cardapio.garantir_atualizado(produtos_collection, componentes_collection)
+    itens, _ = indice_cardapio.precificar_pedido(pedido["itens"])
+    return {**pedido, "itens": itens}
 
 @app.get("/pedidos/{id}", response_model=Pedido, tags=["Pedidos"])
 async def ver_pedido(id: str):
-    return await get_by_id(pedidos_collection, id)
+    pedido = await buscar_pedido(id)
+    if SERIALIZACAO_RAPIDA:
+        return RespostaRapida(pedido_rapido.documento(pedido))
+    return pedido
 
 @app.patch("/pedidos/{id}/status", response_model=Pedido, tags=["Pedidos"])
 async def atualizar_status_pedido(id: str, status_update: PedidoUpdateStatus):
-    await pedidos_collection.update_one(
-        {"_id": ObjectId(id)}, 
-        {"$set": {"status": status_update.status}}
-    )
-    return await get_by_id(pedidos_collection, id)
+    novo_status = status_update.status.value
+    anterior = await update_by_id(pedidos_collection, id, {"status": novo_status}, antes=True)
+    doc = {**anterior, "status": novo_status}
+    await rollups.registrar(vendas_diarias_collection, anterior, doc)
+    await kitchen.registrar(producao_collection, anterior, doc)
+    indice_despacho.atualizar(doc)
+    publicar_pedido(STATUS_ALTERADO, doc)
+    return doc
 
 @app.put("/pedidos/{id}", response_model=Pedido, tags=["Pedidos"])
 async def atualizar_pedido_completo(id: str, pedido_update: PedidoUpdate):
-    update_data = {k: v for k, v in pedido_update.model_dump().items() if v is not None}
+    update_data = {k: v for k, v in pedido_update.model_dump(mode="json").items() if v is not None}
+    anterior = await update_by_id(pedidos_collection, id, update_data, antes=True)
+    doc = {**anterior, **update_data}
     if update_data:
-        await pedidos_collection.update_one({"_id": ObjectId(id)}, {"$set": update_data})
-    return await get_by_id(pedidos_collection, id)
+        await rollups.registrar(vendas_diarias_collection, anterior, doc)
+        await kitchen.registrar(producao_collection, anterior, doc)
+        indice_despacho.atualizar(doc)
+        publicar_pedido(PEDIDO_ATUALIZADO, doc)
+    return doc
+
+@app.post("/pedidos/status/lote", response_model=ResultadoLote, tags=["Pedidos"])
+async def atualizar_status_lote(lote: PedidoStatusLote):
+    # Ex.: todos os PRONTO de uma rota -> ENTREGUE. Uma leitura para validar as
+    # transições e um único bulk_write; cada update só casa se o status ainda for o lido.
+    novo = lote.status
+    resultados = {}
+    oids = []
+    for id in dict.fromkeys(lote.ids):
+        if ObjectId.is_valid(id):
+            oids.append(ObjectId(id))
+        else:
+            resultados[id] = {"id": id, "ok": False, "erro": "ID inválido"}
+
+    atuais = {
+        str(doc["_id"]): doc
+        async for doc in pedidos_collection.find(
+            # itens: o quadro da cozinha desconta as porções de quem sai de pendente;
+            # entrega/cliente/valor: o despacho precisa deles para pôr o pedido na fila do bairro
+            {"_id": {"$in": oids}},
+            {"status": 1, "codigo_pedido": 1, "modalidade": 1, "data_criacao": 1, "itens": 1,
+             "entrega": 1, "cliente": 1, "valor_total_centavos": 1}
+        )
+    }
+
+    # Marca desta chamada em cada pedido alterado: o bulk_write só devolve o total de
+    # casados, e o status sozinho não distingue quem mudou (outra operação pode ter
+    # levado o pedido para o mesmo status). A marca sai do documento logo em seguida.
+    marca = ObjectId()
+    operacoes, validos = [], []
+    for oid in oids:
+        id = str(oid)
+        doc = atuais.get(id)
+        if doc is None:
+            resultados[id] = {"id": id, "ok": False, "erro": "Pedido não encontrado"}
+            continue
+        anterior = StatusPedido(doc["status"])
+        if novo not in TRANSICOES_STATUS[anterior]:
+            resultados[id] = {"id": id, "ok": False, "status_anterior": anterior,
+                              "erro": f"Transição inválida: {anterior.value} -> {novo.value}"}
+            continue
+        operacoes.append(UpdateOne(
+            {"_id": oid, "status": anterior.value}, {"$set": {"status": novo.value, "lote_status": marca}}
+        ))
+        validos.append(doc)
+
+    alterados = 0
+    if operacoes:
+        res = await pedidos_collection.bulk_write(operacoes, ordered=False)
+        alterados = res.modified_count
+        corridos = set()
+        com_marca = {"_id": {"$in": [d["_id"] for d in validos]}, "lote_status": marca}
+        if res.matched_count < len(operacoes):
+            # Alguém mudou o status entre a leitura e a escrita: só valem os que têm a nossa marca
+            aplicados = {str(doc["_id"]) async for doc in pedidos_collection.find(com_marca, {"_id": 1})}
+            corridos = {str(d["_id"]) for d in validos} - aplicados
+        if res.matched_count:
+            await pedidos_collection.update_many(com_marca, {"$unset": {"lote_status": ""}})
+        mudancas = []
+        for doc in validos:
+            id = str(doc["_id"])
+            anterior = doc["status"]
+            if id in corridos:
+                resultados[id] = {"id": id, "ok": False, "status_anterior": anterior,
+                                  "erro": "Status alterado por outra operação"}
+                continue
+            resultados[id] = {"id": id, "ok": True, "status_anterior": anterior}
+            depois = {**doc, "status": novo.value}
+            mudancas.append((doc, depois))
+            indice_despacho.atualizar(depois)
+            publicar_pedido(STATUS_ALTERADO, depois)
+        # Deltas somados: um bulk_write no rollup (por dia) e um $inc no quadro para o lote inteiro
+        await rollups.registrar_lote(vendas_diarias_collection, mudancas)
+        await kitchen.registrar_lote(producao_collection, mudancas)
+
+    return {"alterados": alterados, "resultados": [resultados[id] for id in dict.fromkeys(lote.ids)]}
+
+# Rotas da Cozinha (quadro de produção mantido incrementalmente, ver kitchen.py)
+
+@app.get("/cozinha/producao", response_model=QuadroProducao, tags=["Cozinha"])
+async def quadro_producao():
+    await indice_cardapio.garantir_atualizado(produtos_collection, componentes_collection)
+    return await kitchen.quadro(producao_collection, indice_cardapio.componente)
+
+@app.post("/cozinha/producao/reconstruir", response_model=QuadroProducao, tags=["Cozinha"], dependencies=[Depends(exigir_admin)])
+async def reconstruir_quadro_producao():
+    await kitchen.reconstruir(pedidos_collection, producao_collection)
+    return await quadro_producao()
+
+# Rotas de Entregas (índice em memória de pedidos prontos por bairro, ver dispatch.py)
+
+@app.get("/entregas/viagens", response_model=PropostaDespacho, tags=["Entregas"])
+async def propor_viagens(
+    max_pedidos: int = Query(4, ge=1, le=20),
+    espera_max_minutos: int = Query(15, ge=0, le=240),
+):
+    # Para despachar, marque os pedidos da viagem como ENTREGUE em POST /pedidos/status/lote
+    await indice_despacho.garantir_atualizado(bairros_collection, pedidos_collection)
+    return indice_despacho.propor(max_pedidos, timedelta(minutes=espera_max_minutos))
+
+@app.get("/entregas/bairros", response_model=List[Bairro], tags=["Entregas"])
+async def listar_bairros():
+    await indice_despacho.garantir_atualizado(bairros_collection, pedidos_collection)
+    return indice_despacho.tabela()
+
+@app.put("/entregas/bairros", response_model=Bairro, tags=["Entregas"], dependencies=[Depends(exigir_admin)])
+async def definir_bairro(bairro: Bairro):
+    doc = {"_id": chave_bairro(bairro.nome), **bairro.model_dump()}
+    await bairros_collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+    indice_despacho.definir_bairro(doc)
+    return doc
+
+@app.delete("/entregas/bairros/{nome}", status_code=204, tags=["Entregas"], dependencies=[Depends(exigir_admin)])
+async def remover_bairro(nome: str):
+    res = await bairros_collection.delete_one({"_id": chave_bairro(nome)})
+    indice_despacho.remover_bairro(nome)
+    if res.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Bairro não encontrado")
+
+# Rotas de Catálogo (importação/exportação em lote)
+
+COLECOES_CATALOGO = {
+    "produtos": (produtos_collection, cache_produtos),
+    "componentes": (componentes_collection, cache_componentes),
+}
+# Exportação é leitura de vitrine: pode sair de um secundário (MONGO_LEITURA_CATALOGO)
+COLECOES_LEITURA_CATALOGO = {
+    "produtos": produtos_leitura_collection,
+    "componentes": componentes_leitura_collection,
+}
+
+@app.get("/catalogo/{colecao}/exportar", tags=["Catalogo"], dependencies=[Depends(exigir_admin)])
+async def exportar_catalogo(colecao: Literal["produtos", "componentes"], formato: Literal["csv", "ndjson"] = "csv"):
+    collection = COLECOES_LEITURA_CATALOGO[colecao]
+    return StreamingResponse(
+        catalogo_io.exportar(collection, colecao, formato),
+        media_type=catalogo_io.FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{colecao}.{formato}"'},
+    )
+
+@app.post("/catalogo/{colecao}/importar", tags=["Catalogo"], dependencies=[Depends(exigir_admin)])
+async def importar_catalogo(request: Request, colecao: Literal["produtos", "componentes"], formato: Literal["csv", "ndjson"] = "csv"):
+    # Corpo cru (CSV com cabeçalho ou NDJSON); upsert por nome + categoria/tipo
+    collection, cache = COLECOES_CATALOGO[colecao]
+    relatorio = await catalogo_io.importar(request.stream(), collection, colecao, formato)
+    if relatorio["inseridos"] or relatorio["atualizados"]:
+        cache.invalidar()
+        await indice_cardapio.carregar(produtos_collection, componentes_collection)
+        await indice_busca.carregar(produtos_collection, componentes_collection)
+        catalogo_alterado()
+    return relatorio
+
+# Rotas de Relatórios (leem só o consolidado diário: custo proporcional aos dias)
+
+def _periodo(desde: Optional[date], ate: Optional[date]):
+    ate = ate or date.today()
+    desde = desde or ate - timedelta(days=6)
+    if desde > ate:
+        raise HTTPException(status_code=400, detail="Período inválido: 'desde' depois de 'ate'")
+    if (ate - desde).days > 366:
+        raise HTTPException(status_code=400, detail="Período máximo de 366 dias")
+    return desde, ate
+
+@app.get("/relatorios/vendas", tags=["Relatorios"], dependencies=[Depends(exigir_admin)])
+async def relatorio_vendas(desde: Optional[date] = None, ate: Optional[date] = None):
+    desde, ate = _periodo(desde, ate)
+    return await rollups.relatorio_vendas(vendas_diarias_collection, desde, ate)
+
+@app.get("/relatorios/produtos", tags=["Relatorios"], dependencies=[Depends(exigir_admin)])
+async def relatorio_produtos(desde: Optional[date] = None, ate: Optional[date] = None, limite: int = Query(10, ge=1, le=100)):
+    desde, ate = _periodo(desde, ate)
+    return await rollups.produtos_mais_vendidos(vendas_diarias_collection, desde, ate, limite)
+
+@app.post("/relatorios/reconstruir", tags=["Relatorios"], dependencies=[Depends(exigir_admin)])
+async def reconstruir_relatorios(desde: Optional[date] = None, ate: Optional[date] = None):
+    fontes = [pedidos_collection] + await colecoes_do_periodo(db, desde, ate)
+    dias = await rollups.reconstruir(fontes, vendas_diarias_collection, desde, ate)
+    return {"dias_recalculados": dias}
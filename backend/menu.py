@@ -0,0 +1,152 @@
+"""Cardápio do dia materializado num único documento (coleção `cardapio_materializado`).
+
+O app abre o cardápio com um find_one por _id em GET /cardapio: produtos ativos já
+agrupados por categoria e, em cada produto COMPOSTO, as regras de composição com os
+componentes elegíveis agrupados por tipo e as opções de embalagem separada à parte.
+
+O documento é refeito a partir das coleções sempre que uma rota de escrita do
+catálogo mexe em produto ou componente (e na subida da API, para pegar o que o seed
+gravou direto no banco). As reconstruções de um worker são coalescidas; entre
+workers, a gravação é condicional em `lido_em`, então uma leitura mais antiga nunca
+sobrescreve uma mais nova.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from models import CategoriaProduto, TipoComponente
+from pricing import LIMITE_POR_TIPO
+
+logger = logging.getLogger("cardapio.menu")
+
+ID_CARDAPIO = "atual"
+ORDEM_CATEGORIAS = [c.value for c in CategoriaProduto]
+ORDEM_TIPOS = [t.value for t in TipoComponente]
+
+
+def _valor(campo):
+    return getattr(campo, "value", campo)
+
+
+def _componente(doc: dict) -> dict:
+    return {
+        "_id": str(doc["_id"]),
+        "nome": doc["nome"],
+        "tipo": _valor(doc.get("tipo")),
+        "preco_adicional_centavos": doc.get("preco_adicional_centavos", 0),
+        "tags_dieteticas": doc.get("tags_dieteticas", []),
+    }
+
+
+def _produto(doc: dict) -> dict:
+    return {
+        "_id": str(doc["_id"]),
+        "nome": doc["nome"],
+        "descricao": doc.get("descricao", ""),
+        "preco_centavos": doc.get("preco_centavos", 0),
+        "imagem_url": doc.get("imagem_url", ""),
+        "tipo": _valor(doc.get("tipo", "SIMPLES")),
+        "tags_dieteticas": doc.get("tags_dieteticas", []),
+    }
+
+
+def _aceita(limite) -> bool:
+    return limite is None or limite > 0
+
+
+def compor(produtos: List[dict], componentes: List[dict]) -> dict:
+    """Monta o cardápio a partir dos documentos ativos de produtos e componentes."""
+    por_tipo: Dict[str, List[dict]] = {tipo: [] for tipo in ORDEM_TIPOS}
+    separados: List[dict] = []
+    for doc in componentes:
+        entrada = _componente(doc)
+        # Embalagem separada (ex.: saladas) não conta nos limites de composição
+        if doc.get("embalagem_separada"):
+            separados.append(entrada)
+        else:
+            por_tipo.setdefault(entrada["tipo"], []).append(entrada)
+
+    por_categoria: Dict[str, List[dict]] = defaultdict(list)
+    for doc in produtos:
+        entrada = _produto(doc)
+        if entrada["tipo"] == "COMPOSTO":
+            regras = doc.get("regras_composicao") or {}
+            entrada["regras_composicao"] = regras
+            # Mesma regra do pricing: chave ausente = sem limite, então o tipo aparece
+            entrada["componentes"] = {
+                tipo: por_tipo.get(tipo, []) for tipo, chave in LIMITE_POR_TIPO.items() if _aceita(regras.get(chave))
+            }
+            entrada["separados"] = separados
+        por_categoria[_valor(doc.get("categoria"))].append(entrada)
+
+    ordem = ORDEM_CATEGORIAS + sorted(set(por_categoria) - set(ORDEM_CATEGORIAS))
+    return {
+        "categorias": [
+            {"categoria": categoria, "produtos": por_categoria[categoria]}
+            for categoria in ordem if por_categoria.get(categoria)
+        ],
+        "componentes": por_tipo,
+        "separados": separados,
+    }
+
+
+def _versao(conteudo: dict) -> str:
+    # Hash do conteúdo: mesma versão (e ETag) enquanto o cardápio não mudar de fato
+    bruto = json.dumps(conteudo, sort_keys=True, ensure_ascii=False, default=str).encode()
+    return hashlib.blake2b(bruto, digest_size=12).hexdigest()
+
+
+class CardapioMaterializado:
+    def __init__(self):
+        self._tarefa: Optional[asyncio.Task] = None
+        self._pendente = False
+        self.reconstrucoes = 0
+
+    async def reconstruir(self, produtos_collection, componentes_collection, cardapio_collection) -> dict:
+        lido_em = datetime.now()
+        produtos = await produtos_collection.find({"ativo": True}).sort("nome", 1).to_list(None)
+        componentes = await componentes_collection.find({"ativo": True}).sort("nome", 1).to_list(None)
+        conteudo = compor(produtos, componentes)
+        doc = {"_id": ID_CARDAPIO, "versao": _versao(conteudo), "gerado_em": lido_em, "lido_em": lido_em, **conteudo}
+        try:
+            await cardapio_collection.replace_one(
+                {"_id": ID_CARDAPIO, "lido_em": {"$lt": lido_em}}, doc, upsert=True
+            )
+        except DuplicateKeyError:
+            # Outro worker já gravou um cardápio lido depois deste
+            pass
+        self.reconstrucoes += 1
+        return doc
+
+    def agendar(self, produtos_collection, componentes_collection, cardapio_collection) -> None:
+        """Reconstrói em segundo plano; pedidos feitos durante uma reconstrução geram só mais uma."""
+        if self._tarefa and not self._tarefa.done():
+            self._pendente = True
+            return
+
+        async def executar():
+            while True:
+                self._pendente = False
+                try:
+                    await self.reconstruir(produtos_collection, componentes_collection, cardapio_collection)
+                except Exception:
+                    logger.exception("Falha ao reconstruir o cardápio materializado")
+                if not self._pendente:
+                    return
+
+        self._tarefa = asyncio.create_task(executar())
+
+    async def obter(self, produtos_collection, componentes_collection, cardapio_collection) -> dict:
+        doc = await cardapio_collection.find_one({"_id": ID_CARDAPIO})
+        if doc is None:
+            doc = await self.reconstruir(produtos_collection, componentes_collection, cardapio_collection)
+        return doc
+
+
+cardapio_materializado = CardapioMaterializado()
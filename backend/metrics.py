@@ -0,0 +1,180 @@
+"""Métricas da API no formato texto do Prometheus (GET /metrics).
+
+O middleware é ASGI puro (sem BaseHTTPMiddleware) e só faz contas em memória no
+caminho quente: um contador por (método, rota, status) e dois histogramas por
+(método, rota) — latência e tamanho da resposta. A rota é o template
+(`/pedidos/{id}`), nunca o caminho com o id, para a cardinalidade ficar fixa.
+
+O atraso do event loop é medido por uma tarefa do lifespan que dorme um
+intervalo fixo e registra quanto acordou atrasada: se um handler bloquear o
+loop (CPU, chamada síncrona), aparece aqui antes de aparecer na latência.
+"""
+import asyncio
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+METRICAS_INTERVALO_LAG = float(os.getenv("METRICAS_INTERVALO_LAG", "0.5"))
+
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_TAMANHO = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+BUCKETS_LAG = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Requisições que não casaram com nenhuma rota (404, preflight do CORS)
+SEM_ROTA = "<sem rota>"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histograma:
+    __slots__ = ("limites", "contagens", "soma")
+
+    def __init__(self, limites: Tuple[float, ...]):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)  # a última posição é o +Inf
+        self.soma = 0.0
+
+    def observar(self, valor: float) -> None:
+        # bisect_left: valor igual ao limite conta no bucket (le = "menor ou igual")
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+
+    def linhas(self, nome: str, rotulos: str) -> Iterable[str]:
+        separador = "," if rotulos else ""
+        acumulado = 0
+        for limite, contagem in zip(self.limites, self.contagens):
+            acumulado += contagem
+            yield f'{nome}_bucket{{{rotulos}{separador}le="{limite}"}} {acumulado}'
+        acumulado += self.contagens[-1]
+        yield f'{nome}_bucket{{{rotulos}{separador}le="+Inf"}} {acumulado}'
+        sufixo = f"{{{rotulos}}}" if rotulos else ""
+        yield f"{nome}_sum{sufixo} {self.soma}"
+        yield f"{nome}_count{sufixo} {acumulado}"
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(**rotulos) -> str:
+    return ",".join(f'{nome}="{_escapar(str(valor))}"' for nome, valor in rotulos.items())
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self.requisicoes: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.latencias: Dict[Tuple[str, str], Histograma] = {}
+        self.tamanhos: Dict[Tuple[str, str], Histograma] = {}
+        self.em_andamento = 0
+        self.lag = Histograma(BUCKETS_LAG)
+        self.lag_ultimo = 0.0
+        self.lag_maximo = 0.0
+        self.coletores: List[Tuple[str, str, Callable[[], dict]]] = []
+
+    def registrar(self, metodo: str, rota: str, status: int, duracao: float, tamanho: int) -> None:
+        self.requisicoes[(metodo, rota, status)] += 1
+        chave = (metodo, rota)
+        latencia = self.latencias.get(chave)
+        if latencia is None:
+            latencia = self.latencias[chave] = Histograma(BUCKETS_LATENCIA)
+            self.tamanhos[chave] = Histograma(BUCKETS_TAMANHO)
+        latencia.observar(duracao)
+        self.tamanhos[chave].observar(tamanho)
+
+    def registrar_lag(self, atraso: float) -> None:
+        self.lag.observar(atraso)
+        self.lag_ultimo = atraso
+        if atraso > self.lag_maximo:
+            self.lag_maximo = atraso
+
+    def adicionar_coletor(self, prefixo: str, ajuda: str, coletar: Callable[[], dict]) -> None:
+        """Exporta como gauges os valores numéricos de `coletar()` (ex.: stats() do cache)."""
+        self.coletores.append((prefixo, ajuda, coletar))
+
+    def exportar(self) -> str:
+        linhas = [
+            "# HELP cardapio_http_requests_total Requisições HTTP atendidas por método, rota e status.",
+            "# TYPE cardapio_http_requests_total counter",
+        ]
+        for (metodo, rota, status), total in sorted(self.requisicoes.items()):
+            linhas.append(f"cardapio_http_requests_total{{{_rotulos(method=metodo, route=rota, status=status)}}} {total}")
+
+        linhas += [
+            "# HELP cardapio_http_requests_in_progress Requisições HTTP em andamento.",
+            "# TYPE cardapio_http_requests_in_progress gauge",
+            f"cardapio_http_requests_in_progress {self.em_andamento}",
+        ]
+
+        for nome, ajuda, histogramas in (
+            ("cardapio_http_request_duration_seconds", "Latência das requisições HTTP por rota.", self.latencias),
+            ("cardapio_http_response_size_bytes", "Tamanho do corpo das respostas HTTP por rota.", self.tamanhos),
+        ):
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} histogram"]
+            for (metodo, rota), histograma in sorted(histogramas.items()):
+                linhas.extend(histograma.linhas(nome, _rotulos(method=metodo, route=rota)))
+
+        linhas += [
+            "# HELP cardapio_event_loop_lag_seconds Atraso do event loop em relação ao intervalo esperado.",
+            "# TYPE cardapio_event_loop_lag_seconds histogram",
+            *self.lag.linhas("cardapio_event_loop_lag_seconds", ""),
+            "# HELP cardapio_event_loop_lag_last_seconds Último atraso medido do event loop.",
+            "# TYPE cardapio_event_loop_lag_last_seconds gauge",
+            f"cardapio_event_loop_lag_last_seconds {self.lag_ultimo}",
+            "# HELP cardapio_event_loop_lag_max_seconds Maior atraso do event loop desde a subida.",
+            "# TYPE cardapio_event_loop_lag_max_seconds gauge",
+            f"cardapio_event_loop_lag_max_seconds {self.lag_maximo}",
+        ]
+
+        for prefixo, ajuda, coletar in self.coletores:
+            for campo, valor in coletar().items():
+                if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                    continue
+                nome = f"cardapio_{prefixo}_{campo}"
+                linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} gauge", f"{nome} {valor}"]
+
+        return "\n".join(linhas) + "\n"
+
+
+metricas = RegistroMetricas()
+
+
+class MetricasMiddleware:
+    def __init__(self, app, registro: RegistroMetricas = metricas):
+        self.app = app
+        self.registro = registro
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registro = self.registro
+        inicio = time.perf_counter()
+        resposta = [500, 0]  # status, bytes do corpo; 500 se o handler estourar antes de responder
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                resposta[0] = mensagem["status"]
+            elif mensagem["type"] == "http.response.body":
+                resposta[1] += len(mensagem.get("body", b""))
+            await send(mensagem)
+
+        registro.em_andamento += 1
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            registro.em_andamento -= 1
+            # O roteador grava a rota que casou no próprio scope
+            rota = scope.get("route")
+            template = getattr(rota, "path", None) or SEM_ROTA
+            registro.registrar(scope["method"], template, resposta[0], time.perf_counter() - inicio, resposta[1])
+
+
+async def monitorar_event_loop(registro: RegistroMetricas = metricas, intervalo: float = METRICAS_INTERVALO_LAG) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        esperado = loop.time() + intervalo
+        await asyncio.sleep(intervalo)
+        registro.registrar_lag(max(0.0, loop.time() - esperado))
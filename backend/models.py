@@ -48,10 +48,18 @@ class StatusPedido(str, Enum):
     PRONTO = "PRONTO"
     ENTREGUE = "ENTREGUE"
 
+# Fluxo normal do pedido; usado para validar as mudanças de status em lote
+TRANSICOES_STATUS = {
+    StatusPedido.RECEBIDO: {StatusPedido.EM_PREPARO},
+    StatusPedido.EM_PREPARO: {StatusPedido.PRONTO},
+    StatusPedido.PRONTO: {StatusPedido.ENTREGUE},
+    StatusPedido.ENTREGUE: set(),
+}
+
 class Usuario(MongoBaseModel):
+    # senha_hash fica só no banco: nenhuma resposta devolve o hash
     nome: str
     email: EmailStr
-    senha_hash: str
     role: Role
     telefone: str
 
@@ -108,6 +116,92 @@ class ProdutoUpdate(BaseModel):
     tags_dieteticas: Optional[List[str]] = None
 
 
+# --- CARDÁPIO DO DIA (documento materializado, ver menu.py) ---
+class ComponenteCardapio(MongoBaseModel):
+    nome: str
+    tipo: TipoComponente
+    preco_adicional_centavos: int
+    tags_dieteticas: List[str] = []
+
+class ProdutoCardapio(MongoBaseModel):
+    nome: str
+    descricao: str
+    preco_centavos: int
+    imagem_url: str
+    tipo: TipoProduto
+    tags_dieteticas: List[str] = []
+    # Só em produtos COMPOSTO: componentes elegíveis por tipo e os de embalagem separada
+    regras_composicao: Optional[Dict[str, int]] = None
+    componentes: Optional[Dict[str, List[ComponenteCardapio]]] = None
+    separados: Optional[List[ComponenteCardapio]] = None
+
+class CategoriaCardapio(BaseModel):
+    categoria: CategoriaProduto
+    produtos: List[ProdutoCardapio]
+
+class CardapioDoDia(BaseModel):
+    versao: str
+    gerado_em: datetime
+    categorias: List[CategoriaCardapio]
+    componentes: Dict[str, List[ComponenteCardapio]]
+    separados: List[ComponenteCardapio]
+
+# --- BUSCA (índice em memória, ver search.py) ---
+class ItemBusca(MongoBaseModel):
+    colecao: str
+    nome: str
+    tipo: Optional[str] = None
+    categoria: Optional[CategoriaProduto] = None
+    preco_centavos: int
+    tags_dieteticas: List[str] = []
+
+class ResultadoBusca(BaseModel):
+    total: int
+    itens: List[ItemBusca]
+
+# --- COZINHA (quadro de produção, ver kitchen.py) ---
+class PorcoesComponente(BaseModel):
+    nome: str
+    porcoes: int
+
+class QuadroProducao(BaseModel):
+    pedidos_pendentes: int
+    quente: Dict[str, List[PorcoesComponente]]
+    separados: List[PorcoesComponente]
+    atualizado_em: Optional[datetime] = None
+
+# --- ENTREGAS (despacho por bairro, ver dispatch.py) ---
+class Bairro(BaseModel):
+    nome: str = Field(min_length=1)
+    taxa_entrega_centavos: int = Field(ge=0)
+
+class PedidoDespacho(MongoBaseModel):
+    codigo_pedido: Optional[int] = None
+    data_criacao: datetime
+    cliente: Optional[str] = None
+    logradouro: Optional[str] = None
+    numero: Optional[str] = None
+    valor_total_centavos: int = 0
+
+class ViagemEntrega(BaseModel):
+    bairro: str
+    pedidos: List[PedidoDespacho]
+    espera_minutos: float
+    pronta: bool
+    motivo: Optional[str] = None
+
+class PropostaDespacho(BaseModel):
+    pedidos_aguardando: int
+    viagens: List[ViagemEntrega]
+
+# --- HISTÓRICO DO CLIENTE (resumo coberto pelo índice, ver indexes.py) ---
+class ResumoPedido(MongoBaseModel):
+    codigo_pedido: int
+    data_criacao: datetime
+    status: StatusPedido
+    modalidade: ModalidadeEntrega
+    valor_total_centavos: int
+
 class ClienteEmbedded(BaseModel):
     nome: str
     telefone: str
@@ -157,3 +251,17 @@ class PedidoUpdate(BaseModel):
     valor_produtos_centavos: Optional[int] = None
     taxa_entrega_centavos: Optional[int] = None
     valor_total_centavos: Optional[int] = None
+
+class PedidoStatusLote(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=500)
+    status: StatusPedido
+
+class ResultadoItemLote(BaseModel):
+    id: str
+    ok: bool
+    status_anterior: Optional[StatusPedido] = None
+    erro: Optional[str] = None
+
+class ResultadoLote(BaseModel):
+    alterados: int
+    resultados: List[ResultadoItemLote]
@@ -0,0 +1,213 @@
+import asyncio
+import base64
+import heapq
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from serialization import SERIALIZACAO_RAPIDA, RespostaRapida, SerializadorRapido, dumps
+
+# Teto por requisição e tamanho de página sem `limit` (antes era um to_list(1000) fixo).
+# O padrão continua 1000: o web e o mobile ainda não seguem o X-Next-Cursor e
+# perderiam o que passasse de uma página menor.
+PAGE_SIZE_MAXIMO = int(os.getenv("PAGE_SIZE_MAXIMO", "1000"))
+PAGE_SIZE_PADRAO = int(os.getenv("PAGE_SIZE_PADRAO", str(PAGE_SIZE_MAXIMO)))
+
+# Header com o cursor da próxima página (ausente quando não há mais itens)
+HEADER_PROXIMO_CURSOR = "X-Next-Cursor"
+
+ASC = 1
+DESC = -1
+
+
+def documento_para_json(doc: Dict[str, Any]) -> Any:
+    return jsonable_encoder(doc, custom_encoder={ObjectId: str})
+
+
+# --- Cursor (keyset) ---
+
+def codificar_cursor(valor: Any, _id: ObjectId) -> str:
+    if isinstance(valor, datetime):
+        payload = {"t": "dt", "v": valor.isoformat()}
+    elif isinstance(valor, ObjectId):
+        payload = {"t": "oid", "v": str(valor)}
+    else:
+        payload = {"t": "raw", "v": valor}
+    payload["id"] = str(_id)
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["t"] == "dt":
+            valor = datetime.fromisoformat(payload["v"])
+        elif payload["t"] == "oid":
+            valor = ObjectId(payload["v"])
+        else:
+            valor = payload["v"]
+        return valor, ObjectId(payload["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def filtro_keyset(campo: str, direcao: int, cursor: Optional[str]) -> Dict[str, Any]:
+    if not cursor:
+        return {}
+    valor, ultimo_id = decodificar_cursor(cursor)
+    op = "$gt" if direcao == ASC else "$lt"
+    if campo == "_id":
+        return {"_id": {op: ultimo_id}}
+    return {"$or": [
+        {campo: {op: valor}},
+        {campo: valor, "_id": {op: ultimo_id}},
+    ]}
+
+
+def combinar_filtros(*filtros: Dict[str, Any]) -> Dict[str, Any]:
+    partes = [f for f in filtros if f]
+    if not partes:
+        return {}
+    if len(partes) == 1:
+        return partes[0]
+    return {"$and": partes}
+
+
+def montar_projecao(
+    fields: Optional[str], campo_ordem: str, permitidos: Optional[Set[str]] = None
+) -> Optional[Dict[str, int]]:
+    # "fields=status,cliente.nome" -> projeção que sempre inclui as chaves do cursor.
+    # Com `permitidos` (campos do response_model), campo fora do modelo é ignorado
+    if not fields:
+        return None
+    campos = [f.strip() for f in fields.split(",") if f.strip()]
+    if permitidos is not None:
+        campos = [campo for campo in campos if campo.split(".", 1)[0] in permitidos]
+    if not campos:
+        return None
+    projecao = {campo: 1 for campo in campos}
+    projecao["_id"] = 1
+    projecao[campo_ordem] = 1
+    return projecao
+
+
+# --- Consulta ---
+
+def _abrir_cursor(collection, filtro, campo_ordem, direcao, projecao, limit):
+    ordem = [(campo_ordem, direcao)]
+    if campo_ordem != "_id":
+        ordem.append(("_id", direcao))
+    cursor = collection.find(filtro, projecao).sort(ordem)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+
+async def _pagina_multipla(colecoes, filtro, campo_ordem, direcao, projecao, limit):
+    # Cada coleção devolve a própria página na mesma ordem; o merge fica com as `limit` primeiras
+    paginas = await asyncio.gather(*(
+        _abrir_cursor(c, filtro, campo_ordem, direcao, projecao, limit).to_list(limit) for c in colecoes
+    ))
+    chave = (lambda d: d["_id"]) if campo_ordem == "_id" else (lambda d: (d[campo_ordem], d["_id"]))
+    mescladas = heapq.merge(*paginas, key=chave, reverse=direcao == DESC)
+    return [doc for doc, _ in zip(mescladas, range(limit))]
+
+
+async def buscar_pagina(
+    collection,
+    filtro: Dict[str, Any],
+    campo_ordem: str,
+    direcao: int,
+    limit: int,
+    cursor: Optional[str] = None,
+    projecao: Optional[Dict[str, int]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    filtro = combinar_filtros(filtro, filtro_keyset(campo_ordem, direcao, cursor))
+    # Busca um item a mais só para saber se existe próxima página
+    if isinstance(collection, (list, tuple)):
+        docs = await _pagina_multipla(collection, filtro, campo_ordem, direcao, projecao, limit + 1)
+    else:
+        docs = await _abrir_cursor(collection, filtro, campo_ordem, direcao, projecao, limit + 1).to_list(limit + 1)
+    proximo = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        ultimo = docs[-1]
+        proximo = codificar_cursor(ultimo.get(campo_ordem), ultimo["_id"])
+    return docs, proximo
+
+
+async def stream_ndjson(collection, filtro, campo_ordem, direcao, limit=None, cursor=None, projecao=None,
+                        serializador: Optional[SerializadorRapido] = None):
+    filtro = combinar_filtros(filtro, filtro_keyset(campo_ordem, direcao, cursor))
+    async for doc in _abrir_cursor(collection, filtro, campo_ordem, direcao, projecao, limit):
+        if serializador is not None:
+            doc = serializador.documento(doc)
+        if SERIALIZACAO_RAPIDA:
+            yield dumps(doc) + b"\n"
+        else:
+            yield json.dumps(documento_para_json(doc), ensure_ascii=False).encode() + b"\n"
+
+
+async def listar(
+    response,
+    collection,
+    filtro: Dict[str, Any],
+    campo_ordem: str = "_id",
+    direcao: int = ASC,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    stream: bool = False,
+    serializador: Optional[SerializadorRapido] = None,
+):
+    """Contrato de listagem comum a /pedidos, /usuarios, /produtos e /componentes.
+
+    - Página: devolve a lista e, se houver mais itens, o header X-Next-Cursor.
+    - fields: projeção; a resposta sai sem passar pelo response_model. Com
+      `serializador`, só valem campos do modelo.
+    - stream: NDJSON, um documento por linha, conforme o cursor do Motor entrega.
+      Sem fields, cada linha é recortada pelo `serializador` (campos do modelo,
+      como na página), nunca o documento cru do banco.
+    - serializador: com SERIALIZACAO_RAPIDA=1, a página sai pelo caminho rápido
+      (serialization.py) em vez de passar pelo response_model.
+    - collection pode ser uma lista (ex.: pedidos + arquivo): a página é o merge
+      das páginas de cada coleção, com o mesmo cursor. Sem stream nesse caso.
+    """
+    projecao = montar_projecao(fields, campo_ordem, serializador.chaves if serializador else None)
+
+    if stream and isinstance(collection, (list, tuple)):
+        raise HTTPException(status_code=400, detail="stream não disponível ao consultar várias coleções")
+
+    if stream:
+        recorte = serializador if projecao is None else None
+        if recorte is not None:
+            projecao = recorte.projecao()
+        return StreamingResponse(
+            stream_ndjson(collection, filtro, campo_ordem, direcao, limit, cursor, projecao, recorte),
+            media_type="application/x-ndjson",
+        )
+
+    docs, proximo = await buscar_pagina(
+        collection, filtro, campo_ordem, direcao, limit or PAGE_SIZE_PADRAO, cursor, projecao
+    )
+
+    if projecao is not None or (serializador and SERIALIZACAO_RAPIDA):
+        if projecao is not None:
+            resp = RespostaRapida(docs) if SERIALIZACAO_RAPIDA else JSONResponse(content=documento_para_json(docs))
+        else:
+            resp = RespostaRapida(serializador.lista(docs))
+        if proximo:
+            resp.headers[HEADER_PROXIMO_CURSOR] = proximo
+        return resp
+
+    if proximo:
+        response.headers[HEADER_PROXIMO_CURSOR] = proximo
+    return docs
@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+# De quanto em quanto tempo o índice é recarregado por inteiro (escritas feitas por outros workers)
+INDICE_RECARGA_SEGUNDOS = float(os.getenv("INDICE_RECARGA_SEGUNDOS", "60"))
+
+# Tipo do componente -> chave em regras_composicao
+LIMITE_POR_TIPO = {
+    "BASE": "max_base",
+    "PROTEINA": "max_proteina",
+    "GUARNICAO": "max_guarnicao",
+}
+
+
+class IndiceCardapio:
+    """Índice em memória dos produtos e componentes ativos.
+
+    Resolve nome ou _id em O(1) para preço, tipo e flags, e é mantido pelas rotas de
+    escrita do catálogo (`atualizar_*` / `remover_*`), sem consulta por item no pedido.
+    """
+
+    def __init__(self):
+        self.produtos_por_id: Dict[str, dict] = {}
+        self.produtos_por_nome: Dict[str, dict] = {}
+        self.componentes_por_id: Dict[str, dict] = {}
+        self.componentes_por_nome: Dict[str, dict] = {}
+        self.carregado_em = 0.0
+        self._lock = asyncio.Lock()
+
+    # --- Manutenção ---
+
+    @staticmethod
+    def _entrada_produto(doc: dict) -> dict:
+        return {
+            "id": str(doc["_id"]),
+            "nome": doc["nome"],
+            "preco_centavos": doc.get("preco_centavos", 0),
+            "tipo": doc.get("tipo", "SIMPLES"),
+            "categoria": doc.get("categoria"),
+            "regras_composicao": doc.get("regras_composicao") or {},
+        }
+
+    @staticmethod
+    def _entrada_componente(doc: dict) -> dict:
+        return {
+            "id": str(doc["_id"]),
+            "nome": doc["nome"],
+            "tipo": doc.get("tipo"),
+            "embalagem_separada": bool(doc.get("embalagem_separada")),
+            "preco_adicional_centavos": doc.get("preco_adicional_centavos", 0),
+        }
+
+    def atualizar_produto(self, doc: dict) -> None:
+        self.remover_produto(str(doc["_id"]))
+        if not doc.get("ativo", True):
+            return
+        entrada = self._entrada_produto(doc)
+        self.produtos_por_id[entrada["id"]] = entrada
+        self.produtos_por_nome[entrada["nome"]] = entrada
+
+    def remover_produto(self, id: str) -> None:
+        antiga = self.produtos_por_id.pop(id, None)
+        if antiga and self.produtos_por_nome.get(antiga["nome"]) is antiga:
+            del self.produtos_por_nome[antiga["nome"]]
+
+    def atualizar_componente(self, doc: dict) -> None:
+        self.remover_componente(str(doc["_id"]))
+        if not doc.get("ativo", True):
+            return
+        entrada = self._entrada_componente(doc)
+        self.componentes_por_id[entrada["id"]] = entrada
+        self.componentes_por_nome[entrada["nome"]] = entrada
+
+    def remover_componente(self, id: str) -> None:
+        antiga = self.componentes_por_id.pop(id, None)
+        if antiga and self.componentes_por_nome.get(antiga["nome"]) is antiga:
+            del self.componentes_por_nome[antiga["nome"]]
+
+    async def carregar(self, produtos_collection, componentes_collection) -> None:
+        novo = IndiceCardapio()
+        async for doc in produtos_collection.find({"ativo": True}):
+            novo.atualizar_produto(doc)
+        async for doc in componentes_collection.find({"ativo": True}):
+            novo.atualizar_componente(doc)
+        self.produtos_por_id, self.produtos_por_nome = novo.produtos_por_id, novo.produtos_por_nome
+        self.componentes_por_id, self.componentes_por_nome = novo.componentes_por_id, novo.componentes_por_nome
+        self.carregado_em = time.monotonic()
+
+    async def garantir_atualizado(self, produtos_collection, componentes_collection) -> None:
+        if time.monotonic() - self.carregado_em < INDICE_RECARGA_SEGUNDOS:
+            return
+        async with self._lock:
+            if time.monotonic() - self.carregado_em >= INDICE_RECARGA_SEGUNDOS:
+                await self.carregar(produtos_collection, componentes_collection)
+
+    # --- Consulta ---
+
+    def produto(self, chave: str) -> Optional[dict]:
+        return self.produtos_por_nome.get(chave) or self.produtos_por_id.get(chave)
+
+    def componente(self, chave: str) -> Optional[dict]:
+        return self.componentes_por_nome.get(chave) or self.componentes_por_id.get(chave)
+
+    # --- Validação e preço ---
+
+    def precificar_item(self, item: Dict[str, Any], posicao: int, erros: List[str]) -> Optional[Dict[str, Any]]:
+        rotulo = f"itens[{posicao}]"
+        produto = self.produto(item["nome_produto"])
+        if produto is None:
+            erros.append(f"{rotulo}: produto '{item['nome_produto']}' não existe ou está inativo")
+            return None
+        if item["quantidade"] < 1:
+            erros.append(f"{rotulo}: quantidade deve ser maior que zero")
+
+        selecoes = item.get("selecoes") or []
+        if produto["tipo"] != "COMPOSTO" and selecoes:
+            erros.append(f"{rotulo}: '{produto['nome']}' não aceita seleções")
+            return None
+
+        preco = produto["preco_centavos"]
+        contagem = {"BASE": 0, "PROTEINA": 0, "GUARNICAO": 0}
+        nomes = []
+        for selecao in selecoes:
+            comp = self.componente(selecao)
+            if comp is None:
+                erros.append(f"{rotulo}: componente '{selecao}' não existe ou está inativo")
+                continue
+            nomes.append(comp["nome"])
+            preco += comp["preco_adicional_centavos"]
+            # Saladas em pote separado não ocupam espaço na marmita
+            if comp["embalagem_separada"]:
+                continue
+            if comp["tipo"] in contagem:
+                contagem[comp["tipo"]] += 1
+
+        regras = produto["regras_composicao"]
+        for tipo, quantidade in contagem.items():
+            # Chave ausente = sem limite para o tipo (ex.: regras só com max_proteina e max_guarnicao)
+            limite = regras.get(LIMITE_POR_TIPO[tipo])
+            if limite is not None and quantidade > limite:
+                erros.append(f"{rotulo}: '{produto['nome']}' permite no máximo {limite} de {tipo} ({quantidade} escolhidos)")
+
+        return {
+            **item,
+            "nome_produto": produto["nome"],
+            "preco_unitario": preco,
+            "selecoes": nomes,
+        }
+
+    def precificar_pedido(self, itens: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        # Valida o pedido inteiro e devolve (itens com preço do servidor, valor dos produtos).
+        # Todos os erros são reunidos num único 422.
+        erros: List[str] = []
+        if not itens:
+            erros.append("itens: o pedido precisa de pelo menos um item")
+        precificados = []
+        for posicao, item in enumerate(itens):
+            resultado = self.precificar_item(item, posicao, erros)
+            if resultado is not None:
+                precificados.append(resultado)
+        if erros:
+            raise HTTPException(status_code=422, detail=erros)
+        valor = sum(item["preco_unitario"] * item["quantidade"] for item in precificados)
+        return precificados, valor
+
+
+indice_cardapio = IndiceCardapio()
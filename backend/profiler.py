@@ -0,0 +1,229 @@
+"""Perfil dos comandos enviados ao MongoDB e log de consultas lentas.
+
+Um CommandListener do pymongo (registrado no client em db.py) cronometra todo
+comando e agrega por "formato" de consulta: coleção + operação + chaves do filtro
+(e da ordenação), sem os valores — `find usuarios {email}` junta todos os logins.
+
+Comandos acima de MONGO_LENTO_MS vão para o log. O explain deles não roda no
+listener (que executa na thread do pymongo, no meio da operação): fica numa fila
+que uma tarefa do lifespan esvazia, no máximo um explain por formato a cada
+MONGO_EXPLAIN_INTERVALO segundos. O plano vencedor aparece no log e em
+GET /admin/consultas.
+
+Cursores de espera (change stream, find tailable) ficam de fora: cada getMore
+deles segura a resposta até chegar evento ou vencer o awaitData (~1 s) e
+apareceria como lento a cada segundo.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from pymongo import monitoring
+
+from indexes import plano_vencedor
+
+logger = logging.getLogger("cardapio.mongo")
+
+MONGO_PERFIL = os.getenv("MONGO_PERFIL", "1") == "1"
+MONGO_LENTO_MS = float(os.getenv("MONGO_LENTO_MS", "100"))
+MONGO_EXPLAIN_INTERVALO = float(os.getenv("MONGO_EXPLAIN_INTERVALO", "300"))
+
+# Comandos de controle do driver: não dizem nada sobre as consultas da API
+_IGNORADOS = frozenset({
+    "hello", "ismaster", "isMaster", "ping", "buildInfo", "buildinfo", "endSessions",
+    "saslStart", "saslContinue", "killCursors", "explain", "listIndexes", "createIndexes",
+})
+# Onde cada comando guarda o filtro
+_FILTROS = {
+    "find": lambda c: c.get("filter"),
+    "count": lambda c: c.get("query"),
+    "distinct": lambda c: c.get("query"),
+    "findAndModify": lambda c: c.get("query"),
+    "update": lambda c: (c.get("updates") or [{}])[0].get("q"),
+    "delete": lambda c: (c.get("deletes") or [{}])[0].get("q"),
+    "aggregate": lambda c: next((e["$match"] for e in c.get("pipeline", []) if "$match" in e), None),
+}
+_EXPLICAVEIS = frozenset(_FILTROS)
+# Campos que o driver acrescenta e que o explain não aceita
+_CAMPOS_INTERNOS = ("lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "writeConcern", "readConcern")
+
+
+def _forma_filtro(filtro) -> str:
+    # Mantém chaves e operadores, descarta valores: {"data_criacao": {"$gte": ...}} -> {data_criacao:{$gte}}
+    if not isinstance(filtro, dict) or not filtro:
+        return "{}"
+    partes = []
+    for chave in sorted(filtro):
+        valor = filtro[chave]
+        if chave in ("$and", "$or", "$nor") and isinstance(valor, list):
+            partes.append(f"{chave}:[{','.join(sorted({_forma_filtro(v) for v in valor}))}]")
+        elif isinstance(valor, dict) and valor and all(str(k).startswith("$") for k in valor):
+            partes.append(f"{chave}:{{{','.join(sorted(valor))}}}")
+        else:
+            partes.append(chave)
+    return "{" + ",".join(partes) + "}"
+
+
+def _abre_cursor_de_espera(nome: str, comando: dict) -> bool:
+    if nome == "aggregate":
+        pipeline = comando.get("pipeline") or [{}]
+        return "$changeStream" in pipeline[0]
+    return nome == "find" and bool(comando.get("tailable"))
+
+
+def forma_consulta(nome: str, comando: dict) -> str:
+    colecao = comando.get(nome)
+    if nome == "getMore":
+        colecao = comando.get("collection")
+    forma = f"{nome} {colecao}"
+    extrair = _FILTROS.get(nome)
+    if extrair:
+        forma += " " + _forma_filtro(extrair(comando))
+    ordem = comando.get("sort")
+    if isinstance(ordem, dict) and ordem:
+        forma += " sort(" + ",".join(f"{k}:{v}" for k, v in ordem.items()) + ")"
+    return forma
+
+
+class EstatisticaForma:
+    __slots__ = ("forma", "execucoes", "falhas", "lentos", "total_ms", "max_ms", "plano", "explicado_em")
+
+    def __init__(self, forma: str):
+        self.forma = forma
+        self.execucoes = 0
+        self.falhas = 0
+        self.lentos = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.plano: Optional[str] = None
+        self.explicado_em = 0.0
+
+    def como_dict(self) -> dict:
+        return {
+            "forma": self.forma,
+            "execucoes": self.execucoes,
+            "falhas": self.falhas,
+            "lentos": self.lentos,
+            "total_ms": round(self.total_ms, 2),
+            "media_ms": round(self.total_ms / self.execucoes, 2) if self.execucoes else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "plano": self.plano,
+        }
+
+
+class PerfiladorComandos(monitoring.CommandListener):
+    """Os callbacks rodam nas threads do pymongo: todo estado compartilhado passa pelo lock."""
+
+    def __init__(self, limite_lento_ms: float = MONGO_LENTO_MS):
+        self.limite_lento_ms = limite_lento_ms
+        self._lock = threading.Lock()
+        self._em_voo: Dict[Tuple, Tuple[str, str, dict]] = {}
+        # ids dos cursores de espera abertos: os getMore deles não são medidos
+        self._cursores_espera: Set[int] = set()
+        self.formas: Dict[str, EstatisticaForma] = {}
+        # (forma, banco, comando) dos lentos esperando explain; deque é seguro entre threads
+        self.para_explicar: Deque[Tuple[str, str, dict]] = deque(maxlen=100)
+        self.inicio = time.time()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name == "killCursors":
+            with self._lock:
+                self._cursores_espera.difference_update(event.command.get("cursors") or [])
+            return
+        if event.command_name in _IGNORADOS:
+            return
+        if event.command_name == "getMore" and event.command.get("getMore") in self._cursores_espera:
+            return
+        forma = forma_consulta(event.command_name, event.command)
+        with self._lock:
+            self._em_voo[(event.connection_id, event.request_id)] = (forma, event.database_name, event.command)
+
+    def _concluir(self, event, falhou: bool) -> None:
+        with self._lock:
+            em_voo = self._em_voo.pop((event.connection_id, event.request_id), None)
+            if em_voo is None:
+                return
+            forma, banco, comando = em_voo
+            duracao_ms = event.duration_micros / 1000
+            estatistica = self.formas.get(forma)
+            if estatistica is None:
+                estatistica = self.formas[forma] = EstatisticaForma(forma)
+            estatistica.execucoes += 1
+            estatistica.total_ms += duracao_ms
+            if duracao_ms > estatistica.max_ms:
+                estatistica.max_ms = duracao_ms
+            if falhou:
+                estatistica.falhas += 1
+            lento = duracao_ms >= self.limite_lento_ms
+            if lento:
+                estatistica.lentos += 1
+        if lento:
+            logger.warning("Comando lento no MongoDB (%.1f ms): %s", duracao_ms, forma)
+            if event.command_name in _EXPLICAVEIS:
+                self.para_explicar.append((forma, banco, comando))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        if event.command_name in ("aggregate", "find"):
+            with self._lock:
+                em_voo = self._em_voo.get((event.connection_id, event.request_id))
+                cursor_id = (event.reply.get("cursor") or {}).get("id")
+                if em_voo and cursor_id and _abre_cursor_de_espera(event.command_name, em_voo[2]):
+                    self._cursores_espera.add(cursor_id)
+        self._concluir(event, falhou=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._concluir(event, falhou=True)
+
+    def mais_lentas(self, limite: int = 20, ordem: str = "total_ms") -> List[dict]:
+        with self._lock:
+            resumo = [e.como_dict() for e in self.formas.values()]
+        return sorted(resumo, key=lambda e: e[ordem], reverse=True)[:limite]
+
+    def limpar(self) -> None:
+        with self._lock:
+            self.formas.clear()
+        self.inicio = time.time()
+
+    async def explicar_pendentes(self, client) -> int:
+        """Roda o explain dos comandos lentos na fila (um por formato a cada intervalo)."""
+        explicados = 0
+        while self.para_explicar:
+            forma, banco, comando = self.para_explicar.popleft()
+            estatistica = self.formas.get(forma)
+            agora = time.monotonic()
+            if estatistica is None or (estatistica.plano and agora - estatistica.explicado_em < MONGO_EXPLAIN_INTERVALO):
+                continue
+            estatistica.explicado_em = agora
+            alvo = {k: v for k, v in comando.items() if k not in _CAMPOS_INTERNOS}
+            try:
+                explicacao = await client[banco].command({"explain": alvo, "verbosity": "queryPlanner"})
+            except Exception as e:
+                logger.info("Explain de %s falhou: %s", forma, e)
+                continue
+            estatistica.plano = plano_vencedor(explicacao)
+            explicados += 1
+            logger.warning("Plano de %s: %s", forma, estatistica.plano)
+        return explicados
+
+
+perfilador = PerfiladorComandos()
+
+
+def listeners() -> list:
+    return [perfilador] if MONGO_PERFIL else []
+
+
+async def explicar_lentos(client, intervalo: float = 1.0) -> None:
+    # Tarefa do lifespan
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            await perfilador.explicar_pendentes(client)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Falha ao explicar comandos lentos")
@@ -0,0 +1,288 @@
+"""Consolidação incremental de vendas por dia (e hora) na coleção `vendas_diarias`.
+
+Cada pedido contribui com um conjunto de contadores (`contribuicao`). Ao criar um
+pedido soma-se a contribuição dele; ao alterar, soma-se a diferença entre o depois
+e o antes — tudo num único `$inc` com upsert no documento do dia. Os relatórios
+leem só os documentos dos dias pedidos.
+
+Para recalcular a partir de `pedidos` e do arquivo (backfill ou correção), na pasta backend:
+
+    python rollups.py rebuild [AAAA-MM-DD] [AAAA-MM-DD]
+
+A reconstrução não é atômica com os `$inc` da API: uma mudança de pedido aplicada
+entre a agregação e a gravação de um dia se perde. Use para dias fechados, ou com
+a API parada quando o intervalo inclui hoje.
+"""
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne, UpdateOne
+
+ROLLUP_COLLECTION = "vendas_diarias"
+
+
+def dia_do_pedido(pedido: dict) -> str:
+    return pedido["data_criacao"].strftime("%Y-%m-%d")
+
+
+def chave_segura(nome: str) -> str:
+    # Nomes de produto viram chave de campo: "." e "$" inicial não são aceitos pelo MongoDB
+    nome = nome.replace(".", "．")
+    return "＄" + nome[1:] if nome.startswith("$") else nome
+
+
+def nome_da_chave(chave: str) -> str:
+    chave = chave.replace("．", ".")
+    return "$" + chave[1:] if chave.startswith("＄") else chave
+
+
+def _texto(valor) -> str:
+    return valor.value if isinstance(valor, Enum) else str(valor)
+
+
+def contribuicao(pedido: Optional[dict]) -> Dict[str, int]:
+    if not pedido:
+        return {}
+    receita = pedido.get("valor_total_centavos", 0)
+    hora = pedido["data_criacao"].strftime("%H")
+    inc = defaultdict(int)
+    inc["pedidos"] += 1
+    inc["receita_centavos"] += receita
+    inc["taxa_entrega_centavos"] += pedido.get("taxa_entrega_centavos", 0)
+    inc[f"por_hora.{hora}.pedidos"] += 1
+    inc[f"por_hora.{hora}.receita_centavos"] += receita
+    for grupo in ("forma_pagamento", "modalidade"):
+        valor = pedido.get(grupo)
+        if valor:
+            inc[f"por_{grupo}.{_texto(valor)}.pedidos"] += 1
+            inc[f"por_{grupo}.{_texto(valor)}.receita_centavos"] += receita
+    inc[f"por_status.{_texto(pedido.get('status', 'RECEBIDO'))}"] += 1
+    for item in pedido.get("itens", []):
+        chave = chave_segura(item["nome_produto"])
+        inc[f"produtos.{chave}.quantidade"] += item["quantidade"]
+        inc[f"produtos.{chave}.receita_centavos"] += item["quantidade"] * item["preco_unitario"]
+    return inc
+
+
+def delta(antes: Optional[dict], depois: Optional[dict]) -> Dict[str, int]:
+    inc = defaultdict(int, contribuicao(depois))
+    for campo, valor in contribuicao(antes).items():
+        inc[campo] -= valor
+    return {campo: valor for campo, valor in inc.items() if valor}
+
+
+async def registrar(rollup_collection, antes: Optional[dict], depois: Optional[dict]) -> None:
+    """Aplica no rollup a mudança de um pedido (antes=None na criação)."""
+    referencia = depois or antes
+    if referencia is None:
+        return
+    inc = delta(antes, depois)
+    if not inc:
+        return
+    await rollup_collection.update_one(
+        {"_id": dia_do_pedido(referencia)},
+        {"$inc": inc, "$set": {"atualizado_em": datetime.now()}},
+        upsert=True,
+    )
+
+
+async def registrar_lote(rollup_collection, mudancas: Iterable[Tuple[Optional[dict], Optional[dict]]]) -> None:
+    """Como `registrar` para vários pedidos: soma os deltas por dia, um bulk_write só."""
+    por_dia: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for antes, depois in mudancas:
+        referencia = depois or antes
+        if referencia is None:
+            continue
+        for campo, valor in delta(antes, depois).items():
+            por_dia[dia_do_pedido(referencia)][campo] += valor
+    agora = datetime.now()
+    operacoes = []
+    for dia, inc in por_dia.items():
+        inc = {campo: valor for campo, valor in inc.items() if valor}
+        if inc:
+            operacoes.append(UpdateOne({"_id": dia}, {"$inc": inc, "$set": {"atualizado_em": agora}}, upsert=True))
+    if operacoes:
+        await rollup_collection.bulk_write(operacoes, ordered=False)
+
+
+# --- Relatórios ---
+
+def _intervalo(desde: date, ate: date) -> dict:
+    return {"_id": {"$gte": desde.isoformat(), "$lte": ate.isoformat()}}
+
+
+def _com_ticket(grupo: dict) -> dict:
+    pedidos = grupo.get("pedidos", 0)
+    return {**grupo, "ticket_medio_centavos": grupo.get("receita_centavos", 0) // pedidos if pedidos else 0}
+
+
+async def relatorio_vendas(rollup_collection, desde: date, ate: date) -> dict:
+    dias = []
+    totais = defaultdict(int)
+    por_forma = defaultdict(lambda: defaultdict(int))
+    por_modalidade = defaultdict(lambda: defaultdict(int))
+    async for doc in rollup_collection.find(_intervalo(desde, ate), {"produtos": 0}).sort("_id", 1):
+        dias.append(_com_ticket({
+            "dia": doc["_id"],
+            "pedidos": doc.get("pedidos", 0),
+            "receita_centavos": doc.get("receita_centavos", 0),
+            "por_forma_pagamento": doc.get("por_forma_pagamento", {}),
+            "por_modalidade": doc.get("por_modalidade", {}),
+            "por_hora": doc.get("por_hora", {}),
+        }))
+        for campo in ("pedidos", "receita_centavos", "taxa_entrega_centavos"):
+            totais[campo] += doc.get(campo, 0)
+        for destino, origem in ((por_forma, "por_forma_pagamento"), (por_modalidade, "por_modalidade")):
+            for chave, valores in doc.get(origem, {}).items():
+                for campo, valor in valores.items():
+                    destino[chave][campo] += valor
+    return {
+        "desde": desde.isoformat(),
+        "ate": ate.isoformat(),
+        "totais": _com_ticket(dict(totais)),
+        "por_forma_pagamento": {k: _com_ticket(dict(v)) for k, v in por_forma.items()},
+        "por_modalidade": {k: _com_ticket(dict(v)) for k, v in por_modalidade.items()},
+        "dias": dias,
+    }
+
+
+async def produtos_mais_vendidos(rollup_collection, desde: date, ate: date, limite: int = 10) -> List[dict]:
+    somas = defaultdict(lambda: {"quantidade": 0, "receita_centavos": 0})
+    async for doc in rollup_collection.find(_intervalo(desde, ate), {"produtos": 1}):
+        for chave, valores in doc.get("produtos", {}).items():
+            somas[chave]["quantidade"] += valores.get("quantidade", 0)
+            somas[chave]["receita_centavos"] += valores.get("receita_centavos", 0)
+    ranking = sorted(somas.items(), key=lambda kv: (-kv[1]["quantidade"], -kv[1]["receita_centavos"]))
+    return [{"nome_produto": nome_da_chave(chave), **valores} for chave, valores in ranking[:limite]]
+
+
+# --- Reconstrução ---
+
+def _pipeline_pedidos(filtro: dict) -> list:
+    return [
+        {"$match": filtro},
+        {"$group": {
+            "_id": {
+                "dia": {"$dateToString": {"format": "%Y-%m-%d", "date": "$data_criacao"}},
+                "hora": {"$dateToString": {"format": "%H", "date": "$data_criacao"}},
+                "forma_pagamento": "$forma_pagamento",
+                "modalidade": "$modalidade",
+                "status": "$status",
+            },
+            "pedidos": {"$sum": 1},
+            "receita_centavos": {"$sum": "$valor_total_centavos"},
+            "taxa_entrega_centavos": {"$sum": "$taxa_entrega_centavos"},
+        }},
+    ]
+
+
+def _pipeline_itens(filtro: dict) -> list:
+    return [
+        {"$match": filtro},
+        {"$unwind": "$itens"},
+        {"$group": {
+            "_id": {
+                "dia": {"$dateToString": {"format": "%Y-%m-%d", "date": "$data_criacao"}},
+                "produto": "$itens.nome_produto",
+            },
+            "quantidade": {"$sum": "$itens.quantidade"},
+            "receita_centavos": {"$sum": {"$multiply": ["$itens.quantidade", "$itens.preco_unitario"]}},
+        }},
+    ]
+
+
+async def _acumular(pedidos_collection, filtro: dict, dias: Dict[str, Dict[str, int]]) -> None:
+    async for grupo in pedidos_collection.aggregate(_pipeline_pedidos(filtro), allowDiskUse=True):
+        g = grupo["_id"]
+        inc = dias[g["dia"]]
+        receita = grupo["receita_centavos"]
+        inc["pedidos"] += grupo["pedidos"]
+        inc["receita_centavos"] += receita
+        inc["taxa_entrega_centavos"] += grupo["taxa_entrega_centavos"]
+        inc[f"por_hora.{g['hora']}.pedidos"] += grupo["pedidos"]
+        inc[f"por_hora.{g['hora']}.receita_centavos"] += receita
+        for campo in ("forma_pagamento", "modalidade"):
+            if g.get(campo):
+                inc[f"por_{campo}.{_texto(g[campo])}.pedidos"] += grupo["pedidos"]
+                inc[f"por_{campo}.{_texto(g[campo])}.receita_centavos"] += receita
+        inc[f"por_status.{_texto(g.get('status') or 'RECEBIDO')}"] += grupo["pedidos"]
+    async for grupo in pedidos_collection.aggregate(_pipeline_itens(filtro), allowDiskUse=True):
+        inc = dias[grupo["_id"]["dia"]]
+        chave = chave_segura(grupo["_id"]["produto"])
+        inc[f"produtos.{chave}.quantidade"] += grupo["quantidade"]
+        inc[f"produtos.{chave}.receita_centavos"] += grupo["receita_centavos"]
+
+
+def _aninhar(inc: Dict[str, int]) -> dict:
+    # {"por_hora.12.pedidos": 3} -> {"por_hora": {"12": {"pedidos": 3}}}; chaves vêm de chave_segura, sem "."
+    doc: dict = {}
+    for campo, valor in inc.items():
+        *caminho, folha = campo.split(".")
+        alvo = doc
+        for parte in caminho:
+            alvo = alvo.setdefault(parte, {})
+        alvo[folha] = valor
+    return doc
+
+
+async def reconstruir(pedidos_collection, rollup_collection, desde: Optional[date] = None, ate: Optional[date] = None) -> int:
+    """Recalcula os dias do intervalo a partir de `pedidos` e substitui os documentos do rollup.
+
+    `pedidos_collection` pode ser uma lista de coleções (pedidos + buckets do
+    arquivo, ver archive.py): as contribuições de todas são somadas por dia.
+    Os dias são gravados com um bulk_write de ReplaceOne; ver a ressalva de
+    concorrência no topo do módulo.
+    """
+    fontes = pedidos_collection if isinstance(pedidos_collection, (list, tuple)) else [pedidos_collection]
+    filtro = {}
+    if desde or ate:
+        filtro["data_criacao"] = {}
+        if desde:
+            filtro["data_criacao"]["$gte"] = datetime.combine(desde, datetime.min.time())
+        if ate:
+            filtro["data_criacao"]["$lt"] = datetime.combine(ate + timedelta(days=1), datetime.min.time())
+
+    dias: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for fonte in fontes:
+        await _acumular(fonte, filtro, dias)
+
+    agora = datetime.now()
+    operacoes = [
+        ReplaceOne({"_id": dia}, {"_id": dia, **_aninhar(inc), "atualizado_em": agora}, upsert=True)
+        for dia, inc in dias.items()
+    ]
+    if operacoes:
+        await rollup_collection.bulk_write(operacoes, ordered=False)
+    # Dias do intervalo que ficaram sem pedidos também são refeitos: saem do rollup
+    vazios = {"$nin": list(dias)}
+    if desde:
+        vazios["$gte"] = desde.isoformat()
+    if ate:
+        vazios["$lte"] = ate.isoformat()
+    await rollup_collection.delete_many({"_id": vazios})
+    return len(dias)
+
+
+async def _cli(argumentos: List[str]) -> int:
+    from archive import colecoes_do_periodo
+    from db import db, pedidos_collection
+
+    desde = date.fromisoformat(argumentos[0]) if len(argumentos) > 0 else None
+    ate = date.fromisoformat(argumentos[1]) if len(argumentos) > 1 else None
+    if ate is None or ate >= date.today():
+        print("Atenção: o intervalo inclui hoje; pedidos alterados durante a reconstrução podem ficar de fora")
+    fontes = [pedidos_collection] + await colecoes_do_periodo(db, desde, ate)
+    total = await reconstruir(fontes, db.get_collection(ROLLUP_COLLECTION), desde, ate)
+    print(f"{total} dia(s) recalculado(s) em {ROLLUP_COLLECTION}")
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print(__doc__)
+        sys.exit(2)
+    sys.exit(asyncio.run(_cli(sys.argv[2:])))
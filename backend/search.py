@@ -0,0 +1,197 @@
+"""Índice invertido em memória para a busca de produtos e componentes (GET /busca).
+
+Cada item ativo do catálogo ocupa uma posição (bit). Para cada tag dietética e
+para cada token do nome há um inteiro usado como bitset com os bits dos itens
+que a têm, então filtros viram AND/OR de inteiros. Os nomes são normalizados sem
+acento e em minúsculas ("Purê" -> "pure"); a busca casa prefixos ("feij" acha
+"Feijão") via bisect na lista ordenada de tokens.
+
+Mantido pelas rotas de escrita do catálogo, como o IndiceCardapio do pricing.py,
+e recarregado por inteiro a cada INDICE_RECARGA_SEGUNDOS para pegar escritas de
+outros workers.
+"""
+import asyncio
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pricing import INDICE_RECARGA_SEGUNDOS
+
+COLECOES_BUSCA = ("produtos", "componentes")
+_SEPARADOR = re.compile(r"[^a-z0-9]+")
+
+
+def normalizar(texto: str) -> str:
+    # Remove acentos (NFKD separa a letra do acento) e passa para minúsculas
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def tokens(texto: str) -> List[str]:
+    return [t for t in _SEPARADOR.split(normalizar(texto)) if t]
+
+
+def normalizar_tag(tag: str) -> str:
+    return normalizar(tag).strip().upper()
+
+
+def _valor(campo):
+    return getattr(campo, "value", campo)
+
+
+def _bits(bitset: int) -> Iterable[int]:
+    while bitset:
+        menor = bitset & -bitset
+        yield menor.bit_length() - 1
+        bitset ^= menor
+
+
+class IndiceBusca:
+    def __init__(self):
+        self.itens: List[Optional[dict]] = []
+        self.livres: List[int] = []
+        self.posicao: Dict[Tuple[str, str], int] = {}
+        self.por_tag: Dict[str, int] = {}
+        self.por_token: Dict[str, int] = {}
+        self.tokens_ordenados: List[str] = []
+        self.por_colecao: Dict[str, int] = {colecao: 0 for colecao in COLECOES_BUSCA}
+        self.carregado_em = 0.0
+        self._lock = asyncio.Lock()
+
+    # --- Manutenção ---
+
+    @staticmethod
+    def _entrada(colecao: str, doc: dict) -> dict:
+        entrada = {
+            "colecao": colecao,
+            "_id": str(doc["_id"]),
+            "nome": doc["nome"],
+            "tipo": _valor(doc.get("tipo")),
+            "tags_dieteticas": doc.get("tags_dieteticas", []),
+        }
+        if colecao == "produtos":
+            entrada["categoria"] = _valor(doc.get("categoria"))
+            entrada["preco_centavos"] = doc.get("preco_centavos", 0)
+        else:
+            entrada["preco_centavos"] = doc.get("preco_adicional_centavos", 0)
+        return entrada
+
+    def _marcar(self, indice: Dict[str, int], chave: str, bit: int) -> bool:
+        antes = indice.get(chave, 0)
+        indice[chave] = antes | bit
+        return antes == 0
+
+    def _desmarcar(self, indice: Dict[str, int], chave: str, bit: int) -> bool:
+        restante = indice.get(chave, 0) & ~bit
+        if restante:
+            indice[chave] = restante
+            return False
+        indice.pop(chave, None)
+        return True
+
+    def atualizar(self, colecao: str, doc: dict) -> None:
+        self.remover(colecao, str(doc["_id"]))
+        if not doc.get("ativo", True):
+            return
+        entrada = self._entrada(colecao, doc)
+        posicao = self.livres.pop() if self.livres else len(self.itens)
+        if posicao == len(self.itens):
+            self.itens.append(None)
+        bit = 1 << posicao
+        entrada["_tokens"] = set(tokens(entrada["nome"]))
+        entrada["_tags"] = {normalizar_tag(t) for t in entrada["tags_dieteticas"]}
+        entrada["_ordem"] = (colecao, normalizar(entrada["nome"]))
+        self.itens[posicao] = entrada
+        self.posicao[(colecao, entrada["_id"])] = posicao
+        self.por_colecao[colecao] |= bit
+        for tag in entrada["_tags"]:
+            self._marcar(self.por_tag, tag, bit)
+        for token in entrada["_tokens"]:
+            if self._marcar(self.por_token, token, bit):
+                insort(self.tokens_ordenados, token)
+
+    def remover(self, colecao: str, id: str) -> None:
+        posicao = self.posicao.pop((colecao, id), None)
+        if posicao is None:
+            return
+        entrada, bit = self.itens[posicao], 1 << posicao
+        self.por_colecao[colecao] &= ~bit
+        for tag in entrada["_tags"]:
+            self._desmarcar(self.por_tag, tag, bit)
+        for token in entrada["_tokens"]:
+            if self._desmarcar(self.por_token, token, bit):
+                del self.tokens_ordenados[bisect_left(self.tokens_ordenados, token)]
+        self.itens[posicao] = None
+        self.livres.append(posicao)
+
+    async def carregar(self, produtos_collection, componentes_collection) -> None:
+        novo = IndiceBusca()
+        async for doc in produtos_collection.find({"ativo": True}):
+            novo.atualizar("produtos", doc)
+        async for doc in componentes_collection.find({"ativo": True}):
+            novo.atualizar("componentes", doc)
+        for campo in ("itens", "livres", "posicao", "por_tag", "por_token", "tokens_ordenados", "por_colecao"):
+            setattr(self, campo, getattr(novo, campo))
+        self.carregado_em = time.monotonic()
+
+    async def garantir_atualizado(self, produtos_collection, componentes_collection) -> None:
+        if time.monotonic() - self.carregado_em < INDICE_RECARGA_SEGUNDOS:
+            return
+        async with self._lock:
+            if time.monotonic() - self.carregado_em >= INDICE_RECARGA_SEGUNDOS:
+                await self.carregar(produtos_collection, componentes_collection)
+
+    # --- Consulta ---
+
+    def _prefixo(self, prefixo: str) -> int:
+        # Tokens com o prefixo ficam contíguos na lista ordenada
+        ordenados, bitset = self.tokens_ordenados, 0
+        i = bisect_left(ordenados, prefixo)
+        while i < len(ordenados) and ordenados[i].startswith(prefixo):
+            bitset |= self.por_token[ordenados[i]]
+            i += 1
+        return bitset
+
+    def buscar(
+        self,
+        texto: str = "",
+        tags: Iterable[str] = (),
+        todas_as_tags: bool = True,
+        colecao: Optional[str] = None,
+        limite: int = 50,
+    ) -> Tuple[int, List[dict]]:
+        """Devolve (total, itens): todas as palavras do texto (como prefixo) e as tags (AND ou OR)."""
+        todos = self.por_colecao[colecao] if colecao else 0
+        if not colecao:
+            for bitset in self.por_colecao.values():
+                todos |= bitset
+        resultado = todos
+
+        for token in tokens(texto):
+            resultado &= self._prefixo(token)
+            if not resultado:
+                break
+
+        tags = [normalizar_tag(t) for t in tags if t.strip()]
+        if tags and resultado:
+            if todas_as_tags:
+                for tag in tags:
+                    resultado &= self.por_tag.get(tag, 0)
+            else:
+                qualquer = 0
+                for tag in tags:
+                    qualquer |= self.por_tag.get(tag, 0)
+                resultado &= qualquer
+
+        encontrados = [self.itens[p] for p in _bits(resultado)]
+        encontrados.sort(key=lambda e: e["_ordem"])
+        publicos = [{k: v for k, v in e.items() if not k.startswith("_") or k == "_id"} for e in encontrados[:limite]]
+        return len(encontrados), publicos
+
+    def tags(self) -> Dict[str, int]:
+        return {tag: bin(bitset).count("1") for tag, bitset in sorted(self.por_tag.items())}
+
+
+indice_busca = IndiceBusca()
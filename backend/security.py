@@ -1,9 +1,71 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Custo do bcrypt: cada +1 dobra o tempo de CPU por login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# O bcrypt libera o GIL, então threads dão paralelismo real até o número de núcleos
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 2)))
+# Máximo de hashes aguardando/executando antes de recusar com 503
+HASH_FILA_MAX = int(os.getenv("HASH_FILA_MAX", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_pendentes = 0
+_metricas = {
+    "executados": 0,
+    "recusados": 0,
+    "espera_total_segundos": 0.0,
+    "espera_max_segundos": 0.0,
+}
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+def _medir_espera(enfileirado_em: float, fn, *args):
+    espera = time.perf_counter() - enfileirado_em
+    _metricas["espera_total_segundos"] += espera
+    if espera > _metricas["espera_max_segundos"]:
+        _metricas["espera_max_segundos"] = espera
+    return fn(*args)
+
+async def _executar_no_pool(fn, *args):
+    global _pendentes
+    if _pendentes >= HASH_FILA_MAX:
+        _metricas["recusados"] += 1
+        raise HTTPException(status_code=503, detail="Servidor ocupado, tente novamente")
+    _pendentes += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, _medir_espera, time.perf_counter(), fn, *args)
+    finally:
+        _pendentes -= 1
+        _metricas["executados"] += 1
+
+async def gerar_hash_senha(password: str) -> str:
+    return await _executar_no_pool(get_password_hash, password)
+
+async def verificar_senha(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # Retorna (senha_ok, novo_hash); novo_hash vem preenchido quando o passlib
+    # considera o hash antigo desatualizado (ex.: BCRYPT_ROUNDS mudou)
+    return await _executar_no_pool(pwd_context.verify_and_update, plain_password, hashed_password)
+
+def metricas_hash() -> dict:
+    executados = _metricas["executados"]
+    return {
+        **_metricas,
+        "pendentes": _pendentes,
+        "espera_media_segundos": _metricas["espera_total_segundos"] / executados if executados else 0.0,
+        "workers": HASH_WORKERS,
+        "fila_max": HASH_FILA_MAX,
+        "rounds": BCRYPT_ROUNDS,
+    }
@@ -0,0 +1,61 @@
+import asyncio
+import os
+
+from pymongo import ReturnDocument
+
+# Quantos números cada worker reserva por ida ao banco
+SEQUENCIA_BLOCO = int(os.getenv("SEQUENCIA_BLOCO", "50"))
+# Menor codigo_pedido emitido pelo alocador (o seed usa 1001/1002)
+SEQUENCIA_INICIO = int(os.getenv("SEQUENCIA_INICIO", "10000"))
+
+
+class AlocadorSequencia:
+    """Gera números únicos a partir de um documento em `counters`.
+
+    O campo `valor` guarda o último número já reservado por algum worker. Cada `$inc`
+    atômico reserva o bloco (valor - bloco, valor] só para este processo, e os próximos
+    `proximo()` saem da memória até o bloco acabar. Números de um bloco não usado
+    (restart do worker) são descartados: a sequência pode ter buracos, nunca repetições.
+    """
+
+    def __init__(self, counters_collection, nome: str, bloco: int = SEQUENCIA_BLOCO):
+        self.collection = counters_collection
+        self.nome = nome
+        self.bloco = bloco
+        self.reservas = 0
+        self._proximo = 0
+        self._fim = -1
+        self._lock = asyncio.Lock()
+
+    async def garantir_minimo(self, ultimo_usado: int) -> None:
+        # Garante que o contador nunca emita algo <= ultimo_usado (dados antigos, seed, etc.)
+        await self.collection.update_one(
+            {"_id": self.nome}, {"$max": {"valor": ultimo_usado}}, upsert=True
+        )
+
+    async def _reservar_bloco(self) -> None:
+        doc = await self.collection.find_one_and_update(
+            {"_id": self.nome},
+            {"$inc": {"valor": self.bloco}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._fim = doc["valor"]
+        self._proximo = self._fim - self.bloco + 1
+        self.reservas += 1
+
+    async def proximo(self) -> int:
+        # Caminho rápido sem lock: entre o teste e o incremento não há await
+        if self._proximo > self._fim:
+            async with self._lock:
+                if self._proximo > self._fim:
+                    await self._reservar_bloco()
+        valor = self._proximo
+        self._proximo += 1
+        return valor
+
+
+async def preparar_alocador(alocador: AlocadorSequencia, collection, campo: str, inicio: int = SEQUENCIA_INICIO) -> None:
+    ultimo = await collection.find_one({}, {campo: 1}, sort=[(campo, -1)])
+    maior = ultimo[campo] if ultimo and isinstance(ultimo.get(campo), int) else 0
+    await alocador.garantir_minimo(max(inicio - 1, maior))
@@ -0,0 +1,85 @@
+"""Caminho rápido de serialização: documento do Motor -> bytes JSON.
+
+Pelo caminho normal, cada item devolvido com response_model passa por validação
+do Pydantic, serialização para tipos JSON e só então pelo json da stdlib. Para
+documentos que a própria API gravou a validação é redundante. Com
+SERIALIZACAO_RAPIDA=1 as listagens e detalhes que recebem um `SerializadorRapido`
+montam a resposta direto: só os campos do modelo (com os defaults dos que
+faltarem), ObjectId como str e datetime em ISO 8601, igual ao Pydantic.
+
+O response_model continua declarado nas rotas, então o schema do OpenAPI não muda.
+Com orjson instalado ele é usado; sem ele, cai no json da stdlib.
+"""
+import json
+import os
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, List, Tuple, Type
+
+from bson import ObjectId
+from fastapi.responses import Response
+from pydantic import BaseModel
+from pydantic.fields import FieldInfo
+
+try:
+    import orjson
+except ImportError:  # opcional: pip install orjson
+    orjson = None
+
+SERIALIZACAO_RAPIDA = os.getenv("SERIALIZACAO_RAPIDA", "0") == "1"
+
+
+def _padrao(valor: Any) -> Any:
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, Enum):
+        return valor.value
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável em JSON: {type(valor).__name__}")
+
+
+if orjson is not None:
+    # OPT_UTC_Z: datetime em UTC sai com "Z", como no Pydantic
+    _OPCOES_ORJSON = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def dumps(conteudo: Any) -> bytes:
+        return orjson.dumps(conteudo, default=_padrao, option=_OPCOES_ORJSON)
+else:
+    def dumps(conteudo: Any) -> bytes:
+        return json.dumps(conteudo, default=_padrao, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class SerializadorRapido:
+    """Recorta o documento nos campos do modelo, na ordem do modelo, sem validar."""
+
+    def __init__(self, modelo: Type[BaseModel]):
+        self.modelo = modelo
+        self.campos: List[Tuple[str, FieldInfo]] = [
+            (campo.alias or nome, campo) for nome, campo in modelo.model_fields.items()
+        ]
+        self.chaves = {chave for chave, _ in self.campos}
+
+    def projecao(self) -> Dict[str, int]:
+        # Projeção do MongoDB com só os campos do modelo
+        return {chave: 1 for chave in self.chaves}
+
+    def documento(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        saida = {}
+        for chave, campo in self.campos:
+            if chave in doc:
+                saida[chave] = doc[chave]
+            elif not campo.is_required():
+                saida[chave] = campo.get_default(call_default_factory=True)
+        return saida
+
+    def lista(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        documento = self.documento
+        return [documento(doc) for doc in docs]
+
+
+class RespostaRapida(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
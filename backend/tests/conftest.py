@@ -0,0 +1,23 @@
+import os
+import sys
+
+# Os módulos do backend são planos (import db, import pricing...): a pasta backend entra no path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+try:
+    import mongomock.collection as _mongomock_collection
+except ImportError:
+    _mongomock_collection = None
+
+if _mongomock_collection is not None:
+    # pymongo >= 4.9 passa `sort` para as operações de bulk_write; o mongomock ainda não aceita
+    for _nome in ("add_update", "add_replace", "add_delete", "add_insert"):
+        _original = getattr(_mongomock_collection.BulkOperationBuilder, _nome, None)
+        if _original is None:
+            continue
+
+        def _sem_sort(self, *args, _original=_original, **kwargs):
+            kwargs.pop("sort", None)
+            return _original(self, *args, **kwargs)
+
+        setattr(_mongomock_collection.BulkOperationBuilder, _nome, _sem_sort)
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import catalogo_io
+
+
+def _rodar(coro):
+    return asyncio.run(coro)
+
+
+async def _em_pedacos(dados: bytes, tamanho: int = 7):
+    # Pedaços pequenos: linhas e caracteres multibyte cortados no meio
+    for inicio in range(0, len(dados), tamanho):
+        yield dados[inicio:inicio + tamanho]
+
+
+async def _exportar(collection, colecao: str, formato: str) -> bytes:
+    return b"".join([parte async for parte in catalogo_io.exportar(collection, colecao, formato)])
+
+
+def _sem_id(docs):
+    return sorted(({k: v for k, v in d.items() if k != "_id"} for d in docs), key=lambda d: d["nome"])
+
+
+PRODUTOS = [
+    {
+        "nome": "Marmita Média (500g)",
+        "descricao": 'Escolha 1 proteína e 2 guarnições.\nSaladas em pote "separado", sem custo.',
+        "preco_centavos": 2600,
+        "imagem_url": "https://placehold.co/600x400",
+        "categoria": "MARMITAS",
+        "ativo": True,
+        "tipo": "COMPOSTO",
+        "regras_composicao": {"max_base": 2, "max_proteina": 1, "max_guarnicao": 2},
+        "tags_dieteticas": ["SEM_GLUTEN", "SEM_LEITE"],
+    },
+    {
+        "nome": "Coca-Cola Original (Lata 350ml)",
+        "descricao": "Refrigerante.",
+        "preco_centavos": 600,
+        "imagem_url": "https://placehold.co/600x400",
+        "categoria": "BEBIDAS",
+        "ativo": False,
+        "tipo": "SIMPLES",
+        "regras_composicao": None,
+        "tags_dieteticas": [],
+    },
+]
+
+
+@pytest.mark.parametrize("formato", ["csv", "ndjson"])
+def test_exportacao_reimporta_igual(formato):
+    async def cenario():
+        banco = mongomock_motor.AsyncMongoMockClient()["teste"]
+        await banco.origem.insert_many([dict(p) for p in PRODUTOS])
+        dados = await _exportar(banco.origem, "produtos", formato)
+        relatorio = await catalogo_io.importar(_em_pedacos(dados), banco.destino, "produtos", formato)
+        return relatorio, [d async for d in banco.destino.find({})]
+
+    relatorio, importados = _rodar(cenario())
+    assert relatorio["total_erros"] == 0, relatorio["erros"]
+    assert relatorio["inseridos"] == len(PRODUTOS)
+    assert _sem_id(importados) == _sem_id(PRODUTOS)
+
+
+def test_linha_fora_de_utf8_vira_erro_da_linha():
+    cabecalho = "nome,descricao,preco_centavos,imagem_url,categoria,ativo,tipo\n"
+    dados = (
+        cabecalho.encode()
+        + "Pão de Queijo,Assado,800,u,SALGADOS,true,SIMPLES\n".encode("cp1252")
+        + "Coxinha,\"Massa de\nmandioca\",950,u,SALGADOS,true,SIMPLES\n".encode()
+    )
+
+    async def cenario():
+        banco = mongomock_motor.AsyncMongoMockClient()["teste"]
+        relatorio = await catalogo_io.importar(_em_pedacos(dados), banco.produtos, "produtos", "csv")
+        return relatorio, [d async for d in banco.produtos.find({})]
+
+    relatorio, importados = _rodar(cenario())
+    assert relatorio["linhas"] == 2
+    assert [e["linha"] for e in relatorio["erros"]] == [2]
+    assert [d["descricao"] for d in importados] == ["Massa de\nmandioca"]
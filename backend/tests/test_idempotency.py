@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from idempotency import EM_ANDAMENTO, ChavesIdempotencia
+
+
+class _FalhaNoUpdate:
+    """Coleção que falha ao concluir a chave, depois do efeito já gravado."""
+
+    def __init__(self, colecao):
+        self._colecao = colecao
+
+    def __getattr__(self, nome):
+        return getattr(self._colecao, nome)
+
+    async def update_one(self, *args, **kwargs):
+        raise RuntimeError("primário indisponível")
+
+
+def test_falha_ao_concluir_nao_libera_a_chave():
+    async def cenario():
+        colecao = mongomock_motor.AsyncMongoMockClient()["teste"]["idempotencia"]
+        chaves = ChavesIdempotencia()
+        pedidos = []
+
+        async def executar(concluir):
+            pedidos.append(len(pedidos) + 1)
+            corpo = json.dumps({"codigo_pedido": pedidos[-1]}).encode()
+            await concluir(corpo)
+            return corpo
+
+        with pytest.raises(RuntimeError):
+            await chaves.responder(_FalhaNoUpdate(colecao), "k1", b"{}", 201, executar)
+        reserva = await colecao.find_one({"_id": "k1"})
+
+        repetida = await chaves.responder(colecao, "k1", b"{}", 201, executar)
+        return pedidos, reserva, repetida
+
+    pedidos, reserva, repetida = asyncio.run(cenario())
+
+    assert pedidos == [1]
+    assert reserva is not None and reserva["estado"] == EM_ANDAMENTO
+    assert repetida.headers["Idempotent-Replayed"] == "true"
+    assert json.loads(repetida.body) == {"codigo_pedido": 1}
+
+
+def test_falha_antes_de_gravar_libera_a_chave():
+    async def cenario():
+        colecao = mongomock_motor.AsyncMongoMockClient()["teste"]["idempotencia"]
+        chaves = ChavesIdempotencia()
+
+        async def falha(concluir):
+            raise ValueError("estoque")
+
+        with pytest.raises(ValueError):
+            await chaves.responder(colecao, "k2", b"{}", 201, falha)
+        return await colecao.find_one({"_id": "k2"})
+
+    assert asyncio.run(cenario()) is None
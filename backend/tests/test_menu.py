@@ -0,0 +1,61 @@
+from bson import ObjectId
+
+import menu
+from pricing import IndiceCardapio
+
+
+def _componente(nome, tipo, **extra):
+    return {"_id": ObjectId(), "nome": nome, "tipo": tipo, "ativo": True, "preco_adicional_centavos": 0, **extra}
+
+
+COMPONENTES = [
+    _componente("Arroz", "BASE"),
+    _componente("Feijão", "BASE"),
+    _componente("Frango Grelhado", "PROTEINA"),
+    _componente("Farofa", "GUARNICAO"),
+    _componente("Purê", "GUARNICAO"),
+    _componente("Salada Verde", "GUARNICAO", embalagem_separada=True),
+]
+
+MARMITA = {
+    "_id": ObjectId(),
+    "nome": "Marmita Média (500g)",
+    "tipo": "COMPOSTO",
+    "categoria": "MARMITA",
+    "preco_centavos": 2000,
+    "ativo": True,
+    # Sem max_base: BASE não tem limite
+    "regras_composicao": {"max_proteina": 1, "max_guarnicao": 0},
+}
+
+
+def _indice():
+    indice = IndiceCardapio()
+    indice.atualizar_produto(MARMITA)
+    for doc in COMPONENTES:
+        indice.atualizar_componente(doc)
+    return indice
+
+
+def _aceito(indice, selecoes):
+    erros = []
+    indice.precificar_item({"nome_produto": MARMITA["nome"], "quantidade": 1, "selecoes": selecoes}, 0, erros)
+    return not erros
+
+
+def test_cardapio_e_pricing_concordam_com_chave_ausente():
+    cardapio = menu.compor([MARMITA], COMPONENTES)
+    produto = cardapio["categorias"][0]["produtos"][0]
+    indice = _indice()
+
+    for tipo in ("BASE", "PROTEINA", "GUARNICAO"):
+        mostrados = produto["componentes"].get(tipo)
+        nomes = [c["nome"] for c in COMPONENTES if c["tipo"] == tipo and not c.get("embalagem_separada")]
+        # O tipo aparece no cardápio se e só se o pricing aceita ao menos um componente dele
+        assert bool(mostrados) == _aceito(indice, nomes[:1])
+        if mostrados:
+            assert {c["nome"] for c in mostrados} == set(nomes)
+
+    assert "BASE" in produto["componentes"]
+    assert "GUARNICAO" not in produto["componentes"]
+    assert _aceito(indice, ["Arroz", "Arroz", "Feijão"])
@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from fastapi import Response
+
+from models import Usuario
+from pagination import ASC, listar
+from serialization import SerializadorRapido
+
+USUARIO = {
+    "nome": "Ana",
+    "email": "ana@example.com",
+    "senha_hash": "$2b$12$hash",
+    "role": "ADMIN",
+    "telefone": "11999990000",
+    "lote_status": "interno",
+}
+
+
+async def _linhas(resposta) -> list:
+    corpo = b"".join([parte async for parte in resposta.body_iterator])
+    return [json.loads(linha) for linha in corpo.splitlines()]
+
+
+def _listar(**kwargs):
+    async def cenario():
+        colecao = mongomock_motor.AsyncMongoMockClient()["teste"]["usuarios"]
+        await colecao.insert_one(dict(USUARIO))
+        resposta = await listar(Response(), colecao, {}, "_id", ASC, serializador=SerializadorRapido(Usuario), **kwargs)
+        return await _linhas(resposta)
+
+    return asyncio.run(cenario())
+
+
+def test_stream_sai_nos_campos_do_modelo():
+    (linha,) = _listar(stream=True)
+    assert set(linha) == {"_id", "nome", "email", "role", "telefone"}
+
+
+def test_fields_fora_do_modelo_sao_ignorados():
+    (linha,) = _listar(stream=True, fields="nome,senha_hash,lote_status")
+    assert set(linha) == {"_id", "nome"}
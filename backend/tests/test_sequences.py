@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from sequences import AlocadorSequencia, preparar_alocador
+
+
+def _rodar(coro):
+    return asyncio.run(coro)
+
+
+async def _alocar(alocador: AlocadorSequencia, vezes: int):
+    valores = []
+    for _ in range(vezes):
+        valores.append(await alocador.proximo())
+        # Cede o loop para intercalar os workers também dentro de um bloco
+        await asyncio.sleep(0)
+    return valores
+
+
+def test_alocadores_concorrentes_nao_repetem_codigos():
+    async def cenario():
+        db = mongomock_motor.AsyncMongoMockClient()["teste"]
+        pedidos = db.pedidos
+        await pedidos.insert_many([{"codigo_pedido": 1001}, {"codigo_pedido": 1002}])
+
+        # Um alocador por "worker", todos sobre o mesmo documento de counters
+        alocadores = [AlocadorSequencia(db.counters, "codigo_pedido", bloco=7) for _ in range(8)]
+        await preparar_alocador(alocadores[0], pedidos, "codigo_pedido", inicio=10000)
+
+        # Várias tarefas por alocador disputam o lock de reserva do mesmo worker
+        tarefas = [_alocar(alocador, 40) for alocador in alocadores for _ in range(3)]
+        resultados = await asyncio.gather(*tarefas)
+        return alocadores, [valor for lista in resultados for valor in lista]
+
+    alocadores, valores = _rodar(cenario())
+
+    assert len(valores) == 8 * 3 * 40
+    assert len(set(valores)) == len(valores)
+    assert min(valores) >= 10000
+    # Cada worker só vai ao banco quando o bloco acaba
+    assert all(a.reservas <= -(-3 * 40 // 7) + 1 for a in alocadores)
+
+
+def test_garantir_minimo_respeita_codigos_existentes():
+    async def cenario():
+        db = mongomock_motor.AsyncMongoMockClient()["teste"]
+        await db.pedidos.insert_one({"codigo_pedido": 25000})
+        alocador = AlocadorSequencia(db.counters, "codigo_pedido", bloco=5)
+        await preparar_alocador(alocador, db.pedidos, "codigo_pedido", inicio=10000)
+        return [await alocador.proximo() for _ in range(12)]
+
+    assert _rodar(cenario()) == list(range(25001, 25013))
@@ -1,9 +1,14 @@
 import os
 import sys
+import argparse
 import certifi
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, UpdateOne
 from dotenv import load_dotenv
-from datetime import datetime
+import random
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, date, timedelta
 
 # --- 1. CONFIGURAÇÃO DE AMBIENTE E SEGURANÇA ---
 # Garante que o script encontre o .env na pasta database/ (um nível acima)
@@ -11,17 +16,50 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 env_path = os.path.join(current_dir, '..', '.env')
 load_dotenv(env_path)
 
-MONGO_URI = os.getenv("MONGODB_URI")
+# Caminho de upsert em lote compartilhado com a importação do backend
+sys.path.insert(0, os.path.join(current_dir, '..', '..', 'backend'))
+from bulk import operacao_upsert, em_lotes
+
+parser = argparse.ArgumentParser(description="Popula o banco 'cardapio' com o cardápio base.")
+parser.add_argument(
+    "--upsert",
+    action="store_true",
+    help="Não apaga nada: atualiza/insere produtos e componentes pela chave natural "
+         "e só cria admin e pedidos de exemplo que ainda não existem.",
+)
+# Gerador de massa de pedidos (ver seção 7)
+parser.add_argument("--pedidos", type=int, default=0,
+                    help="Depois do cardápio, gera N pedidos sintéticos (ex.: 2000000).")
+parser.add_argument("--semente", type=int, default=42,
+                    help="Semente do gerador: mesma semente e parâmetros geram os mesmos pedidos.")
+parser.add_argument("--dias", type=int, default=365, help="Período dos pedidos: os N dias antes de --ate.")
+parser.add_argument("--ate", type=date.fromisoformat, default=date.today(),
+                    help="Dia (AAAA-MM-DD) em que o período termina, exclusivo. Padrão: hoje.")
+parser.add_argument("--clientes", type=int, default=0,
+                    help="Tamanho da base de clientes. Padrão: 1 cliente para cada 20 pedidos.")
+parser.add_argument("--lote", type=int, default=5000, help="Pedidos por insert_many.")
+parser.add_argument("--workers", type=int, default=4, help="Lotes gravados em paralelo.")
+parser.add_argument("--uri", help="Usa esta URI em vez do MONGODB_URI do .env, sem TLS "
+                                  "(ex.: mongodb://localhost:27017 para um mongod local).")
+parser.add_argument("--db", default="cardapio", help="Nome do banco.")
+args = parser.parse_args()
+
+MONGO_URI = args.uri or os.getenv("MONGODB_URI")
 
 if not MONGO_URI:
     print("ERRO CRÍTICO: Variável 'MONGODB_URI' não encontrada no .env")
     sys.exit(1)
 
 try:
-    print("Conectando ao MongoDB Atlas (Secure SSL)...")
-    # Certifi garante conexão segura em qualquer Windows/Mac/Linux
-    client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-    db = client['cardapio']
+    if args.uri:
+        # mongod local (carga de teste): a URI vem como está, TLS só se ela pedir
+        print(f"Conectando a {args.uri}...")
+        client = MongoClient(args.uri, maxPoolSize=max(args.workers, 1) + 2)
+    else:
+        print("Conectando ao MongoDB Atlas (Secure SSL)...")
+        # Certifi garante conexão segura em qualquer Windows/Mac/Linux
+        client = MongoClient(MONGO_URI, tlsCAFile=certifi.where(), maxPoolSize=max(args.workers, 1) + 2)
+    db = client[args.db]
     client.admin.command('ping')
     print("Conexão OK! Iniciando Seed...")
 except Exception as e:
@@ -29,11 +67,26 @@ except Exception as e:
     sys.exit(1)
 
 # --- 2. LIMPEZA TOTAL (Reset para evitar duplicidade) ---
-print("Limpando banco de dados antigo...")
-db.produtos.delete_many({})
-db.componentes.delete_many({})
-db.usuarios.delete_many({})
-db.pedidos.delete_many({}) 
+# No modo --upsert nada é apagado: rodar o seed de novo é idempotente
+if not args.upsert:
+    print("Limpando banco de dados antigo...")
+    db.produtos.delete_many({})
+    db.componentes.delete_many({})
+    db.usuarios.delete_many({})
+    db.pedidos.delete_many({}) 
+    # Quadro da cozinha é derivado dos pedidos: a API o monta de novo na próxima subida
+    db.producao.delete_many({})
+
+def gravar_catalogo(colecao, docs):
+    if not args.upsert:
+        db[colecao].insert_many(docs)
+        return
+    inseridos = atualizados = 0
+    for lote in em_lotes(operacao_upsert(colecao, doc) for doc in docs):
+        res = db[colecao].bulk_write(lote, ordered=False)
+        inseridos += res.upserted_count
+        atualizados += res.modified_count
+    print(f"   {colecao}: {inseridos} inseridos, {atualizados} atualizados")
 
 # --- 3. SEED: PRODUTOS (O que o cliente compra) ---
 print("Inserindo Produtos (Cardápio Completo)...")
@@ -153,7 +206,7 @@ produtos = [
         "tags_dieteticas": ["SEM_GLUTEN", "SEM_LEITE", "VEGANO"]
     }
 ]
-result_prod = db.produtos.insert_many(produtos)
+gravar_catalogo("produtos", produtos)
 
 # --- 4. SEED: COMPONENTES (Ingredientes) ---
 print("Inserindo Componentes (Bases, Carnes, Guarnições, Saladas)...")
@@ -188,7 +241,7 @@ componentes = [
     {"nome": "Mix de Folhas (Alface/Rúcula)", "tipo": "GUARNICAO", "embalagem_separada": True, "ativo": True, "preco_adicional_centavos": 0, "tags_dieteticas": ["SEM_GLUTEN", "SEM_LEITE", "VEGANO"]},
     {"nome": "Beterraba Ralada Crua", "tipo": "GUARNICAO", "embalagem_separada": True, "ativo": True, "preco_adicional_centavos": 0, "tags_dieteticas": ["SEM_GLUTEN", "SEM_LEITE", "VEGANO"]}
 ]
-db.componentes.insert_many(componentes)
+gravar_catalogo("componentes", componentes)
 
 # --- 5. ADMIN ---
 print("Criando Admin...")
@@ -199,7 +252,11 @@ admin_user = {
     "role": "ADMIN",
     "telefone": "16999999999"
 }
-db.usuarios.insert_one(admin_user)
+if args.upsert:
+    # $setOnInsert: não sobrescreve a senha de um admin que já existe
+    db.usuarios.update_one({"email": admin_user["email"]}, {"$setOnInsert": admin_user}, upsert=True)
+else:
+    db.usuarios.insert_one(admin_user)
 
 # --- 6. PEDIDOS EXEMPLO (Para validar a lógica de Entrega) ---
 print("Criando Pedidos de Exemplo (Delivery vs Retirada)...")
@@ -237,7 +294,231 @@ pedidos_exemplo = [
         ]
     }
 ]
-db.pedidos.insert_many(pedidos_exemplo)
+if args.upsert:
+    db.pedidos.bulk_write(
+        [UpdateOne({"codigo_pedido": p["codigo_pedido"]}, {"$setOnInsert": p}, upsert=True) for p in pedidos_exemplo],
+        ordered=False,
+    )
+else:
+    db.pedidos.insert_many(pedidos_exemplo)
+
+# --- 7. PEDIDOS SINTÉTICOS (massa para teste de carga: --pedidos N) ---
+# Pedidos que o backend aceitaria: marmitas dentro das regras_composicao (salada em
+# pote separado não conta no limite, como em pricing.py), preço do item = produto +
+# adicionais, taxa da tabela de bairros. O movimento segue a loja: pico no almoço,
+# um segundo menor no jantar, fim de semana mais fraco, clientes que voltam.
+#
+# Cada lote sai de um random.Random(f"{semente}:{lote}") próprio: a mesma semente e
+# os mesmos parâmetros geram os mesmos pedidos, qualquer que seja --workers. As datas
+# são amostradas em estratos sobre o período inteiro (o pedido i cai na fatia i/N da
+# distribuição), então codigo_pedido cresce junto com data_criacao.
+#
+#   python seed.py --upsert --pedidos 2000000 --uri mongodb://localhost:27017
+#
+# Os códigos são reservados no contador counters/"codigo_pedido", o mesmo da API:
+# dá para gerar com a API no ar. Pedidos mais velhos que ARQUIVO_IDADE_DIAS vão para
+# o arquivo mensal na próxima rodada do arquivamento automático; os consolidados de
+# vendas se refazem com `python rollups.py rebuild` (na pasta backend).
+
+# Peso de cada hora de funcionamento; as faixas de 15 minutos herdam o peso da hora
+PESO_POR_HORA = {10: 2, 11: 14, 12: 30, 13: 16, 14: 5, 15: 2, 16: 1, 17: 2, 18: 6, 19: 8, 20: 4}
+PESO_POR_DIA_SEMANA = (1.0, 1.0, 1.0, 1.0, 1.1, 0.7, 0.4)  # segunda a domingo
+FAIXA = timedelta(minutes=15)
+
+MODALIDADES, PESO_MODALIDADES = ("DELIVERY", "RETIRADA", "BALCAO"), (55, 35, 10)
+PAGAMENTOS, PESO_PAGAMENTOS = ("PIX", "CREDITO", "DEBITO"), (50, 30, 20)
+QTD_MARMITAS, PESO_QTD_MARMITAS = (0, 1, 2, 3), (8, 60, 24, 8)
+QTD_EXTRAS, PESO_QTD_EXTRAS = (0, 1, 2), (55, 35, 10)
+
+# Usados quando a coleção `bairros` está vazia (todos pagam a taxa padrão)
+BAIRROS_SINTETICOS = [
+    "Centro", "Jardim Paulista", "Vila Tibério", "Campos Elíseos", "Ribeirânia", "Jardim Irajá",
+    "Jardim Sumaré", "Alto da Boa Vista", "Iguatemi", "Jardim Botânico", "Vila Seixas", "Lagoinha",
+]
+LOGRADOUROS = [
+    "Rua das Flores", "Av. Nove de Julho", "Rua Amador Bueno", "Rua Cerqueira César", "Av. Independência",
+    "Rua São Sebastião", "Rua Tibiriçá", "Av. Presidente Vargas", "Rua Garibaldi", "Rua Lafaiete",
+]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Eduarda", "Felipe", "Gabriela", "Henrique", "Isabela", "João",
+         "Juliana", "Lucas", "Mariana", "Nicolas", "Patrícia", "Rafael", "Sofia", "Thiago", "Vitória", "Wagner"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Carvalho", "Ferreira", "Rodrigues",
+              "Almeida", "Costa", "Gomes", "Martins", "Araújo", "Barbosa", "Ribeiro"]
+
+
+def faixas_de_horario(ate, dias):
+    """Início de cada faixa de 15 min do período e o peso acumulado até ela."""
+    inicios, acumulado, total = [], [], 0.0
+    primeiro_dia = datetime.combine(ate - timedelta(days=dias), datetime.min.time())
+    for d in range(dias):
+        dia = primeiro_dia + timedelta(days=d)
+        peso_dia = PESO_POR_DIA_SEMANA[dia.weekday()]
+        for hora, peso in PESO_POR_HORA.items():
+            for quarto in range(4):
+                total += peso_dia * peso
+                inicios.append(dia + timedelta(hours=hora, minutes=15 * quarto))
+                acumulado.append(total)
+    return inicios, acumulado
+
+
+def gerar_cpf(rng):
+    digitos = [rng.randrange(10) for _ in range(9)]
+    for tamanho in (9, 10):
+        soma = sum(d * (tamanho + 1 - i) for i, d in enumerate(digitos))
+        digitos.append(soma * 10 % 11 % 10)
+    return "".join(map(str, digitos))
+
+
+def gerar_clientes(semente, quantidade, bairros):
+    rng = random.Random(f"{semente}:clientes")
+    clientes = []
+    for k in range(quantidade):
+        clientes.append({
+            "nome": f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}",
+            # 48271 é primo com 10^8: telefones distintos para até 100 milhões de clientes
+            "telefone": f"169{(k * 48271 + 12345678) % 100_000_000:08d}",
+            "cpf_nota": gerar_cpf(rng) if rng.random() < 0.25 else None,
+            "entrega": {"logradouro": rng.choice(LOGRADOUROS), "numero": str(rng.randint(1, 2999)),
+                        "bairro": rng.choice(bairros)},
+        })
+    return clientes
+
+
+class GeradorPedidos:
+    def __init__(self, total, semente, primeiro_codigo, ate, dias, clientes):
+        self.total = total
+        self.semente = semente
+        self.primeiro_codigo = primeiro_codigo
+        self.inicios, self.acumulado = faixas_de_horario(ate, dias)
+
+        # Catálogo atual do banco (não o desta lista): os pedidos batem com o que a API valida
+        catalogo = list(db.produtos.find({"ativo": True}))
+        self.marmitas = [p for p in catalogo if p["tipo"] == "COMPOSTO" and p.get("regras_composicao")]
+        self.extras = [p for p in catalogo if p["tipo"] != "COMPOSTO"]
+        if not self.marmitas:
+            raise SystemExit("ERRO: nenhuma marmita ativa no banco; rode o seed do cardápio antes.")
+        self.quentes = {"BASE": [], "PROTEINA": [], "GUARNICAO": []}
+        self.saladas = []
+        for comp in db.componentes.find({"ativo": True}):
+            if comp["embalagem_separada"]:
+                self.saladas.append(comp)
+            elif comp["tipo"] in self.quentes:
+                self.quentes[comp["tipo"]].append(comp)
+
+        padrao = int(os.getenv("TAXA_ENTREGA_PADRAO_CENTAVOS", "1000"))
+        self.taxas = {b["nome"]: b["taxa_entrega_centavos"] for b in db.bairros.find({})}
+        bairros = list(self.taxas) or BAIRROS_SINTETICOS
+        self.taxas = {nome: self.taxas.get(nome, padrao) for nome in bairros}
+        self.clientes = gerar_clientes(semente, clientes, bairros)
+        self.fieis = max(len(self.clientes) // 5, 1)
+
+    def data(self, rng, i):
+        # Estrato i de N: datas crescem com i sem ordenar nada
+        alvo = (i + rng.random()) / self.total * self.acumulado[-1]
+        j = min(bisect_right(self.acumulado, alvo), len(self.acumulado) - 1)
+        anterior = self.acumulado[j - 1] if j else 0.0
+        fracao = (alvo - anterior) / (self.acumulado[j] - anterior)
+        momento = self.inicios[j] + fracao * FAIXA
+        # O MongoDB guarda milissegundos; trunca como o criar_pedido da API
+        return momento.replace(microsecond=momento.microsecond // 1000 * 1000)
+
+    def item_marmita(self, rng):
+        produto = rng.choice(self.marmitas)
+        regras = produto["regras_composicao"]
+        selecoes = []
+        for tipo, chave in (("BASE", "max_base"), ("PROTEINA", "max_proteina"), ("GUARNICAO", "max_guarnicao")):
+            # Chave ausente = sem limite, como no pricing da API: vai até o que o cardápio oferece
+            maximo = regras.get(chave)
+            limite = len(self.quentes[tipo]) if maximo is None else min(maximo, len(self.quentes[tipo]))
+            if limite:
+                selecoes += rng.sample(self.quentes[tipo], rng.randint(1, limite))
+        selecoes += rng.sample(self.saladas, min(rng.choice((0, 0, 1, 1, 2)), len(self.saladas)))
+        return {
+            "nome_produto": produto["nome"],
+            "quantidade": rng.choices((1, 2, 3), (85, 12, 3))[0],
+            "preco_unitario": produto["preco_centavos"] + sum(c["preco_adicional_centavos"] for c in selecoes),
+            "selecoes": [c["nome"] for c in selecoes],
+        }
+
+    def item_extra(self, rng):
+        produto = rng.choice(self.extras)
+        return {"nome_produto": produto["nome"], "quantidade": rng.choices((1, 2), (80, 20))[0],
+                "preco_unitario": produto["preco_centavos"], "selecoes": []}
+
+    def pedido(self, rng, i):
+        cliente = self.clientes[rng.randrange(self.fieis) if rng.random() < 0.7 else rng.randrange(len(self.clientes))]
+        itens = [self.item_marmita(rng) for _ in range(rng.choices(QTD_MARMITAS, PESO_QTD_MARMITAS)[0])]
+        if self.extras:
+            itens += [self.item_extra(rng) for _ in range(rng.choices(QTD_EXTRAS, PESO_QTD_EXTRAS)[0])]
+        if not itens:
+            itens.append(self.item_marmita(rng))
+        modalidade = rng.choices(MODALIDADES, PESO_MODALIDADES)[0]
+        entrega = dict(cliente["entrega"]) if modalidade == "DELIVERY" else None
+        valor = sum(item["quantidade"] * item["preco_unitario"] for item in itens)
+        taxa = self.taxas[entrega["bairro"]] if entrega else 0
+        return {
+            "codigo_pedido": self.primeiro_codigo + i,
+            "data_criacao": self.data(rng, i),
+            "cliente": {"nome": cliente["nome"], "telefone": cliente["telefone"], "cpf_nota": cliente["cpf_nota"]},
+            "modalidade": modalidade,
+            "entrega": entrega,
+            "forma_pagamento": rng.choices(PAGAMENTOS, PESO_PAGAMENTOS)[0],
+            "itens": itens,
+            # Período termina antes de hoje: tudo já foi entregue
+            "status": "ENTREGUE",
+            "valor_produtos_centavos": valor,
+            "taxa_entrega_centavos": taxa,
+            "valor_total_centavos": valor + taxa,
+        }
+
+    def gravar_lote(self, numero, tamanho):
+        rng = random.Random(f"{self.semente}:{numero}")
+        inicio = numero * tamanho
+        docs = [self.pedido(rng, i) for i in range(inicio, min(inicio + tamanho, self.total))]
+        db.pedidos.insert_many(docs, ordered=False)
+        return len(docs)
+
+
+def reservar_codigos(quantidade):
+    """Reserva `quantidade` códigos no contador da API; devolve o primeiro."""
+    ultimo = db.pedidos.find_one({}, {"codigo_pedido": 1}, sort=[("codigo_pedido", -1)])
+    maior = ultimo["codigo_pedido"] if ultimo and isinstance(ultimo.get("codigo_pedido"), int) else 0
+    db.counters.update_one({"_id": "codigo_pedido"}, {"$max": {"valor": maior}}, upsert=True)
+    doc = db.counters.find_one_and_update(
+        {"_id": "codigo_pedido"}, {"$inc": {"valor": quantidade}}, return_document=ReturnDocument.AFTER
+    )
+    return doc["valor"] - quantidade + 1
+
+
+def milhar(n):
+    return f"{n:,.0f}".replace(",", ".")
+
+
+def gerar_pedidos_sinteticos():
+    total, tamanho = args.pedidos, max(args.lote, 1)
+    clientes = args.clientes or max(total // 20, 100)
+    print(f"Gerando {milhar(total)} pedidos sintéticos: {args.dias} dias até {args.ate}, "
+          f"{milhar(clientes)} clientes, semente {args.semente}, lotes de {milhar(tamanho)}, {args.workers} workers...")
+    gerador = GeradorPedidos(total, args.semente, reservar_codigos(total), args.ate, args.dias, clientes)
+
+    inicio = ultimo_aviso = time.perf_counter()
+    gravados = 0
+    lotes = range((total + tamanho - 1) // tamanho)
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as executor:
+        futuros = [executor.submit(gerador.gravar_lote, numero, tamanho) for numero in lotes]
+        for futuro in as_completed(futuros):
+            gravados += futuro.result()
+            agora = time.perf_counter()
+            if agora - ultimo_aviso >= 2 or gravados == total:
+                ultimo_aviso = agora
+                print(f"   {milhar(gravados)}/{milhar(total)} pedidos ({gravados / total:.0%}), "
+                      f"{milhar(gravados / (agora - inicio))} pedidos/s")
+    duracao = time.perf_counter() - inicio
+    print(f"   {milhar(total)} pedidos em {duracao:.1f}s ({milhar(total / duracao)} pedidos/s), "
+          f"códigos {gerador.primeiro_codigo} a {gerador.primeiro_codigo + total - 1}")
+
+
+if args.pedidos > 0:
+    gerar_pedidos_sinteticos()
 
 print("\n=======================================================")
 print("✅ SEED MASTER EXECUTADO COM SUCESSO!")
@@ -245,4 +526,6 @@ print("   - Cardápio Completo (Coca 2L, 600ml, H2O, Sucos).")
 print("   - Variedade de Carnes, Salgados e Doces.")
 print("   - Lógica de Salada (Pote Separado) configurada.")
 print("   - Pedidos de exemplo criados para validação.")
-print("=======================================================")
\ No newline at end of file
+if args.pedidos > 0:
+    print(f"   - {milhar(args.pedidos)} pedidos sintéticos (semente {args.semente}).")
+print("=======================================================")
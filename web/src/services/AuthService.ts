@@ -3,24 +3,26 @@ import { Usuario } from '../types';
 
 interface LoginResponse {
 	access_token: string;
+	refresh_token: string;
 	token_type: string;
+	expires_in: number;
 	user: Usuario;
 }
 
 export const AuthService = {
 	login: async (email: string, password: string): Promise<LoginResponse> => {
+		// O header Authorization é aplicado pelo interceptor de api.ts a partir da store
 		const response = await api.post<LoginResponse>('/auth/login', { email, password });
-		
-		if (response.data.access_token) {
-			api.defaults.headers.common['Authorization'] = `Bearer ${response.data.access_token}`;
-		}
 		return response.data;
 	},
 
-	logout: async (): Promise<void> => {
-		// Remove o token do header
-		delete api.defaults.headers.common['Authorization'];
-		// Opcional: chamar endpoint de logout no backend se existir lista de revogação
-		// await api.post('/auth/logout');
+	logout: async (token: string, refreshToken: string | null): Promise<void> => {
+		// Revoga access e refresh no backend; se o access já venceu, basta descartar localmente.
+		// O header vai explícito: quando a requisição sai, a store já foi limpa.
+		await api
+			.post('/auth/logout', refreshToken ? { refresh_token: refreshToken } : undefined, {
+				headers: { Authorization: `Bearer ${token}` },
+			})
+			.catch(() => undefined);
 	}
 };
@@ -1,4 +1,5 @@
-import axios from 'axios';
+import axios, { AxiosError, InternalAxiosRequestConfig } from 'axios';
+import { useAuthStore } from '../store/authStore';
 
 // Variável de ambiente do Vite ou URL de produção no Render como fallback (padrão)
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'https://cardapio-pratica.onrender.com';
@@ -10,4 +11,53 @@ const api = axios.create({
   },
 });
 
+// O token vem sempre da store (persistida): vale também depois de recarregar a página
+api.interceptors.request.use((config) => {
+  const token = useAuthStore.getState().token;
+  if (token) {
+    config.headers.Authorization = `Bearer ${token}`;
+  }
+  return config;
+});
+
+// O access token dura 15 minutos. No primeiro 401 troca o par pelo refresh token
+// (uso único: requisições simultâneas esperam a mesma renovação) e repete a requisição.
+let renovacao: Promise<string | null> | null = null;
+
+async function renovarToken(): Promise<string | null> {
+  const { refreshToken, setTokens, logout } = useAuthStore.getState();
+  if (!refreshToken) {
+    // Sessão salva antes do refresh token existir: volta para o login
+    logout();
+    return null;
+  }
+  try {
+    const { data } = await axios.post(`${API_BASE_URL}/auth/refresh`, { refresh_token: refreshToken });
+    setTokens(data.access_token, data.refresh_token);
+    return data.access_token;
+  } catch {
+    logout();
+    return null;
+  }
+}
+
+api.interceptors.response.use(
+  (response) => response,
+  async (error: AxiosError) => {
+    const original = error.config as (InternalAxiosRequestConfig & { _renovado?: boolean }) | undefined;
+    if (error.response?.status !== 401 || !original || original._renovado || original.url?.startsWith('/auth/')) {
+      return Promise.reject(error);
+    }
+    original._renovado = true;
+    if (!renovacao) {
+      renovacao = renovarToken().finally(() => {
+        renovacao = null;
+      });
+    }
+    const token = await renovacao;
+    if (!token) return Promise.reject(error);
+    return api(original);
+  }
+);
+
 export default api;
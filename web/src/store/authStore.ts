@@ -7,18 +7,21 @@ interface AuthState {
     isAuthenticated: boolean;
     user: Usuario | null;
     token: string | null;
+    refreshToken: string | null;
     isLoading: boolean;
     error: string | null;
     login: (email: string, password: string) => Promise<void>;
     logout: () => void;
+    setTokens: (token: string, refreshToken: string) => void;
 }
 
 export const useAuthStore = create<AuthState>()(
     persist(
-        (set) => ({
+        (set, get) => ({
             isAuthenticated: false,
             user: null,
             token: null,
+            refreshToken: null,
             isLoading: false,
             error: null,
 
@@ -30,6 +33,7 @@ export const useAuthStore = create<AuthState>()(
                         isAuthenticated: true, 
                         user: data.user, 
                         token: data.access_token,
+                        refreshToken: data.refresh_token,
                         isLoading: false 
                     });
                 } catch (error: any) {
@@ -38,6 +42,7 @@ export const useAuthStore = create<AuthState>()(
                         isAuthenticated: false, 
                         user: null, 
                         token: null,
+                        refreshToken: null,
                         error: "Falha ao realizar login. Verifique suas credenciais.",
                         isLoading: false 
                     });
@@ -46,16 +51,22 @@ export const useAuthStore = create<AuthState>()(
             },
 
             logout: () => {
-                AuthService.logout();
-                set({ isAuthenticated: false, user: null, token: null });
+                const { token, refreshToken } = get();
+                if (token) {
+                    AuthService.logout(token, refreshToken);
+                }
+                set({ isAuthenticated: false, user: null, token: null, refreshToken: null });
             },
+
+            setTokens: (token, refreshToken) => set({ token, refreshToken }),
         }),
         {
             name: 'auth-storage',
             partialize: (state) => ({ 
                 isAuthenticated: state.isAuthenticated, 
                 user: state.user, 
-                token: state.token 
+                token: state.token,
+                refreshToken: state.refreshToken
             }), // Persiste apenas dados essenciais
         }
     )